@@ -0,0 +1,81 @@
+"""
+Local mock of the OpenWeatherMap current weather endpoint
+"""
+
+import json
+import random
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+
+class _MockHandler(BaseHTTPRequestHandler):
+    """Answers /data/2.5/weather requests with OpenWeatherMap-shaped JSON"""
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        query = parse_qs(url.query)
+
+        if url.path != '/data/2.5/weather' or 'appid' not in query:
+            self.send_error(404 if url.path != '/data/2.5/weather' else 401)
+            return
+
+        self.server.request_count += 1
+        city = query.get('q', ['Sacramento'])[0].split(',')[0]
+        temp = round(self.server.rng.uniform(50, 105), 2)
+        body = json.dumps({
+            'name': city,
+            'main': {
+                'temp': temp,
+                'feels_like': round(temp + self.server.rng.uniform(-3, 3), 2),
+                'humidity': self.server.rng.randint(10, 95)
+            },
+            'weather': [{'description': 'clear sky'}]
+        }).encode('utf-8')
+
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        # Keep benchmark output clean
+        pass
+
+
+class MockOpenWeatherMapServer:
+    """
+    Threaded HTTP server on localhost that mimics OpenWeatherMap
+    Use as a context manager; base_url is ready to pass to WeatherAPI.
+    """
+
+    def __init__(self, host='127.0.0.1', port=0, seed=0):
+        self.server = ThreadingHTTPServer((host, port), _MockHandler)
+        self.server.rng = random.Random(seed)
+        self.server.request_count = 0
+        self.thread = None
+
+    @property
+    def base_url(self):
+        host, port = self.server.server_address[:2]
+        return f"http://{host}:{port}/data/2.5/weather"
+
+    @property
+    def request_count(self):
+        return self.server.request_count
+
+    def start(self):
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, exc_type, exc, tb):
+        self.stop()
@@ -0,0 +1,485 @@
+"""
+Benchmark runner for the weather app
+
+Run from the project root:
+    python -m benchmarks.run_benchmarks            # full suite
+    python -m benchmarks.run_benchmarks --quick    # smallest sizes only
+    python -m benchmarks.run_benchmarks --baseline benchmarks/results/old.json
+
+Results are written as JSON to benchmarks/results/ so runs can be compared.
+The run exits with status 1 if concurrent writers lost rows or a reader saw a
+torn row, so it can gate CI.
+"""
+
+import argparse
+import json
+import os
+import platform
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+from benchmarks.mock_owm import MockOpenWeatherMapServer
+from benchmarks.synthetic import generate_comparison_dir, generate_history
+from src.baseline import ClimatologyBaseline
+from src.csv_comparator import CSVComparator
+from src.data_storage import DataStorage
+from src.downsample import lttb, min_max
+from src.rollups import HistoryRollups
+from src.sketches import HistorySketches
+from src.utils import WeatherUtils
+from src.weather_record import WeatherRecord
+
+HISTORY_SIZES = [1000, 100000, 1000000]
+COMPARISON_SIZES = [10, 1000, 10000]
+WRITER_PROCESSES = [1, 4, 16]
+RESULTS_DIR = os.path.join(os.path.dirname(__file__), 'results')
+
+SAMPLE_READING = WeatherRecord(city='Sacramento', temperature=85, feels_like=84, humidity=39,
+                               description='Clear Sky', epoch=time.time())
+
+
+def time_call(func, repeat, setup=None):
+    """
+    Time func over several runs
+    Args: func (callable): Code under test
+          repeat (int): Number of timed runs
+          setup (callable): Untimed preparation before each run
+    Returns: list: Wall-clock seconds for each run
+    """
+    timings = []
+    for _ in range(repeat):
+        if setup:
+            setup()
+        start = time.perf_counter()
+        func()
+        timings.append(time.perf_counter() - start)
+    return timings
+
+
+def summarize(name, params, timings, **extra):
+    """Build one result entry"""
+    result = {
+        'name': name,
+        'params': params,
+        'runs': len(timings),
+        'min_s': min(timings),
+        'median_s': statistics.median(timings),
+        'mean_s': statistics.fmean(timings),
+        'max_s': max(timings)
+    }
+    result.update(extra)
+    print(f"  {name:<40} {json.dumps(params):<24} median {result['median_s'] * 1000:10.2f} ms")
+    return result
+
+
+def repeats_for(size, repeat):
+    """Use fewer runs for the largest inputs so the suite finishes in reasonable time"""
+    return max(1, repeat // 3) if size >= 1000000 else repeat
+
+
+def bench_history(workdir, sizes, repeat):
+    """Benchmarks for DataStorage and WeatherUtils over synthetic histories"""
+    results = []
+
+    for rows in sizes:
+        template = os.path.join(workdir, f"history_{rows}.csv")
+        generate_history(template, rows)
+        data_file = os.path.join(workdir, f"weather_data_{rows}.csv")
+        shutil.copyfile(template, data_file)
+
+        storage = DataStorage(data_file=data_file)
+        runs = repeats_for(rows, repeat)
+        params = {'rows': rows}
+
+        results.append(summarize('DataStorage.load_data', params,
+                                 time_call(storage.load_data, runs)))
+        # Cold reads the whole file; warm only reads what was appended since
+        results.append(summarize('DataStorage.get_recent_data', dict(params, cache='cold'),
+                                 time_call(lambda: storage.get_recent_data(days=7), runs,
+                                           setup=lambda: setattr(storage, '_recent', None))))
+        results.append(summarize('DataStorage.get_recent_data', dict(params, cache='warm'),
+                                 time_call(lambda: storage.get_recent_data(days=7), runs)))
+
+        # save_weather_data may rewrite the file, so restore it before every run
+        results.append(summarize(
+            'DataStorage.save_weather_data', params,
+            time_call(lambda: storage.save_weather_data(SAMPLE_READING), runs,
+                      setup=lambda: shutil.copyfile(template, data_file))))
+
+        # Full build of the per-city quantile sketches from the history file
+        sketch_file = os.path.join(workdir, f"sketches_{rows}.json")
+
+        def build_sketches():
+            if os.path.exists(sketch_file):
+                os.remove(sketch_file)
+            HistorySketches(storage, path=sketch_file).catch_up()
+
+        shutil.copyfile(template, data_file)
+        results.append(summarize('HistorySketches.catch_up', params, time_call(build_sketches, runs)))
+        # A refresh adds one reading; catching up must not rewrite the whole file for it
+        sketches = HistorySketches(storage, path=sketch_file)
+        sketches.catch_up()
+        results.append(summarize('HistorySketches.catch_up', dict(params, new_rows=1), time_call(
+            sketches.catch_up, runs, setup=lambda: storage.save_weather_data(SAMPLE_READING))))
+        # All-time percentiles merge every digest kept; old days are folded
+        # into months and years, so this stays flat as the history grows
+        results.append(summarize(
+            'HistorySketches.quantiles', dict(params, window='all'),
+            time_call(lambda: sketches.quantiles('Sacramento'), runs),
+            digests=sum(len(days) for days in sketches.summary._digests.values())))
+
+        # Full build of the hour-of-day baseline, then scoring one new reading
+        # against it, which must not depend on the history size
+        baseline_file = os.path.join(workdir, f"baseline_{rows}.json")
+
+        def build_baseline():
+            if os.path.exists(baseline_file):
+                os.remove(baseline_file)
+            ClimatologyBaseline(storage, path=baseline_file).catch_up()
+
+        results.append(summarize('ClimatologyBaseline.catch_up', params, time_call(build_baseline, runs)))
+        baseline = ClimatologyBaseline(storage, path=baseline_file)
+        results.append(summarize('ClimatologyBaseline.observe', params,
+                                 time_call(lambda: baseline.observe(SAMPLE_READING), runs)))
+
+        shutil.copyfile(template, data_file)
+        data = storage.load_data()
+        results.append(summarize('WeatherUtils.calculate_weekly_average', params,
+                                 time_call(lambda: WeatherUtils.calculate_weekly_average(data), runs)))
+        results.append(summarize('WeatherUtils.find_min_max_temps', params,
+                                 time_call(lambda: WeatherUtils.find_min_max_temps(data), runs)))
+        results.append(summarize('WeatherUtils.get_previous_temperature', params,
+                                 time_call(lambda: WeatherUtils.get_previous_temperature(data), runs)))
+        del data
+
+    return results
+
+
+def bench_write_buffer(workdir, readings, repeat):
+    """Saving readings one write at a time vs grouped by the buffered writer"""
+    import config
+    from src.buffered_writer import BufferedWriter
+    results = []
+    data_file = os.path.join(workdir, 'buffered', 'weather_data.csv')
+
+    for buffer_records in (1, 50):
+        for fsync in (False, True):
+            storage = DataStorage(data_file=data_file)
+            original_fsync = config.WRITE_FSYNC
+            config.WRITE_FSYNC = fsync
+
+            def save_all():
+                if buffer_records > 1:
+                    storage.writer = BufferedWriter(storage, buffer_records, 60000, fsync=fsync)
+                for _ in range(readings):
+                    storage.save_weather_data(SAMPLE_READING)
+                storage.close()
+
+            def remove_history():
+                if os.path.exists(data_file):
+                    os.remove(data_file)
+
+            try:
+                timings = time_call(save_all, repeat, setup=remove_history)
+            finally:
+                config.WRITE_FSYNC = original_fsync
+            results.append(summarize('DataStorage.save_weather_data x N',
+                                     {'readings': readings, 'buffer': buffer_records, 'fsync': fsync},
+                                     timings))
+    return results
+
+
+def _writer_process(data_file, readings, writer_id, max_rows=None):
+    """Body of one concurrent writer process"""
+    import config
+    # Set here rather than inherited, so it also holds for spawned processes
+    config.HISTORY_MAX_ROWS = max_rows
+    storage = DataStorage(data_file=data_file)
+    for index in range(readings):
+        storage.save_weather_data(WeatherRecord(
+            city=f"Writer {writer_id}", temperature=index % 100, feels_like=70, humidity=40,
+            description='Clear Sky', epoch=1700000000 + index))
+
+
+def _reader_process(data_file, stop, torn_rows):
+    """Reload the history while writers run and count rows that come back damaged"""
+    storage = DataStorage(data_file=data_file)
+    while not stop.is_set():
+        for record in storage.load_data():
+            if record.epoch is None or not (record.city or '').startswith('Writer '):
+                with torn_rows.get_lock():
+                    torn_rows.value += 1
+
+
+def bench_concurrent_writers(workdir, process_counts, readings, repeat):
+    """
+    Several processes appending to one history file, with a reader running alongside
+
+    Each process count runs twice: appending only, and with the history capped
+    at readings rows so every save trims and rewrites the file under the lock.
+    """
+    import multiprocessing
+    results = []
+    data_file = os.path.join(workdir, 'concurrent', 'weather_data.csv')
+
+    for max_rows in (None, readings):
+        for processes in process_counts:
+            timings, lost, torn = [], 0, 0
+            total = processes * readings
+            expected = min(total, max_rows) if max_rows else total
+            for _ in range(repeat):
+                if os.path.exists(data_file):
+                    os.remove(data_file)
+                stop = multiprocessing.Event()
+                torn_rows = multiprocessing.Value('i', 0)
+                reader = multiprocessing.Process(target=_reader_process, args=(data_file, stop, torn_rows))
+                writers = [multiprocessing.Process(target=_writer_process,
+                                                   args=(data_file, readings, writer_id, max_rows))
+                           for writer_id in range(processes)]
+
+                reader.start()
+                start = time.perf_counter()
+                for writer in writers:
+                    writer.start()
+                for writer in writers:
+                    writer.join()
+                timings.append(time.perf_counter() - start)
+                stop.set()
+                reader.join()
+
+                lost += expected - len(DataStorage(data_file=data_file).load_data())
+                torn += torn_rows.value
+
+            params = {'processes': processes, 'readings': total}
+            if max_rows:
+                params['max_rows'] = max_rows
+            results.append(summarize('concurrent_writers', params,
+                                     timings, rows_per_second=total / statistics.median(timings),
+                                     lost_rows=lost, torn_rows_seen=torn))
+    return results
+
+
+def bench_comparisons(workdir, sizes, repeat):
+    """Benchmarks for CSVComparator over synthetic comparison directories"""
+    results = []
+
+    for files in sizes:
+        directory = os.path.join(workdir, f"comparisons_{files}")
+        generate_comparison_dir(directory, files)
+        app_data_file = os.path.join(directory, 'weather_data.csv')
+
+        # Cold: a new comparator every run, so every file is parsed
+        timings = time_call(
+            lambda: CSVComparator(data_dir=directory,
+                                  app_data_file=app_data_file).get_all_comparison_cities(),
+            repeat)
+        results.append(summarize('CSVComparator.get_all_comparison_cities',
+                                 {'files': files, 'cache': 'cold'}, timings))
+
+        # Warm: unchanged files are served from the comparator's parse cache
+        comparator = CSVComparator(data_dir=directory, app_data_file=app_data_file)
+        comparator.get_all_comparison_cities()
+        timings = time_call(comparator.get_all_comparison_cities, repeat)
+        results.append(summarize('CSVComparator.get_all_comparison_cities',
+                                 {'files': files, 'cache': 'warm'}, timings))
+
+    return results
+
+
+def bench_refresh_cycle(workdir, history_rows, comparison_files, repeat):
+    """Benchmark a full fetch -> save -> stats -> compare cycle against the mock server"""
+    try:
+        from src.collector import WeatherCollector
+        from src.weather_api import WeatherAPI
+        import requests  # noqa: F401 - WeatherAPI imports it lazily
+    except ImportError as e:
+        print(f"  Skipping refresh cycle: {e}")
+        return [{'name': 'refresh_cycle', 'skipped': str(e)}]
+
+    template = os.path.join(workdir, 'refresh_history.csv')
+    generate_history(template, history_rows)
+    data_file = os.path.join(workdir, 'refresh', 'weather_data.csv')
+    comparison_dir = os.path.dirname(data_file)
+    generate_comparison_dir(comparison_dir, comparison_files)
+
+    with MockOpenWeatherMapServer() as server:
+        collector = WeatherCollector(
+            weather_api=WeatherAPI(base_url=server.base_url, api_key='benchmark'),
+            data_storage=DataStorage(data_file=data_file),
+            csv_comparator=CSVComparator(data_dir=comparison_dir, app_data_file=data_file))
+        timings = time_call(collector.refresh, repeat,
+                            setup=lambda: shutil.copyfile(template, data_file))
+        requests_served = server.request_count
+
+    return [summarize('refresh_cycle',
+                      {'history_rows': history_rows, 'comparison_files': comparison_files},
+                      timings, requests_served=requests_served)]
+
+
+def bench_chart(workdir, rows, repeat):
+    """Building the chart rollups, then loading and downsampling a year of them"""
+    data_file = os.path.join(workdir, 'chart', 'weather_data.csv')
+    os.makedirs(os.path.dirname(data_file), exist_ok=True)
+    generate_history(data_file, rows)
+    storage = DataStorage(data_file=data_file)
+    rollup_file = os.path.join(workdir, 'chart', 'rollups.json')
+    params = {'rows': rows}
+    results = []
+
+    def build_rollups():
+        if os.path.exists(rollup_file):
+            os.remove(rollup_file)
+        HistoryRollups(storage, path=rollup_file).catch_up()
+
+    results.append(summarize('HistoryRollups.catch_up', params, time_call(build_rollups, repeat)))
+
+    rollups = HistoryRollups(storage, path=rollup_file)
+    rollups.catch_up()
+    results.append(summarize('HistoryRollups.catch_up', dict(params, new_rows=1), time_call(
+        rollups.catch_up, repeat, setup=lambda: storage.save_weather_data(SAMPLE_READING))))
+    points = 1000
+
+    def downsample(buckets):
+        line = lttb([(bucket[0], bucket[1]) for bucket in buckets], points)
+        envelope = min_max([(bucket[0], bucket[2], bucket[3]) for bucket in buckets], points)
+        return line, envelope
+
+    # Zooming loads the range from the rollups; resizing only downsamples again
+    year_start = time.time() - 365 * 86400
+    resolution, buckets = rollups.series('Sacramento', start=year_start)
+    results.append(summarize('chart load 1 year', params, time_call(
+        lambda: downsample(rollups.series('Sacramento', start=year_start)[1]), repeat),
+        resolution=resolution, buckets=len(buckets), points=len(downsample(buckets)[0])))
+    results.append(summarize('chart downsample 1 year', params,
+                             time_call(lambda: downsample(buckets), repeat)))
+    return results
+
+
+def bench_query_api(history_rows, requests_per_run, repeat):
+    """Requests per second from the query API over one keep-alive connection"""
+    import http.client
+    from src.app_state import AppState
+    from src.query_api import QueryServer
+
+    state = AppState()
+    now = time.time()
+    state.add_readings([WeatherRecord('Sacramento', 60 + index % 30, 60, 40, 'Clear Sky',
+                                      now - index * 300) for index in range(history_rows)])
+    state.update(weather=SAMPLE_READING, stats={'average': '85.0°F'})
+
+    results = []
+    server = QueryServer(state, 0).start()
+    try:
+        for path in ('/current', '/stats?days=7', '/history?hours=24'):
+            connection = http.client.HTTPConnection('127.0.0.1', server.port, timeout=10)
+
+            def run():
+                for _ in range(requests_per_run):
+                    connection.request('GET', path)
+                    connection.getresponse().read()
+
+            timings = time_call(run, repeat)
+            connection.close()
+            results.append(summarize('query_api', {'path': path, 'requests': requests_per_run},
+                                     timings,
+                                     requests_per_second=requests_per_run / statistics.median(timings)))
+    finally:
+        server.stop()
+    return results
+
+
+def git_revision():
+    """Current commit hash, if this is a git checkout"""
+    try:
+        return subprocess.check_output(['git', 'rev-parse', 'HEAD'], text=True,
+                                       stderr=subprocess.DEVNULL).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare_with_baseline(results, baseline_file):
+    """Print the median change of each benchmark relative to an earlier run"""
+    with open(baseline_file, 'r', encoding='utf-8') as file:
+        baseline = json.load(file)
+
+    def key(entry):
+        return entry['name'], json.dumps(entry.get('params'), sort_keys=True)
+
+    previous = {key(entry): entry for entry in baseline.get('results', []) if 'median_s' in entry}
+    print(f"\nCompared with {baseline_file}:")
+    for entry in results:
+        old = previous.get(key(entry))
+        if old is None or 'median_s' not in entry:
+            continue
+        ratio = entry['median_s'] / old['median_s'] if old['median_s'] else float('inf')
+        print(f"  {entry['name']:<40} {json.dumps(entry['params']):<24} x{ratio:.2f}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Run the weather app benchmarks")
+    parser.add_argument('--quick', action='store_true', help="only run the smallest sizes")
+    parser.add_argument('--repeat', type=int, default=5, help="timed runs per benchmark")
+    parser.add_argument('--output', help="result file (default: benchmarks/results/<time>.json)")
+    parser.add_argument('--baseline', help="earlier result file to compare against")
+    parser.add_argument('--keep', action='store_true', help="keep the generated data directory")
+    args = parser.parse_args(argv)
+
+    history_sizes = HISTORY_SIZES[:1] if args.quick else HISTORY_SIZES
+    comparison_sizes = COMPARISON_SIZES[:1] if args.quick else COMPARISON_SIZES
+
+    workdir = tempfile.mkdtemp(prefix='weather_bench_')
+    results = []
+    try:
+        print("History benchmarks")
+        results += bench_history(workdir, history_sizes, args.repeat)
+        print("Write buffer benchmarks")
+        results += bench_write_buffer(workdir, 200, args.repeat)
+        print("Concurrent writer benchmarks")
+        results += bench_concurrent_writers(workdir, WRITER_PROCESSES, 100 if args.quick else 500, args.repeat)
+        print("Comparison benchmarks")
+        results += bench_comparisons(workdir, comparison_sizes, args.repeat)
+        print("Refresh cycle benchmark")
+        results += bench_refresh_cycle(workdir, history_sizes[0], comparison_sizes[0], args.repeat)
+        print("History chart benchmarks")
+        results += bench_chart(workdir, 8640 if args.quick else 105120, args.repeat)
+        print("Query API benchmark")
+        results += bench_query_api(history_sizes[-1], 500 if args.quick else 5000, args.repeat)
+    finally:
+        if args.keep:
+            print(f"Generated data kept in {workdir}")
+        else:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+    report = {
+        'created': datetime.now().isoformat(),
+        'git_revision': git_revision(),
+        'python': sys.version.split()[0],
+        'platform': platform.platform(),
+        'repeat': args.repeat,
+        'results': results
+    }
+
+    output = args.output or os.path.join(
+        RESULTS_DIR, f"benchmark_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json")
+    os.makedirs(os.path.dirname(output) or '.', exist_ok=True)
+    with open(output, 'w', encoding='utf-8') as file:
+        json.dump(report, file, indent=2)
+    print(f"\nResults written to {output}")
+
+    if args.baseline:
+        compare_with_baseline(results, args.baseline)
+
+    damaged = [entry for entry in results if entry.get('lost_rows') or entry.get('torn_rows_seen')]
+    for entry in damaged:
+        print(f"FAILED {entry['name']} {json.dumps(entry['params'])}: "
+              f"{entry['lost_rows']} rows lost, {entry['torn_rows_seen']} torn rows seen")
+    return 1 if damaged else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
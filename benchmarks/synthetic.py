@@ -0,0 +1,127 @@
+"""
+Synthetic data generators for the benchmarks
+"""
+
+import csv
+import os
+import random
+from datetime import datetime, timedelta
+
+from src.weather_record import HISTORY_FIELDNAMES
+
+DESCRIPTIONS = [
+    'Clear Sky', 'Few Clouds', 'Scattered Clouds', 'Broken Clouds',
+    'Overcast Clouds', 'Light Rain', 'Moderate Rain', 'Mist'
+]
+
+CITIES = [
+    ('Phoenix', 'Arizona'), ('Tucson', 'Arizona'), ('Dallas', 'Texas'),
+    ('Chicago', 'Illinois'), ('New York', 'New York'), ('Buffalo', 'New York'),
+    ('Denver', 'Colorado'), ('Seattle', 'Washington'), ('Miami', 'Florida'),
+    ('Boston', 'Massachusetts')
+]
+
+# The comparison file layouts found in data/
+COMPARISON_LAYOUTS = ['app', 'headerless', 'daily_export', 'readings']
+
+
+def generate_history(path, rows, city='Sacramento', interval_minutes=5, seed=0):
+    """
+    Write a history file in the app's own CSV format
+    Args: path (str): File to create
+          rows (int): Number of readings
+          city (str): City name written on every row
+          interval_minutes (int): Spacing between readings; the last one is "now"
+          seed (int): Random seed so runs are reproducible
+    """
+    rng = random.Random(seed)
+    start = datetime.now() - timedelta(minutes=interval_minutes * (rows - 1))
+    step = timedelta(minutes=interval_minutes)
+    temperature = 70.0
+
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    with open(path, 'w', newline='', encoding='utf-8') as file:
+        writer = csv.writer(file)
+        writer.writerow(HISTORY_FIELDNAMES)
+        for i in range(rows):
+            moment = start + step * i
+            temperature = min(115.0, max(20.0, temperature + rng.uniform(-1.5, 1.5)))
+            temp = round(temperature)
+            writer.writerow([
+                city, temp, temp + rng.randint(-3, 3), rng.randint(10, 95),
+                rng.choice(DESCRIPTIONS), moment.isoformat(),
+                moment.strftime('%Y-%m-%d'), moment.strftime('%H:%M:%S')
+            ])
+
+
+def _comparison_rows(layout, rng, rows):
+    """Build the header and data rows for one comparison file layout"""
+    city, state = rng.choice(CITIES)
+    day = datetime(2025, 7, 1)
+    header = None
+    data = []
+
+    if layout == 'app':
+        # Same layout as the app's own file (topher.csv)
+        header = HISTORY_FIELDNAMES
+        for i in range(rows):
+            moment = day + timedelta(minutes=5 * i)
+            temp = rng.randint(40, 110)
+            data.append([city, temp, temp + rng.randint(-3, 3), rng.randint(10, 95),
+                         rng.choice(DESCRIPTIONS), moment.isoformat(),
+                         moment.strftime('%Y-%m-%d'), moment.strftime('%H:%M:%S')])
+    elif layout == 'headerless':
+        # city, temperature, description with no header (jason.csv)
+        for _ in range(rows):
+            data.append([city, round(rng.uniform(40, 115), 2),
+                         rng.choice(DESCRIPTIONS).lower()])
+    elif layout == 'daily_export':
+        # weather_date, export_date, city, state, ... (jeremy.csv)
+        header = ['weather_date', 'export_date', 'city', 'state', 'temp',
+                  'humidity', 'rain', 'summary', 'predicted']
+        for i in range(rows):
+            moment = day + timedelta(days=i)
+            data.append([moment.strftime('%Y-%m-%d'), day.strftime('%Y-%m-%d'), city, state,
+                         round(rng.uniform(40, 110), 1), rng.randint(10, 95),
+                         round(rng.uniform(0, 5), 2), rng.choice(DESCRIPTIONS), 'False'])
+    elif layout == 'readings':
+        # date, city, temp, feels_like, ... with mixed city casing (patrick.csv)
+        header = ['date', 'city', 'temp', 'feels_like', 'humidity', 'wind_speed', 'description']
+        for i in range(rows):
+            moment = day + timedelta(minutes=4 * i)
+            temp = round(rng.uniform(40, 110), 2)
+            name = city.lower() if rng.random() < 0.5 else city
+            data.append([moment.strftime('%Y-%m-%d %H:%M:%S'), name, temp,
+                         round(temp + rng.uniform(-3, 3), 2), rng.randint(10, 95),
+                         round(rng.uniform(0, 15), 2), rng.choice(DESCRIPTIONS).lower()])
+    else:
+        raise ValueError(f"Unknown comparison layout: {layout}")
+
+    return header, data
+
+
+def generate_comparison_dir(directory, files, rows_per_file=10, seed=0):
+    """
+    Fill a directory with comparison CSV files, cycling through every layout
+    Args: directory (str): Directory to create the files in
+          files (int): Number of files to write
+          rows_per_file (int): Data rows in each file
+          seed (int): Random seed so runs are reproducible
+    Returns: list: Paths of the files written
+    """
+    rng = random.Random(seed)
+    os.makedirs(directory, exist_ok=True)
+    paths = []
+
+    for i in range(files):
+        layout = COMPARISON_LAYOUTS[i % len(COMPARISON_LAYOUTS)]
+        header, data = _comparison_rows(layout, rng, rows_per_file)
+        path = os.path.join(directory, f"{layout}_{i:05d}.csv")
+        with open(path, 'w', newline='', encoding='utf-8') as file:
+            writer = csv.writer(file)
+            if header:
+                writer.writerow(header)
+            writer.writerows(data)
+        paths.append(path)
+
+    return paths
@@ -12,8 +12,40 @@ COUNTRY = "US"
 # Data storage settings
 DATA_FILE = "data/weather_data.csv"  # Changed from .json to .csv
 COMPARISON_CSV_DIR = "data/"  # Directory to scan for comparison CSV files
+STATS_CACHE_FILE = "data/stats_cache.json"  # Last computed statistics, shown at startup
+HISTORY_MAX_ROWS = None  # Keep at most this many readings (None keeps the full history)
+LATEST_SCAN_BYTES = 1048576  # At startup, look this far back from the end of the history for the last reading before searching the rest in the background
+DEDUP_INDEX_FILE = "data/dedup_index.sqlite3"  # (city, timestamp) keys already in the history
+IMPORT_BATCH_SIZE = 5000  # Rows written per batch during bulk import
+SKETCH_FILE = "data/sketches.json"  # Per-city quantile sketches of the history
+SKETCH_COMPRESSION = 100  # t-digest compression: higher is more accurate and larger
+SKETCH_DAILY_DAYS = 62  # Keep one quantile sketch per day this many days; older days are merged per month, and months before last year per year
+SUMMARY_SAVE_ROWS = 1000  # Rewrite the sketch, baseline and rollup files once this many rows were added since they were last written
+SUMMARY_SAVE_SECONDS = 600  # ...or once they are this old; rows not yet saved are re-read from the history at startup
+BASELINE_FILE = "data/baseline.json"  # Running temperature mean/variance per city and hour of day
+BASELINE_MIN_SAMPLES = 36  # Readings an hour needs before its readings get a z-score (~3 days at 5 minutes)
+ANOMALY_Z_THRESHOLD = 2.5  # Flag readings at least this many standard deviations from the usual for the hour
+ROLLUP_FILE = "data/rollups.json"  # Per-city temperature rollups for the history chart
+ROLLUP_FINE_DAYS = 14  # Keep 5-minute rollup buckets this many days; hourly and daily ones are kept for good
+WRITE_BUFFER_RECORDS = 1  # Group readings and write them together once this many are waiting (1 = write each one)
+WRITE_BUFFER_MS = 1000  # ...or once the oldest waiting reading is this old, in milliseconds
+WRITE_FSYNC = False  # fsync the history file after every write (slower, survives power loss)
 
 # GUI settings
 WINDOW_TITLE = "Sacramento Weather App"
 WINDOW_SIZE = "600x550"  # Made larger to accommodate comparison section
 REFRESH_INTERVAL = 300000  # 5 minutes in milliseconds
+STARTUP_REFRESH_DELAY = 0  # Delay before the first background fetch, in milliseconds
+CHART_MAX_POINTS = 1000  # Most points drawn per line in the history chart
+
+# Query API settings
+API_PORT = None  # Serve the read-only JSON query API on this port (None = disabled)
+API_HOST = "127.0.0.1"  # Interface the query API listens on
+API_HISTORY_LIMIT = 5000  # Most readings returned by one /history request
+
+# Logging and metrics settings
+LOG_LEVEL = "INFO"  # DEBUG, INFO, WARNING or ERROR
+LOG_JSON = False  # Emit JSON log lines instead of key=value text
+METRICS_PORT = None  # Serve Prometheus metrics on this port (None = disabled)
+METRICS_SNAPSHOT_FILE = None  # Periodically write a JSON metrics snapshot here (None = disabled)
+METRICS_SNAPSHOT_INTERVAL = 60  # Seconds between JSON snapshots
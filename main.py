@@ -3,20 +3,190 @@ Weather App - Main Entry Point
 Simple weather application for Sacramento, CA
 """
 
+import time
+
+# Taken before anything else is imported so time-to-first-paint covers startup
+STARTED_AT = time.perf_counter()
+
+import argparse
+import logging
 import os
 import sys
-from src.gui import WeatherGUI
+import config
+
+def parse_args(argv=None):
+    """Parse command line options"""
+    parser = argparse.ArgumentParser(description="Sacramento weather app")
+    parser.add_argument('--headless', action='store_true',
+                        help="collect weather data without opening the GUI")
+    parser.add_argument('--cycles', type=int, default=None,
+                        help="number of refresh cycles in headless mode (default: run forever)")
+    parser.add_argument('--interval', type=float, default=None,
+                        help="seconds between headless refresh cycles (default: REFRESH_INTERVAL)")
+    parser.add_argument('--profile', type=int, metavar='N', default=None,
+                        help="profile N refresh cycles with cProfile and write reports")
+    parser.add_argument('--profile-dir', default=None,
+                        help="directory for profile reports (default: profiles/<time>)")
+    parser.add_argument('--profile-memory', action='store_true',
+                        help="also record tracemalloc allocation snapshots while profiling")
+    parser.add_argument('--import', dest='import_files', nargs='+', metavar='FILE',
+                        help="bulk import historical CSV exports into the history file and exit")
+    parser.add_argument('--record', metavar='FILE', default=None,
+                        help="append every raw API response to this gzip log for later replay")
+    parser.add_argument('--replay', metavar='FILE', default=None,
+                        help="answer fetches from a recording instead of OpenWeatherMap")
+    parser.add_argument('--replay-speed', type=float, default=1.0,
+                        help="replay speed factor, e.g. 86400 for a day per second (0 = no pauses)")
+    parser.add_argument('--data-dir', default=None,
+                        help="keep the history and its caches in this directory instead of data/ "
+                             "(default with --replay: a new temporary directory)")
+    parser.add_argument('--api-port', type=int, default=config.API_PORT,
+                        help="serve the read-only JSON query API on this port")
+    parser.add_argument('--log-level', default=config.LOG_LEVEL,
+                        help="logging level (default: %(default)s)")
+    parser.add_argument('--log-json', action='store_true', default=config.LOG_JSON,
+                        help="write log lines as JSON")
+    parser.add_argument('--metrics-port', type=int, default=config.METRICS_PORT,
+                        help="serve Prometheus metrics on this port")
+    parser.add_argument('--metrics-snapshot', default=config.METRICS_SNAPSHOT_FILE,
+                        help="periodically write a JSON metrics snapshot to this file")
+    return parser.parse_args(argv)
+
+def start_metrics_export(args):
+    """Start the optional metrics endpoint and snapshot writer"""
+    from src import metrics
+    exporters = []
+    if args.metrics_port:
+        exporters.append(metrics.MetricsServer(args.metrics_port).start())
+        logging.getLogger(__name__).info("Serving metrics", extra={'port': args.metrics_port})
+    if args.metrics_snapshot:
+        exporters.append(metrics.SnapshotWriter(
+            args.metrics_snapshot, interval=config.METRICS_SNAPSHOT_INTERVAL).start())
+    return exporters
+
+def use_data_dir(directory):
+    """Point the history file and everything stored next to it at another directory"""
+    for name in ('DATA_FILE', 'STATS_CACHE_FILE', 'DEDUP_INDEX_FILE', 'SKETCH_FILE',
+                 'BASELINE_FILE', 'ROLLUP_FILE'):
+        setattr(config, name, os.path.join(directory, os.path.basename(getattr(config, name))))
+    os.makedirs(directory, exist_ok=True)
+
+def create_weather_api(args):
+    """WeatherAPI for --replay/--record, or None for the default live API"""
+    if args.replay:
+        from src.replay import ReplayWeatherAPI
+        return ReplayWeatherAPI(args.replay, speed=args.replay_speed)
+    if args.record:
+        from src.replay import ResponseRecorder
+        from src.weather_api import WeatherAPI
+        return WeatherAPI(recorder=ResponseRecorder(args.record))
+    return None
+
+def start_query_api(port):
+    """Start the query API over a fresh AppState; returns (state, sketches, server)"""
+    import threading
+    from src.app_state import AppState
+    from src.data_storage import DataStorage
+    from src.query_api import QueryServer
+    from src.sketches import HistorySketches
+    state = AppState()
+    sketches = HistorySketches(DataStorage())
+    
+    # The history is read once, in the background, then kept current in memory
+    def warm_up():
+        state.load_history(sketches.data_storage)
+        sketches.catch_up()
+    threading.Thread(target=warm_up, daemon=True).start()
+    
+    server = QueryServer(state, port, sketches=sketches).start()
+    logging.getLogger(__name__).info("Serving query API", extra={'port': server.port})
+    return state, sketches, server
+
+def run_import(file_paths):
+    """Bulk import CSV exports and print a summary per file"""
+    from src.bulk_import import BulkImporter
+    importer = BulkImporter()
+    try:
+        for result in importer.import_files(file_paths):
+            print(f"{result['file']}: {result['imported']} imported, "
+                  f"{result['duplicates']} duplicates, {result['rejected']} rejected "
+                  f"({result['rows']} rows in {result['seconds']}s, "
+                  f"{result['rows_per_second']} rows/s)")
+        # Fold the imported rows into the percentile sketches, the hour-of-day
+        # baseline and the chart rollups now rather than at next startup
+        from src.baseline import ClimatologyBaseline
+        from src.rollups import HistoryRollups
+        from src.sketches import HistorySketches
+        sketches = HistorySketches(importer.data_storage)
+        sketches.catch_up()
+        sketches.flush()
+        baseline = ClimatologyBaseline(importer.data_storage)
+        baseline.catch_up()
+        baseline.flush()
+        rollups = HistoryRollups(importer.data_storage)
+        rollups.catch_up()
+        rollups.flush()
+    finally:
+        importer.close()
 
 def main():
     """Main function to start the weather application"""
+    args = parse_args()
+    
+    from src.log import configure_logging
+    configure_logging(args.log_level, json_format=args.log_json)
+    exporters = start_metrics_export(args)
     
     # Create data directory if it doesn't exist
     if not os.path.exists('data'):
         os.makedirs('data')
     
+    data_dir = args.data_dir
+    if args.replay and data_dir is None:
+        # Replayed readings would otherwise land in the real history, and
+        # replaying the same log twice would store every reading twice
+        import tempfile
+        data_dir = tempfile.mkdtemp(prefix='weather_replay_')
+    if data_dir:
+        use_data_dir(data_dir)
+        logging.getLogger(__name__).info("Using data directory", extra={'path': data_dir})
+    
+    profiler = None
+    if args.profile:
+        from src.profiling import RefreshProfiler
+        profiler = RefreshProfiler(args.profile, output_dir=args.profile_dir,
+                                   trace_memory=args.profile_memory)
+    
+    state = sketches = None
+    weather_api = None
+    if args.api_port and not args.import_files:
+        state, sketches, server = start_query_api(args.api_port)
+        exporters.append(server)
+    
     try:
-        # Start the GUI application
-        app = WeatherGUI()
+        if args.import_files:
+            run_import(args.import_files)
+            return
+        
+        weather_api = create_weather_api(args)
+        
+        if args.headless:
+            from src.collector import WeatherCollector
+            cycles = args.cycles
+            if profiler and cycles is None:
+                cycles = args.profile
+            interval = args.interval
+            if args.replay and interval is None:
+                # The replay paces itself from the recorded timestamps
+                interval = 0
+            WeatherCollector(weather_api=weather_api, profiler=profiler, state=state,
+                             sketches=sketches).run(cycles=cycles, interval=interval)
+            return
+        
+        # Start the GUI application (imported here to keep startup lazy)
+        from src.gui import WeatherGUI
+        app = WeatherGUI(started_at=STARTED_AT, profiler=profiler, state=state,
+                         weather_api=weather_api, continuous=bool(args.replay), sketches=sketches)
         app.run()
     except KeyboardInterrupt:
         print("\nApplication closed by user")
@@ -24,6 +194,14 @@ def main():
     except Exception as e:
         print(f"Error starting application: {e}")
         sys.exit(1)
+    finally:
+        if profiler and profiler.completed_cycles and not profiler.reports_written:
+            # Closed before all N cycles ran; keep what was measured
+            profiler.write_reports()
+        if weather_api is not None and weather_api.recorder:
+            weather_api.recorder.close()
+        for exporter in exporters:
+            exporter.stop()
 
 if __name__ == "__main__":
     main()
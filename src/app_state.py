@@ -0,0 +1,159 @@
+"""
+In-memory application state shared by the refresh cycle and the query API
+"""
+
+import bisect
+import logging
+import threading
+import time
+from src.weather_record import normalize_city
+
+logger = logging.getLogger(__name__)
+
+
+class AppState:
+    """
+    Latest reading, statistics, comparisons and the reading history in memory
+
+    The refresh cycle (GUI or collector) writes here; readers such as the
+    query API only ever read, so requests never touch the disk. Every change
+    bumps version, which readers use to cache their responses.
+    """
+
+    def __init__(self):
+        self.version = 0
+        self.updated_at = None
+        self.history_loaded = False
+        self._lock = threading.Lock()
+        self._current = None
+        self._stats = {}
+        self._comparisons = []
+        self.comparison_sketches = None
+        # Current reading scored against its hour-of-day baseline
+        self._anomaly = None
+        # History sorted by epoch, with the epochs alongside for bisect
+        self._history = []
+        self._epochs = []
+
+    def update(self, weather=None, stats=None, comparisons=None, comparison_sketches=None,
+               anomaly=None):
+        """
+        Replace any of the current reading, display statistics or comparisons
+        Args: weather (WeatherRecord): Latest reading
+              stats (dict): Display statistics from WeatherUtils.build_statistics
+              comparisons (list): Comparison dicts from CSVComparator.compare_with_sacramento
+              comparison_sketches (QuantileSketches): Percentile sketches of the comparison files
+              anomaly (dict): Latest reading scored by ClimatologyBaseline; a new
+                              reading without one clears the previous reading's
+        """
+        with self._lock:
+            if weather is not None:
+                self._current = weather
+                self._anomaly = anomaly
+            if stats is not None:
+                self._stats = stats
+            if comparisons is not None:
+                self._comparisons = comparisons
+            if comparison_sketches is not None:
+                self.comparison_sketches = comparison_sketches
+            elif anomaly is not None:
+                self._anomaly = anomaly
+            self._changed()
+
+    def add_readings(self, records):
+        """Add saved readings to the history (a DataStorage save listener)"""
+        with self._lock:
+            if len(records) == 1:
+                self._insert(records[0])
+            else:
+                # One sort is cheaper than many inserts into the middle of the lists
+                self._history.extend(record for record in records if record.epoch is not None)
+                self._history.sort(key=lambda record: record.epoch)
+                self._epochs = [record.epoch for record in self._history]
+            self._changed()
+
+    def _insert(self, record):
+        if record.epoch is None:
+            return
+        if not self._epochs or record.epoch >= self._epochs[-1]:
+            self._epochs.append(record.epoch)
+            self._history.append(record)
+        else:
+            # Out-of-order reading, e.g. from another city's clock
+            index = bisect.bisect_right(self._epochs, record.epoch)
+            self._epochs.insert(index, record.epoch)
+            self._history.insert(index, record)
+
+    def _changed(self):
+        self.version += 1
+        self.updated_at = time.time()
+
+    def load_history(self, data_storage):
+        """
+        Fill the history from the history file, keeping readings added meanwhile
+        Args: data_storage (DataStorage): Store to read from
+        """
+        loaded = sorted((record for record in data_storage.load_data() if record.epoch is not None),
+                        key=lambda record: record.epoch)
+        epochs = [record.epoch for record in loaded]
+        with self._lock:
+            # Readings saved while the file was being read may or may not be in it
+            known = set()
+            if self._epochs:
+                since = bisect.bisect_left(epochs, self._epochs[0])
+                known = {(record.city, record.epoch) for record in loaded[since:]}
+            added = [record for record in self._history if (record.city, record.epoch) not in known]
+            self._history = loaded
+            self._epochs = epochs
+            for record in added:
+                self._insert(record)
+            self.history_loaded = True
+            self._changed()
+        logger.info("Loaded history into memory", extra={'rows': len(loaded)})
+
+    def snapshot(self):
+        """
+        Consistent view of the current state
+        Returns: tuple: (version, current reading, display stats, comparisons,
+                 the current reading's anomaly score)
+        """
+        with self._lock:
+            return self.version, self._current, self._stats, self._comparisons, self._anomaly
+
+    def history(self, start=None, end=None, city=None):
+        """
+        Readings with start <= epoch < end, oldest first
+        Args: start (float): Epoch seconds, None for the beginning
+              end (float): Epoch seconds, None for no limit
+              city (str): Only this city (any casing); None for all
+        Returns: list: WeatherRecords
+        """
+        with self._lock:
+            low = bisect.bisect_left(self._epochs, start) if start is not None else 0
+            high = bisect.bisect_left(self._epochs, end) if end is not None else len(self._epochs)
+            readings = self._history[low:high]
+        if city:
+            wanted = normalize_city(city)
+            readings = [record for record in readings if normalize_city(record.city) == wanted]
+        return readings
+
+    def window_stats(self, start=None, end=None, city=None):
+        """
+        Temperature statistics over a time window
+        Returns: dict: count, average, min, max, first and latest reading and change
+        """
+        readings = [record for record in self.history(start, end, city)
+                    if record.temperature is not None]
+        stats = {'count': len(readings), 'average': None, 'min': None, 'max': None,
+                 'first': None, 'latest': None, 'change': None}
+        if readings:
+            temperatures = [record.temperature for record in readings]
+            stats.update({
+                'average': round(sum(temperatures) / len(temperatures), 1),
+                'min': min(temperatures),
+                'max': max(temperatures),
+                'first': readings[0].to_dict(),
+                'latest': readings[-1].to_dict(),
+                'change': temperatures[-1] - temperatures[-2] if len(temperatures) > 1 else None
+            })
+        return stats
@@ -0,0 +1,208 @@
+"""
+Incremental hour-of-day climatology baseline and anomaly scores
+"""
+
+import functools
+import logging
+import math
+import os
+import time
+import config
+from src import metrics
+from src.history_follower import HistoryFollower
+from src.weather_record import normalize_city
+
+logger = logging.getLogger(__name__)
+
+BASELINE_ROWS = metrics.counter('weather_baseline_rows', "Readings added to the hour-of-day baseline")
+ANOMALIES = metrics.counter('weather_anomalies', "Readings flagged as unusual for their hour of day")
+ZSCORE = metrics.gauge('weather_temperature_zscore', "Z-score of the latest reading against its hour-of-day baseline")
+
+
+class RunningStats:
+    """Count, mean and variance updated one value at a time (Welford)"""
+
+    __slots__ = ('count', 'mean', 'm2')
+
+    def __init__(self, count=0, mean=0.0, m2=0.0):
+        self.count = count
+        self.mean = mean
+        self.m2 = m2
+
+    def add(self, value):
+        self.count += 1
+        delta = value - self.mean
+        self.mean += delta / self.count
+        self.m2 += delta * (value - self.mean)
+
+    @property
+    def std(self):
+        """Sample standard deviation, or None with fewer than two values"""
+        if self.count < 2:
+            return None
+        return math.sqrt(max(self.m2, 0.0) / (self.count - 1))
+
+    def merge(self, other):
+        """Fold in another RunningStats (Chan et al.'s parallel update)"""
+        if not other.count:
+            return
+        count = self.count + other.count
+        delta = other.mean - self.mean
+        self.mean += delta * other.count / count
+        self.m2 += other.m2 + delta * delta * self.count * other.count / count
+        self.count = count
+
+    def to_list(self):
+        return [self.count, round(self.mean, 6), round(self.m2, 6)]
+
+    @classmethod
+    def from_list(cls, values):
+        return cls(*values)
+
+
+@functools.lru_cache(maxsize=65536)
+def _local_hour(hour):
+    """Local hour of day (0-23) of an hour since the epoch"""
+    return time.localtime(hour * 3600).tm_hour
+
+
+def hour_of_day(epoch):
+    return _local_hour(int(epoch // 3600))
+
+
+class HourlyStats:
+    """RunningStats of the temperature per city and local hour of day"""
+
+    def __init__(self):
+        self.names = {}
+        # city key -> [RunningStats for each hour 0-23]
+        self.hours = {}
+
+    def add(self, record):
+        """Add one WeatherRecord's temperature to its city and hour"""
+        if not record.city or record.epoch is None or record.temperature is None:
+            return False
+        city = normalize_city(record.city)
+        if city not in self.hours:
+            self.hours[city] = [RunningStats() for _ in range(24)]
+        self._name(city, record.city)
+        self.hours[city][hour_of_day(record.epoch)].add(record.temperature)
+        return True
+
+    def add_records(self, records):
+        """Add every record of an iterable; returns how many were added"""
+        count = 0
+        for record in records:
+            if record is not None and self.add(record):
+                count += 1
+        return count
+
+    def _name(self, city, name):
+        known = self.names.get(city)
+        if known is None or (known.islower() and not name.islower()):
+            self.names[city] = name
+
+    def merge(self, other):
+        """Fold another HourlyStats into this one"""
+        for city, name in other.names.items():
+            self._name(city, name)
+        for city, hours in other.hours.items():
+            mine = self.hours.get(city)
+            if mine is None:
+                self.hours[city] = hours
+            else:
+                for stats, added in zip(mine, hours):
+                    stats.merge(added)
+        return self
+
+    def get(self, city, hour):
+        """RunningStats of a city (any casing) at an hour, or None"""
+        hours = self.hours.get(normalize_city(city or ''))
+        return hours[hour] if hours else None
+
+    def to_dict(self):
+        return {city: {'name': self.names.get(city, city),
+                       'hours': [stats.to_list() for stats in hours]}
+                for city, hours in self.hours.items()}
+
+    @classmethod
+    def from_dict(cls, data):
+        stats = cls()
+        for city, entry in data.items():
+            stats.names[city] = entry.get('name', city)
+            stats.hours[city] = [RunningStats.from_list(values) for values in entry['hours']]
+        return stats
+
+
+class ClimatologyBaseline(HistoryFollower):
+    """
+    Temperature mean and variance per city and local hour of day, kept on disk
+    next to the history file
+
+    Each row is added in O(1) as the baseline catches up on the history.
+    """
+
+    KEY = 'baseline'
+    DESCRIPTION = 'climatology baseline'
+    ROWS = BASELINE_ROWS
+
+    def __init__(self, data_storage, path=None, threshold=None, min_samples=None):
+        super().__init__(data_storage, path or os.path.join(
+            os.path.dirname(data_storage.data_file), os.path.basename(config.BASELINE_FILE)))
+        self.threshold = threshold or config.ANOMALY_Z_THRESHOLD
+        self.min_samples = min_samples or config.BASELINE_MIN_SAMPLES
+
+    def _empty(self):
+        return HourlyStats()
+
+    def _from_dict(self, data):
+        return HourlyStats.from_dict(data)
+
+    def score(self, record):
+        """
+        Compare a reading with the usual temperature for its city and hour
+        Args: record (WeatherRecord): Reading to score
+        Returns: dict: city, hour, temperature, mean, std, count, deviation, z and
+                 flagged; z is None (and flagged False) until the hour has
+                 min_samples readings with some spread. None if the reading has
+                 no temperature or timestamp.
+        """
+        if record.temperature is None or record.epoch is None:
+            return None
+        hour = hour_of_day(record.epoch)
+        with self._lock:
+            stats = (self.summary.get(record.city, hour) if self.summary is not None else None) or RunningStats()
+            count, mean, std = stats.count, stats.mean, stats.std
+
+        result = {'city': record.city, 'hour': hour, 'temperature': record.temperature,
+                  'count': count, 'mean': None, 'std': None, 'deviation': None,
+                  'z': None, 'flagged': False}
+        if count:
+            result['mean'] = round(mean, 1)
+            result['deviation'] = round(record.temperature - mean, 1)
+        if std:
+            result['std'] = round(std, 2)
+            if count >= self.min_samples:
+                z = (record.temperature - mean) / std
+                result['z'] = round(z, 2)
+                result['flagged'] = abs(z) >= self.threshold
+        return result
+
+    def observe(self, record):
+        """
+        Score a new reading against the baseline as it stands before that reading
+        is saved; the reading itself is added by a later catch_up()
+        Returns: dict from score(), or None
+        """
+        self.catch_up()
+        result = self.score(record)
+        if result is None:
+            return None
+        if result['z'] is not None:
+            ZSCORE.set(result['z'], city=record.city)
+        if result['flagged']:
+            ANOMALIES.inc(city=record.city)
+            logger.warning("Unusual temperature for the hour", extra={
+                'city': record.city, 'temperature': record.temperature,
+                'usual': result['mean'], 'z': result['z']})
+        return result
@@ -0,0 +1,106 @@
+"""
+Group-commit writer that batches readings before they reach the history file
+"""
+
+import atexit
+import logging
+import threading
+import time
+from src import metrics
+
+logger = logging.getLogger(__name__)
+
+FLUSHES = metrics.counter('weather_storage_flushes', "Buffered writer flushes by trigger")
+BATCH_SIZE = metrics.histogram('weather_storage_flush_records', "Readings written per buffered flush",
+                               buckets=(1, 2, 5, 10, 25, 50, 100, 250, 1000))
+
+
+class BufferedWriter:
+    """
+    Collects readings and writes them to DataStorage in one batch
+
+    A flush happens when max_records readings are waiting, max_delay_ms after
+    the first waiting reading, or on close(). Readings that are waiting are
+    still visible through pending() so readers don't lose them.
+    """
+
+    def __init__(self, data_storage, max_records, max_delay_ms, fsync=False):
+        self.data_storage = data_storage
+        self.max_records = max(1, max_records)
+        self.max_delay = max_delay_ms / 1000
+        self.fsync = fsync
+
+        self._buffer = []
+        self._lock = threading.Lock()
+        # Keeps flushes in order when the timer and a caller flush at once
+        self._flush_lock = threading.Lock()
+        self._timer = None
+        self._closed = False
+        atexit.register(self.close)
+
+    def add(self, record):
+        """Queue a reading; flushes right away once the buffer is full"""
+        with self._lock:
+            if self._closed:
+                raise RuntimeError("BufferedWriter is closed")
+            self._buffer.append(record)
+            full = len(self._buffer) >= self.max_records
+            if not full and self._timer is None and self.max_delay > 0:
+                self._timer = threading.Timer(self.max_delay, self._flush_on_timer)
+                self._timer.daemon = True
+                self._timer.start()
+
+        if full or self.max_delay <= 0:
+            self.flush('size' if full else 'immediate')
+
+    def pending(self):
+        """Readings accepted but not yet written"""
+        with self._lock:
+            return list(self._buffer)
+
+    def _flush_on_timer(self):
+        try:
+            self.flush('timer')
+        except Exception:
+            logger.exception("Error flushing buffered readings",
+                             extra={'path': self.data_storage.data_file})
+
+    def flush(self, trigger='manual'):
+        """
+        Write every waiting reading in one batch
+        Args: trigger (str): What caused the flush, for the metrics
+        Returns: int: Number of readings written
+        """
+        with self._flush_lock:
+            with self._lock:
+                batch, self._buffer = self._buffer, []
+                if self._timer is not None:
+                    self._timer.cancel()
+                    self._timer = None
+            if not batch:
+                return 0
+
+            start = time.perf_counter()
+            try:
+                self.data_storage.write_records(batch, fsync=self.fsync)
+            except Exception:
+                # Put the readings back in front so nothing is lost or reordered
+                with self._lock:
+                    self._buffer[:0] = batch
+                raise
+
+        FLUSHES.inc(trigger=trigger)
+        BATCH_SIZE.observe(len(batch))
+        logger.debug("Flushed buffered readings", extra={
+            'records': len(batch), 'trigger': trigger,
+            'ms': round((time.perf_counter() - start) * 1000, 2)})
+        return len(batch)
+
+    def close(self):
+        """Flush what is left and stop accepting readings"""
+        with self._lock:
+            if self._closed:
+                return
+            self._closed = True
+        atexit.unregister(self.close)
+        self.flush('shutdown')
@@ -0,0 +1,195 @@
+"""
+Bulk import of historical CSV exports into the history store
+"""
+
+import logging
+import os
+import sqlite3
+import string
+import time
+import config
+from src import metrics
+from src.csv_comparator import CSVComparator
+from src.data_storage import DataStorage
+from src.weather_record import normalize_city
+
+logger = logging.getLogger(__name__)
+
+IMPORT_ROWS = metrics.counter('weather_import_rows', "Rows read by bulk import, by result")
+IMPORT_SECONDS = metrics.histogram('weather_import_file_seconds', "Time spent importing one file",
+                                   buckets=(0.1, 1.0, 10.0, 60.0, 300.0, 1800.0))
+
+
+class DedupIndex:
+    """
+    On-disk set of (normalized city, timestamp) keys already in the history
+
+    Backed by SQLite so it never has to fit in memory. It also remembers
+    how far into the history file it has indexed, so readings saved by the
+    app between imports are picked up before the next import.
+    """
+
+    def __init__(self, path=None):
+        self.path = path or config.DEDUP_INDEX_FILE
+        os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+        self.connection = sqlite3.connect(self.path)
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.execute("PRAGMA synchronous=NORMAL")
+        self.connection.execute(
+            "CREATE TABLE IF NOT EXISTS readings ("
+            "city TEXT NOT NULL, epoch INTEGER NOT NULL, PRIMARY KEY (city, epoch)"
+            ") WITHOUT ROWID")
+        self.connection.execute(
+            "CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT)")
+        self.connection.commit()
+
+    @staticmethod
+    def key(record):
+        """Dedup key for a record: whole seconds, case-insensitive city"""
+        return normalize_city(record.city), int(round(record.epoch))
+
+    def add(self, record):
+        """
+        Add a record's key in the current transaction
+        Returns: bool: True if the key was new, False if it was already indexed
+        """
+        cursor = self.connection.execute(
+            "INSERT OR IGNORE INTO readings (city, epoch) VALUES (?, ?)", self.key(record))
+        return cursor.rowcount == 1
+
+    def get_meta(self, key, default=None):
+        row = self.connection.execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+        return row[0] if row else default
+
+    def set_meta(self, key, value):
+        self.connection.execute(
+            "INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)", (key, str(value)))
+
+    def catch_up(self, storage, commit=True):
+        """
+        Index history rows written since the last catch-up
+        Args: storage (DataStorage): History store the index describes
+              commit (bool): Commit the new keys; False leaves them in the current transaction
+        Returns: int: Number of rows scanned
+        """
+        generation = storage.generation()
+        try:
+            size = storage.complete_size()
+        except FileNotFoundError:
+            return 0
+
+        offset = int(self.get_meta('history_offset', 0))
+        if size < offset or int(self.get_meta('history_generation', 0)) != generation:
+            # The history was rewritten (e.g. trimmed); index it from the start
+            offset = 0
+
+        scanned = 0
+        for record in storage.iter_records(start=offset, stop=size):
+            if record.epoch is not None and record.city:
+                self.add(record)
+            scanned += 1
+        self.set_meta('history_offset', size)
+        self.set_meta('history_generation', generation)
+        if commit:
+            self.connection.commit()
+        return scanned
+
+    def commit(self):
+        self.connection.commit()
+
+    def rollback(self):
+        self.connection.rollback()
+
+    def close(self):
+        self.connection.close()
+
+
+class BulkImporter:
+    """Streams partner CSV exports into DataStorage without duplicating readings"""
+
+    def __init__(self, data_storage=None, csv_comparator=None, index=None, batch_size=None):
+        self.data_storage = data_storage or DataStorage()
+        self.csv_comparator = csv_comparator or CSVComparator()
+        self.index = index or DedupIndex()
+        self.batch_size = batch_size or config.IMPORT_BATCH_SIZE
+
+    @staticmethod
+    def display_city(city):
+        """Tidy the stored spelling of an all-lowercase city ('new york' -> 'New York')"""
+        city = ' '.join(city.split())
+        return string.capwords(city) if city.islower() else city
+
+    def _write_batch(self, batch):
+        """
+        Append a batch, then commit its keys so the index never runs ahead of the file
+
+        Under the storage lock, rows other processes appended since the last
+        catch-up are indexed first and the offset is taken right after the
+        batch's own write, so no rows end up behind the offset unindexed.
+        """
+        with self.data_storage.lock:
+            self.index.catch_up(self.data_storage, commit=False)
+            self.data_storage.append_records(batch)
+            self.index.set_meta('history_offset', self.data_storage.complete_size())
+        self.index.commit()
+
+    def import_file(self, file_path):
+        """
+        Import every usable row of a CSV file
+        Args: file_path (str): Export in any layout CSVComparator understands
+        Returns: dict: rows read, imported, duplicates, rejected, seconds and rows_per_second
+        """
+        start = time.perf_counter()
+        result = {'file': file_path, 'rows': 0, 'imported': 0, 'duplicates': 0, 'rejected': 0}
+
+        # Readings the app saved since the last import must count as duplicates too
+        self.index.catch_up(self.data_storage)
+
+        batch = []
+        try:
+            for record in self.csv_comparator.iter_city_records(file_path, skip_invalid=False):
+                result['rows'] += 1
+
+                # Without a city and a timestamp a row can't be placed in the history
+                if record is None or not record.city or record.epoch is None:
+                    result['rejected'] += 1
+                    continue
+
+                record.city = self.display_city(record.city)
+                # The history stores the reading itself, not where it came from
+                record.source_file = None
+                if not self.index.add(record):
+                    result['duplicates'] += 1
+                    continue
+
+                batch.append(record)
+                if len(batch) >= self.batch_size:
+                    self._write_batch(batch)
+                    result['imported'] += len(batch)
+                    batch = []
+                    logger.debug("Import progress", extra=dict(result))
+
+            if batch:
+                self._write_batch(batch)
+                result['imported'] += len(batch)
+        except Exception:
+            self.index.rollback()
+            raise
+
+        elapsed = time.perf_counter() - start
+        IMPORT_SECONDS.observe(elapsed)
+        for outcome in ('imported', 'duplicates', 'rejected'):
+            IMPORT_ROWS.inc(result[outcome], result=outcome)
+
+        result['seconds'] = round(elapsed, 3)
+        result['rows_per_second'] = round(result['rows'] / elapsed) if elapsed else None
+        logger.info("Imported %s", file_path, extra={
+            key: value for key, value in result.items() if key != 'file'})
+        return result
+
+    def import_files(self, file_paths):
+        """Import several files in order; returns one result dict per file"""
+        return [self.import_file(file_path) for file_path in file_paths]
+
+    def close(self):
+        self.index.close()
@@ -0,0 +1,138 @@
+"""
+Headless collector that runs the refresh cycle without the GUI
+"""
+
+import logging
+import time
+import config
+from src import metrics
+from src.app_state import AppState
+from src.baseline import ClimatologyBaseline
+from src.data_storage import DataStorage
+from src.profiling import NullProfiler
+from src.sketches import HistorySketches
+from src.utils import WeatherUtils
+
+logger = logging.getLogger(__name__)
+
+REFRESH_SECONDS = metrics.histogram('weather_refresh_seconds', "Duration of a full refresh cycle")
+REFRESH_CYCLES = metrics.counter('weather_refresh_cycles', "Refresh cycles by outcome")
+LAST_TEMPERATURE = metrics.gauge('weather_temperature_fahrenheit', "Most recent temperature reading")
+
+class WeatherCollector:
+    """Runs the fetch -> save -> statistics -> compare cycle without Tk"""
+
+    def __init__(self, weather_api=None, data_storage=None, csv_comparator=None, profiler=None,
+                 state=None, sketches=None, baseline=None):
+        if weather_api is None:
+            from src.weather_api import WeatherAPI
+            weather_api = WeatherAPI()
+        if csv_comparator is None:
+            from src.csv_comparator import CSVComparator
+            csv_comparator = CSVComparator()
+
+        self.weather_api = weather_api
+        self.data_storage = data_storage or DataStorage()
+        self.csv_comparator = csv_comparator
+        self.utils = WeatherUtils()
+        self.profiler = profiler or NullProfiler()
+        self.current_weather = None
+        # In-memory copy of the results, served by the query API
+        self.state = state or AppState()
+        self.data_storage.add_listener(self.state.add_readings)
+        self.sketches = sketches or HistorySketches(self.data_storage)
+        self.baseline = baseline or ClimatologyBaseline(self.data_storage)
+
+    def refresh(self):
+        """
+        Run one full refresh cycle
+        Returns: dict with 'weather', 'anomaly', 'stats' and 'comparisons' or None if the fetch failed
+        """
+        self.profiler.start_cycle()
+        try:
+            with REFRESH_SECONDS.time():
+                result = self._refresh()
+        finally:
+            self.profiler.end_cycle()
+        REFRESH_CYCLES.inc(outcome='success' if result else 'failed')
+        return result
+
+    def _refresh(self):
+        with self.profiler.stage('fetch_current_weather'):
+            weather_data = self.weather_api.fetch_current_weather()
+        if not weather_data:
+            return None
+
+        self.current_weather = weather_data
+        LAST_TEMPERATURE.set(weather_data.temperature, city=weather_data.city)
+        # Scored before saving so the reading isn't part of its own baseline
+        with self.profiler.stage('score_anomaly'):
+            anomaly = self.baseline.observe(weather_data)
+        # Together, so the query API never pairs this reading with the last one's score
+        self.state.update(weather=weather_data, anomaly=anomaly)
+        with self.profiler.stage('save_weather_data'):
+            self.data_storage.save_weather_data(weather_data)
+
+        with self.profiler.stage('update_statistics'):
+            recent_data = self.data_storage.get_recent_data(days=7, city=weather_data.city)
+            self.sketches.catch_up()
+            stats = self.utils.build_statistics(recent_data, weather_data, sketches=self.sketches,
+                                                anomaly=anomaly)
+            if stats:
+                self.data_storage.save_cached_stats(stats)
+            self.state.update(stats=stats)
+
+        with self.profiler.stage('compare_with_sacramento'):
+            comparisons = self.csv_comparator.compare_with_sacramento(weather_data)
+            comparison_sketches = self.csv_comparator.get_comparison_sketches()
+        self.state.update(comparisons=comparisons, comparison_sketches=comparison_sketches)
+
+        return {
+            'weather': weather_data,
+            'anomaly': anomaly,
+            'stats': stats,
+            'comparisons': comparisons
+        }
+
+    def run(self, cycles=None, interval=None):
+        """
+        Refresh repeatedly until cycles have run (forever if None) or a replay runs out
+        Args: cycles (int): Number of refresh cycles to run
+              interval (float): Seconds between cycles, defaults to config.REFRESH_INTERVAL
+        """
+        if interval is None:
+            interval = config.REFRESH_INTERVAL / 1000
+
+        completed = 0
+        try:
+            while cycles is None or completed < cycles:
+                result = self.refresh()
+                completed += 1
+
+                if getattr(self.weather_api, 'exhausted', False):
+                    # A replayed recording has run out
+                    break
+                if result:
+                    weather = result['weather']
+                    anomaly = result['anomaly'] or {}
+                    logger.info("Weather updated", extra={
+                        'city': weather.city,
+                        'temperature': weather.temperature,
+                        'z': anomaly.get('z'),
+                        'unusual': anomaly.get('flagged', False),
+                        'description': weather.description,
+                        'comparisons': len(result['comparisons'])
+                    })
+                else:
+                    logger.warning("Failed to fetch weather data")
+
+                if cycles is None or completed < cycles:
+                    time.sleep(interval)
+        finally:
+            self.close()
+
+    def close(self):
+        """Write any readings still waiting in the storage write buffer, and unsaved sketches and baseline"""
+        self.data_storage.close()
+        self.sketches.flush()
+        self.baseline.flush()
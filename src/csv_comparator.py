@@ -4,15 +4,30 @@ CSV Comparator module for comparing Sacramento weather with other cities
 
 import os
 import csv
+import functools
+import logging
 from datetime import datetime
 import config
+from src import metrics
+from src.weather_record import WeatherRecord, parse_timestamp
+
+logger = logging.getLogger(__name__)
+
+FILES_PARSED = metrics.counter('weather_comparison_files_parsed', "Comparison CSV files parsed by result")
+SCAN_SECONDS = metrics.histogram('weather_comparison_scan_seconds', "Time spent scanning comparison files")
+CACHE_REQUESTS = metrics.counter('weather_cache_requests', "Cache lookups by cache and result")
 
 class CSVComparator:
    """Handles CSV file processing and city comparison"""
    
-   def __init__(self):
-       self.data_dir = config.COMPARISON_CSV_DIR
-       self.app_data_file = config.DATA_FILE
+   def __init__(self, data_dir=None, app_data_file=None):
+       self.data_dir = data_dir or config.COMPARISON_CSV_DIR
+       self.app_data_file = app_data_file or config.DATA_FILE
+       # Parsed result per file, reused while the file's mtime and size are unchanged
+       self._parse_cache = {}
+       # Quantile sketches per file, cached the same way
+       self._sketch_cache = {}
+       self._rollup_cache = {}
        
    def get_comparison_files(self):
        """Get list of CSV files to compare (excluding app's own data file)"""
@@ -24,7 +39,7 @@ class CSVComparator:
                        all_files.append(os.path.join(self.data_dir, file))
            return all_files
        except Exception as e:
-           print(f"Error getting comparison files: {e}")
+           logger.error("Error getting comparison files: %s", e, extra={'path': self.data_dir})
            return []
    
    def normalize_column_names(self, headers):
@@ -80,7 +95,7 @@ class CSVComparator:
                    
                    # Check if we have required columns
                    if 'city' not in column_map or 'temperature' not in column_map:
-                       print(f"Skipping {file_path}: Missing required columns")
+                       logger.info("Skipping %s: Missing required columns", file_path)
                        return None
                    
                    # Get first data row
@@ -88,7 +103,7 @@ class CSVComparator:
                        first_row = next(reader)
                        return self.extract_city_data(first_row, column_map, file_path)
                    except StopIteration:
-                       print(f"Skipping {file_path}: No data rows")
+                       logger.info("Skipping %s: No data rows", file_path)
                        return None
                else:
                    # No header, try to guess format based on first row
@@ -96,67 +111,77 @@ class CSVComparator:
                    return self.guess_format_and_extract(first_row, file_path)
                    
        except Exception as e:
-           print(f"Error parsing {file_path}: {e}")
+           logger.warning("Error parsing %s: %s", file_path, e)
            return None
    
    def extract_city_data(self, row, column_map, file_path):
-       """Extract city data from a row using column mapping"""
+       """
+       Extract city data from a row using column mapping
+       Returns: WeatherRecord or None if the row has no usable temperature
+       """
        try:
-           city_data = {
-               'source_file': os.path.basename(file_path),
-               'city': row[column_map['city']].strip(),
-               'temperature': None,
-               'feels_like': None,
-               'humidity': None,
-               'description': None,
-               'state': None
-           }
+           city = row[column_map['city']].strip()
+           temperature = None
+           feels_like = None
+           humidity = None
+           description = None
+           state = None
+           epoch = None
            
            # Extract temperature
            if 'temperature' in column_map:
                temp_str = row[column_map['temperature']].strip()
                try:
-                   city_data['temperature'] = round(float(temp_str))
+                   temperature = round(float(temp_str))
                except ValueError:
-                   print(f"Invalid temperature in {file_path}: {temp_str}")
+                   logger.debug("Invalid temperature in %s: %s", file_path, temp_str)
                    return None
            
            # Extract optional fields
            if 'feels_like' in column_map and column_map['feels_like'] < len(row):
                try:
-                   city_data['feels_like'] = round(float(row[column_map['feels_like']]))
+                   feels_like = round(float(row[column_map['feels_like']]))
                except (ValueError, IndexError):
                    pass
            
            if 'humidity' in column_map and column_map['humidity'] < len(row):
                try:
-                   city_data['humidity'] = int(float(row[column_map['humidity']]))
+                   humidity = int(float(row[column_map['humidity']]))
                except (ValueError, IndexError):
                    pass
            
            if 'description' in column_map and column_map['description'] < len(row):
-               try:
-                   city_data['description'] = row[column_map['description']].strip()
-               except IndexError:
-                   pass
+               description = row[column_map['description']].strip()
            
            if 'state' in column_map and column_map['state'] < len(row):
-               try:
-                   city_data['state'] = row[column_map['state']].strip()
-               except IndexError:
-                   pass
+               state = row[column_map['state']].strip()
+           
+           if 'date' in column_map and column_map['date'] < len(row):
+               date_str = row[column_map['date']]
+               if 'time' in column_map and column_map['time'] < len(row):
+                   date_str = f"{date_str} {row[column_map['time']]}"
+               epoch = parse_timestamp(date_str)
            
-           return city_data
+           return WeatherRecord(
+               city=city,
+               temperature=temperature,
+               feels_like=feels_like,
+               humidity=humidity,
+               description=description,
+               epoch=epoch,
+               state=state,
+               source_file=os.path.basename(file_path)
+           )
            
        except Exception as e:
-           print(f"Error extracting data from {file_path}: {e}")
+           logger.warning("Error extracting data from %s: %s", file_path, e)
            return None
    
    def guess_format_and_extract(self, row, file_path):
        """Attempt to guess format when no headers are present"""
        # Skip files that are clearly malformed
        if len(row) < 2:
-           print(f"Skipping {file_path}: Too few columns")
+           logger.info("Skipping %s: Too few columns", file_path)
            return None
        
        # Try common patterns
@@ -167,61 +192,189 @@ class CSVComparator:
                temp = float(row[1])
                desc = row[2].strip()
                
-               return {
-                   'source_file': os.path.basename(file_path),
-                   'city': city,
-                   'temperature': round(temp),
-                   'feels_like': None,
-                   'humidity': None,
-                   'description': desc,
-                   'state': None
-               }
+               return WeatherRecord(
+                   city=city,
+                   temperature=round(temp),
+                   description=desc,
+                   source_file=os.path.basename(file_path)
+               )
        except (ValueError, IndexError):
            pass
        
-       print(f"Skipping {file_path}: Could not determine format")
+       logger.info("Skipping %s: Could not determine format", file_path)
        return None
    
+   def iter_city_records(self, file_path, skip_invalid=True):
+       """
+       Stream every row of a CSV file as a WeatherRecord, using the same
+       header detection and column normalization as parse_csv_file
+       Args: file_path (str): CSV file to read (can be larger than memory)
+             skip_invalid (bool): If False, yield None for rows that can't be used
+       Yields: WeatherRecord (or None for unusable rows when skip_invalid is False)
+       """
+       with open(file_path, 'r', encoding='utf-8', newline='') as file:
+           sample = file.read(1024)
+           file.seek(0)
+           reader = csv.reader(file)
+           
+           if csv.Sniffer().has_header(sample):
+               column_map = self.normalize_column_names(next(reader))
+               if 'city' not in column_map or 'temperature' not in column_map:
+                   logger.info("Skipping %s: Missing required columns", file_path)
+                   return
+               extract = functools.partial(self.extract_city_data, column_map=column_map,
+                                           file_path=file_path)
+           else:
+               extract = functools.partial(self.guess_format_and_extract, file_path=file_path)
+           
+           for row in reader:
+               if not row:
+                   continue
+               record = extract(row)
+               if record is not None or not skip_invalid:
+                   yield record
+   
    def get_all_comparison_cities(self):
        """Get weather data for all cities from CSV files"""
-       comparison_files = self.get_comparison_files()
-       cities_data = []
-       
-       for file_path in comparison_files:
-           city_data = self.parse_csv_file(file_path)
-           if city_data:
-               cities_data.append(city_data)
+       with SCAN_SECONDS.time():
+           comparison_files = self.get_comparison_files()
+           cities_data = []
+           
+           for file_path in comparison_files:
+               city_data = self.get_city_data(file_path)
+               if city_data:
+                   cities_data.append(city_data)
        
        return cities_data
    
+   def get_city_data(self, file_path):
+       """Parse a comparison file, reusing the previous result if the file is unchanged"""
+       try:
+           stat = os.stat(file_path)
+           signature = (stat.st_mtime_ns, stat.st_size)
+       except OSError:
+           signature = None
+       
+       cached = self._parse_cache.get(file_path)
+       if signature is not None and cached is not None and cached[0] == signature:
+           CACHE_REQUESTS.inc(cache='comparison_file', result='hit')
+           return cached[1]
+       
+       CACHE_REQUESTS.inc(cache='comparison_file', result='miss')
+       city_data = self.parse_csv_file(file_path)
+       FILES_PARSED.inc(result='ok' if city_data else 'skipped')
+       if signature is not None:
+           self._parse_cache[file_path] = (signature, city_data)
+       return city_data
+   
+   def get_file_sketches(self, file_path):
+       """
+       Quantile sketches of every row in a comparison file, reused while it is unchanged
+       Args: file_path (str): CSV file to summarize
+       Returns: QuantileSketches
+       """
+       from src.sketches import QuantileSketches
+       try:
+           stat = os.stat(file_path)
+           signature = (stat.st_mtime_ns, stat.st_size)
+       except OSError:
+           return QuantileSketches()
+       
+       cached = self._sketch_cache.get(file_path)
+       if cached is not None and cached[0] == signature:
+           CACHE_REQUESTS.inc(cache='comparison_sketch', result='hit')
+           return cached[1]
+       
+       CACHE_REQUESTS.inc(cache='comparison_sketch', result='miss')
+       sketches = QuantileSketches()
+       try:
+           sketches.add_records(self.iter_city_records(file_path))
+       except (OSError, csv.Error, UnicodeDecodeError) as e:
+           logger.warning("Error reading %s: %s", file_path, e)
+       sketches.fold()
+       sketches.compress()
+       self._sketch_cache[file_path] = (signature, sketches)
+       return sketches
+   
+   def get_comparison_sketches(self):
+       """
+       Quantile sketches merged over all comparison files
+       Returns: QuantileSketches covering every city found in them
+       """
+       from src.sketches import QuantileSketches
+       merged = QuantileSketches()
+       for file_path in self.get_comparison_files():
+           merged.merge(self.get_file_sketches(file_path))
+       # Compressed once here rather than by every query that reads them
+       merged.compress()
+       return merged
+   
+   def get_file_rollups(self, file_path):
+       """
+       Temperature rollups of the dated rows in a comparison file, reused while it is unchanged
+       Args: file_path (str): CSV file to summarize
+       Returns: Rollups
+       """
+       from src.rollups import Rollups
+       try:
+           stat = os.stat(file_path)
+           signature = (stat.st_mtime_ns, stat.st_size)
+       except OSError:
+           return Rollups()
+       
+       cached = self._rollup_cache.get(file_path)
+       if cached is not None and cached[0] == signature:
+           CACHE_REQUESTS.inc(cache='comparison_rollup', result='hit')
+           return cached[1]
+       
+       CACHE_REQUESTS.inc(cache='comparison_rollup', result='miss')
+       rollups = Rollups()
+       try:
+           rollups.add_records(self.iter_city_records(file_path))
+       except (OSError, csv.Error, UnicodeDecodeError) as e:
+           logger.warning("Error reading %s: %s", file_path, e)
+       self._rollup_cache[file_path] = (signature, rollups)
+       return rollups
+   
+   def get_comparison_rollups(self):
+       """
+       Temperature rollups of every comparison file
+       Returns: list: One Rollups per file
+       """
+       return [self.get_file_rollups(file_path) for file_path in self.get_comparison_files()]
+   
    def compare_with_sacramento(self, sacramento_data):
-       """Compare Sacramento weather with other cities"""
+       """
+       Compare Sacramento weather with other cities
+       Args: sacramento_data (WeatherRecord): Current Sacramento reading
+       Returns: list: Comparison dicts for display, closest temperature first
+       """
        if not sacramento_data:
            return []
        
        comparison_cities = self.get_all_comparison_cities()
        comparisons = []
        
-       sacramento_temp = sacramento_data.get('temperature')
-       sacramento_humidity = sacramento_data.get('humidity')
+       sacramento_temp = sacramento_data.temperature
+       sacramento_humidity = sacramento_data.humidity
        
        for city_data in comparison_cities:
            comparison = {
-               'city': city_data['city'],
-               'state': city_data['state'],
-               'temperature': city_data['temperature'],
-               'feels_like': city_data['feels_like'],
-               'humidity': city_data['humidity'],
-               'description': city_data['description'],
-               'source_file': city_data['source_file'],
+               'city': city_data.city,
+               'state': city_data.state,
+               'temperature': city_data.temperature,
+               'feels_like': city_data.feels_like,
+               'humidity': city_data.humidity,
+               'description': city_data.description,
+               'source_file': city_data.source_file,
                'temp_difference': None,
                'humidity_difference': None,
                'temp_comparison': None
            }
            
            # Calculate temperature difference
-           if sacramento_temp is not None and city_data['temperature'] is not None:
-               temp_diff = city_data['temperature'] - sacramento_temp
+           if sacramento_temp is not None and city_data.temperature is not None:
+               temp_diff = city_data.temperature - sacramento_temp
                comparison['temp_difference'] = temp_diff
                
                if temp_diff > 0:
@@ -232,8 +385,8 @@ class CSVComparator:
                    comparison['temp_comparison'] = "Same temperature"
            
            # Calculate humidity difference
-           if sacramento_humidity is not None and city_data['humidity'] is not None:
-               humidity_diff = city_data['humidity'] - sacramento_humidity
+           if sacramento_humidity is not None and city_data.humidity is not None:
+               humidity_diff = city_data.humidity - sacramento_humidity
                comparison['humidity_difference'] = humidity_diff
            
            comparisons.append(comparison)
@@ -3,112 +3,651 @@ Data storage module for saving and loading weather data
 """
 
 import csv
+import io
+import json
+import logging
 import os
-from datetime import datetime
+import stat
+import tempfile
+import threading
+import time
 import config
+from src import metrics
+from src.file_lock import FileLock
+from src.weather_record import HISTORY_FIELDNAMES, WeatherRecord, normalize_city
+
+logger = logging.getLogger(__name__)
+
+SAVE_SECONDS = metrics.histogram('weather_storage_save_seconds', "Time spent saving a reading")
+LOAD_SECONDS = metrics.histogram('weather_storage_load_seconds', "Time spent loading the history file")
+RECORDS_SAVED = metrics.counter('weather_storage_records_saved', "Readings written to the history file")
+SAVE_ERRORS = metrics.counter('weather_storage_save_errors', "Failed attempts to save a reading")
+ROWS_SCANNED = metrics.counter('weather_storage_rows_scanned', "History rows parsed from disk")
+CACHE_REQUESTS = metrics.counter('weather_cache_requests', "Cache lookups by cache and result")
+
+# Read once at import; os.umask() can only be queried by setting it
+_UMASK = os.umask(0)
+os.umask(_UMASK)
+
+# Trims remembered in the generation file; a reader more trims behind than this starts over
+GENERATION_LOG_LENGTH = 256
+
+def mkstemp_like(path):
+    """
+    Create a temporary file next to path, with path's permissions
+    
+    mkstemp() makes files only their owner can read; a file renamed over
+    path must keep path's mode so other users' processes can still read it.
+    Args: path (str): File the temporary file will replace
+    Returns: tuple: (open file descriptor, temporary path)
+    """
+    directory = os.path.dirname(path) or '.'
+    os.makedirs(directory, exist_ok=True)
+    handle, temp_path = tempfile.mkstemp(prefix=os.path.basename(path) + '.', suffix='.tmp', dir=directory)
+    try:
+        mode = stat.S_IMODE(os.stat(path).st_mode)
+    except FileNotFoundError:
+        # A new file gets what open() would have given it
+        mode = 0o666 & ~_UMASK
+    try:
+        os.chmod(temp_path, mode)
+    except BaseException:
+        os.close(handle)
+        os.remove(temp_path)
+        raise
+    return handle, temp_path
+
+class HistoryTail:
+    """
+    The rows a reader that keeps a byte offset has not read yet, from one
+    consistent view of the history file (see DataStorage.follow())
+    
+    Attributes: start (int): Byte offset to read from; 0 if restart
+                stop (int): Byte offset the reader will have read up to
+                generation (int): generation() the new offset belongs to
+                restart (bool): The history was rewritten; the reader must drop what it has
+    """
+    
+    def __init__(self, storage, file, start, stop, generation, restart=False):
+        self.storage = storage
+        self.file = file
+        self.start = 0 if restart else start
+        self.stop = stop
+        self.generation = generation
+        self.restart = restart
+    
+    def records(self):
+        """Yields: WeatherRecord for each row from start to stop"""
+        return self.storage._iter_file(self.file, self.start, self.stop)
+    
+    def close(self):
+        self.file.close()
+    
+    def __enter__(self):
+        return self
+    
+    def __exit__(self, *exc_info):
+        self.close()
 
 class DataStorage:
     """Handles file-based storage of weather data"""
     
-    def __init__(self):
-        self.data_file = config.DATA_FILE
-        self.fieldnames = [
-            'city', 'temperature', 'feels_like', 'humidity', 
-            'description', 'timestamp', 'date', 'time'
-        ]
-        print(f"DataStorage initialized with file: {self.data_file}")
-        self.ensure_data_file_exists()
+    def __init__(self, data_file=None):
+        # Nothing touches the disk here so startup stays fast; the data
+        # file is created on the first save instead.
+        self.data_file = data_file or config.DATA_FILE
+        self.stats_cache_file = os.path.join(
+            os.path.dirname(self.data_file), os.path.basename(config.STATS_CACHE_FILE))
+        self.fieldnames = HISTORY_FIELDNAMES
+        # Called with each list of newly saved readings
+        self.listeners = []
+        # Serializes writers across processes; readers only take it in follow()
+        self.lock = FileLock(self.data_file + '.lock')
+        # Counts rewrites, so readers that track a byte offset notice the file was replaced
+        self.generation_file = self.data_file + '.generation'
+        # Rows inside the last get_recent_data window, kept up to date by byte offset
+        self._recent = None
+        self._recent_lock = threading.Lock()
+        
+        # Group commit: readings are batched and written together
+        self.writer = None
+        if config.WRITE_BUFFER_RECORDS > 1:
+            from src.buffered_writer import BufferedWriter
+            self.writer = BufferedWriter(self, config.WRITE_BUFFER_RECORDS,
+                                         config.WRITE_BUFFER_MS, fsync=config.WRITE_FSYNC)
     
     def ensure_data_file_exists(self):
         """Create data file if it doesn't exist"""
-        if not os.path.exists(self.data_file):
-            os.makedirs(os.path.dirname(self.data_file), exist_ok=True)
-            with open(self.data_file, 'w', newline='', encoding='utf-8') as file:
-                writer = csv.DictWriter(file, fieldnames=self.fieldnames)
-                writer.writeheader()
-            print(f"Created new CSV file with headers: {self.data_file}")
-        else:
-            print(f"CSV file already exists: {self.data_file}")
+        with self.lock:
+            if not os.path.exists(self.data_file) or os.path.getsize(self.data_file) == 0:
+                os.makedirs(os.path.dirname(self.data_file) or '.', exist_ok=True)
+                with open(self.data_file, 'w', newline='', encoding='utf-8') as file:
+                    # No generation bump: nothing was replaced, and a deleted
+                    # history comes back smaller than any follower's offset
+                    csv.writer(file).writerow(self.fieldnames)
+                logger.info("Created new CSV file with headers", extra={'path': self.data_file})
     
     def save_weather_data(self, weather_data):
-        """Save weather data to CSV file"""
-        print(f"Attempting to save weather data: {weather_data}")
+        """
+        Save a reading to the CSV file
+        Args: weather_data (WeatherRecord): Reading to append (a reading dict is also accepted)
+        """
+        record = WeatherRecord.from_dict(weather_data)
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug("Saving weather data", extra={'record': record})
         
         try:
-            # Load existing data
-            existing_data = self.load_data()
-            
-            # Keep only last 99 entries
-            if len(existing_data) >= 100:
-                existing_data = existing_data[-99:]
-                with open(self.data_file, 'w', newline='', encoding='utf-8') as file:
-                    writer = csv.DictWriter(file, fieldnames=self.fieldnames)
-                    writer.writeheader()
-                    writer.writerows(existing_data)
-            
-            # Append new data
-            with open(self.data_file, 'a', newline='', encoding='utf-8') as file:
-                writer = csv.DictWriter(file, fieldnames=self.fieldnames)
-                writer.writerow(weather_data)
-            
-            print(f"Successfully saved to CSV: {weather_data['city']}, {weather_data['temperature']}°F")
-            
-        except Exception as e:
-            print(f"ERROR in save_weather_data: {e}")
-            import traceback
-            traceback.print_exc()
+            if self.writer:
+                self.writer.add(record)
+            else:
+                self.write_records([record], fsync=config.WRITE_FSYNC)
+        except Exception:
+            SAVE_ERRORS.inc()
+            logger.exception("Error in save_weather_data", extra={'path': self.data_file})
+            return
+        self._notify([record])
+    
+    def add_listener(self, callback):
+        """
+        Call callback(records) whenever readings are saved
+        Args: callback (callable): Receives a list of WeatherRecords
+        """
+        self.listeners.append(callback)
+    
+    def _notify(self, records):
+        for callback in self.listeners:
+            try:
+                callback(records)
+            except Exception:
+                logger.exception("Error in save listener", extra={'listener': repr(callback)})
+    
+    def write_records(self, records, fsync=False):
+        """
+        Write a batch of readings, trimming the history if it is capped
+        Args: records (list): WeatherRecords in the order they were taken
+              fsync (bool): Force the data to disk before returning
+        Returns: int: Number of rows written
+        """
+        with self.lock:
+            # Only a capped history needs the existing rows; otherwise just append.
+            # They are read under the lock so rows another process appended survive.
+            max_rows = config.HISTORY_MAX_ROWS
+            if max_rows:
+                with SAVE_SECONDS.time():
+                    if self._trim(records, max_rows, fsync=fsync):
+                        RECORDS_SAVED.inc(min(len(records), max_rows))
+                        return len(records)
+            return self.append_records(records, fsync=fsync)
+    
+    def append_records(self, records, fsync=False):
+        """
+        Append a batch of readings with a single open/write
+        Args: records (list): WeatherRecords to append
+              fsync (bool): Force the data to disk before returning
+        Returns: int: Number of rows written
+        """
+        rows = [record.to_history_row() for record in records]
+        if not rows:
+            return 0
+        # Whole lines in a single write, so readers only ever see complete rows
+        # plus at most one partial last line, which they skip
+        buffer = io.StringIO()
+        csv.writer(buffer).writerows(rows)
+        data = buffer.getvalue().encode('utf-8')
+        
+        with SAVE_SECONDS.time(), self.lock:
+            self.ensure_data_file_exists()
+            with open(self.data_file, 'ab+') as file:
+                end = file.seek(0, os.SEEK_END)
+                complete = self._complete_length(file)
+                if complete < end:
+                    # A writer died part-way through a row. Drop the fragment
+                    # (readers never read it) rather than keep it as a reading.
+                    logger.warning("Dropping a partial row left by an interrupted write",
+                                   extra={'path': self.data_file, 'bytes': end - complete})
+                    file.truncate(complete)
+                    if complete == 0:
+                        # Even the header was cut short
+                        buffer = io.StringIO()
+                        csv.writer(buffer).writerow(self.fieldnames)
+                        data = buffer.getvalue().encode('utf-8') + data
+                file.write(data)
+                if fsync:
+                    file.flush()
+                    os.fsync(file.fileno())
+        RECORDS_SAVED.inc(len(rows))
+        return len(rows)
+    
+    @staticmethod
+    def _complete_length(file):
+        """Offset just past the last newline of a file opened in binary mode"""
+        position = file.seek(0, os.SEEK_END)
+        while position > 0:
+            step = min(4096, position)
+            position -= step
+            file.seek(position)
+            index = file.read(step).rfind(b'\n')
+            if index >= 0:
+                return position + index + 1
+        return 0
+    
+    def _trim(self, records, max_rows, fsync=False):
+        """
+        Add readings to a capped history by dropping its oldest rows
+        
+        The rows kept are copied byte for byte, so readers that track a byte
+        offset can move it back by the bytes dropped (see follow()) instead of
+        reading the history again.
+        Returns: bool: False if nothing had to be dropped; the readings still need appending
+        """
+        try:
+            with open(self.data_file, 'rb') as file:
+                header = file.readline()
+                # A partial last row (see append_records) is dropped with the trim
+                lines = [line for line in file if line.endswith(b'\n')]
+        except FileNotFoundError:
+            return False
+        excess = len(lines) + len(records) - max_rows
+        if excess <= 0 or not header.endswith(b'\n'):
+            return False
+        trimmed = sum(len(line) for line in lines[:excess])
+        buffer = io.StringIO()
+        csv.writer(buffer).writerows(record.to_history_row()
+                                     for record in records[max(0, excess - len(lines)):])
+        
+        def write(file):
+            file.write(header)
+            file.writelines(lines[excess:])
+            file.write(buffer.getvalue().encode('utf-8'))
+        self._replace(write, fsync, trimmed=trimmed)
+        return True
+    
+    def _rewrite(self, records, fsync=False):
+        """Replace the history with records, e.g. from save_data()"""
+        def write(file):
+            text = io.TextIOWrapper(file, encoding='utf-8', newline='')
+            writer = csv.writer(text)
+            writer.writerow(self.fieldnames)
+            writer.writerows(WeatherRecord.from_dict(record).to_history_row() for record in records)
+            text.detach()
+        self._replace(write, fsync)
+    
+    def _replace(self, write, fsync=False, trimmed=None):
+        """
+        Replace the history file atomically
+        
+        write(file) fills a temporary file in the same directory which is then
+        renamed over the original, so a crash leaves either the old or the
+        new file, never a truncated one. The new file keeps the old one's
+        permissions.
+        Args: write (callable): Writes the new file, given it open in binary mode
+              fsync (bool): Force the new file and the rename to disk
+              trimmed (int): Bytes dropped from the front if the rest was kept as is, else None
+        """
+        directory = os.path.dirname(self.data_file) or '.'
+        handle, temp_path = mkstemp_like(self.data_file)
+        try:
+            with os.fdopen(handle, 'wb') as file:
+                write(file)
+                if fsync:
+                    file.flush()
+                    os.fsync(file.fileno())
+            os.replace(temp_path, self.data_file)
+            # Only after the rename: a reader that sees the new generation must see the new file
+            self._bump_generation(trimmed)
+        except BaseException:
+            try:
+                os.remove(temp_path)
+            except OSError:
+                pass
+            raise
+        if fsync and hasattr(os, 'O_DIRECTORY'):
+            # Make the rename itself durable
+            dir_fd = os.open(directory, os.O_RDONLY | os.O_DIRECTORY)
+            try:
+                os.fsync(dir_fd)
+            finally:
+                os.close(dir_fd)
+    
+    def generation(self):
+        """
+        How many times the history file has been rewritten or recreated
+        
+        Readers that remember a byte offset (dedup index, sketches, baseline,
+        rollups) store this with it. A different value means the rows before
+        the offset may have changed even if the file is no smaller, e.g. a
+        capped history trimmed to the same size; trimmed_since() tells
+        whether they were only trimmed.
+        Returns: int: 0 if the file was never replaced
+        """
+        return self._generation_log()[0]
+    
+    def trimmed_since(self, generation):
+        """
+        Bytes dropped from the front of the history since a generation
+        Args: generation (int): generation() a reader's offset belongs to
+        Returns: int: 0 if nothing changed, or None if the history was rewritten
+                 some other way since (or too long ago to tell); the reader must start over
+        """
+        current, trims = self._generation_log()
+        if generation > current:
+            return None
+        total = 0
+        for number in range(generation + 1, current + 1):
+            if number not in trims:
+                return None
+            total += trims[number]
+        return total
+    
+    def _generation_log(self):
+        """
+        Read the generation file: the generation, then one "<generation> <bytes>"
+        line for each recent trim
+        Returns: tuple: (generation, {generation: bytes trimmed})
+        """
+        try:
+            with open(self.generation_file, 'r', encoding='ascii') as file:
+                lines = file.read().split('\n')
+            generation = int(lines[0].strip() or 0)
+            trims = {}
+            for line in lines[1:]:
+                if line.strip():
+                    number, trimmed = line.split()
+                    trims[int(number)] = int(trimmed)
+            return generation, trims
+        except (FileNotFoundError, ValueError):
+            return 0, {}
+    
+    def _bump_generation(self, trimmed=None):
+        """Increment the generation, noting a trim of that many bytes; the caller holds self.lock"""
+        generation, trims = self._generation_log()
+        generation += 1
+        if trimmed is not None:
+            trims[generation] = trimmed
+        lines = [str(generation)] + [f"{number} {trims[number]}"
+                                     for number in sorted(trims)[-GENERATION_LOG_LENGTH:]]
+        temp_path = f"{self.generation_file}.{os.getpid()}.tmp"
+        with open(temp_path, 'w', encoding='ascii') as file:
+            file.write('\n'.join(lines) + '\n')
+        os.replace(temp_path, self.generation_file)
+    
+    def follow(self, offset, generation):
+        """
+        Open the history for a reader that keeps a byte offset into it
+        
+        The generation, the size and the open file are taken together under
+        the writer lock, so they belong to the same file even if a writer
+        replaces it a moment later. After a trim the offset moves back by the
+        bytes dropped; after any other rewrite the reader starts over.
+        Args: offset (int): Byte offset the reader has read up to
+              generation (int): generation() that offset belongs to
+        Returns: HistoryTail, or None if there is no history file
+        """
+        with self.lock:
+            try:
+                file = open(self.data_file, 'rb')
+            except FileNotFoundError:
+                return None
+            current = self.generation()
+            shift = self.trimmed_since(generation) if current != generation else 0
+            stop = self._complete_length(file)
+        if shift is not None:
+            offset = max(0, offset - shift)
+        return HistoryTail(self, file, offset, stop, current,
+                           restart=shift is None or stop < offset)
+    
+    def flush(self):
+        """Write any buffered readings now"""
+        if self.writer:
+            self.writer.flush()
+    
+    def close(self):
+        """Flush buffered readings; call on shutdown"""
+        if self.writer:
+            self.writer.close()
+    
+    def iter_records(self, start=0, stop=None):
+        """
+        Stream readings from the history file without loading it all
+        Args: start (int): Byte offset to start from (0 = first data row)
+              stop (int): Byte offset to stop at, normally from complete_size(); None reads to the end
+        Yields: WeatherRecord
+        """
+        try:
+            raw = open(self.data_file, 'rb')
+        except FileNotFoundError:
+            return
+        with raw:
+            yield from self._iter_file(raw, start, stop)
+    
+    def _iter_file(self, raw, start=0, stop=None):
+        """iter_records() for a history file already open in binary mode"""
+        raw.seek(0)
+        header = next(csv.reader([raw.readline().decode('utf-8')]), None)
+        if not header:
+            return
+        if start > raw.tell():
+            raw.seek(start)
+        parse = WeatherRecord.history_row_parser(header)
+        count = 0
+        if stop is None:
+            text = io.TextIOWrapper(raw, encoding='utf-8', newline='')
+            lines = (line for line in text if line.endswith('\n'))
+        else:
+            lines = self._lines_until(raw, stop)
+        for row in csv.reader(lines):
+            if row:
+                count += 1
+                yield parse(row)
+        ROWS_SCANNED.inc(count)
+    
+    @staticmethod
+    def _lines_until(raw, stop):
+        """Complete lines of a binary file up to byte offset stop, decoded"""
+        position = raw.tell()
+        for line in raw:
+            position += len(line)
+            if position > stop or not line.endswith(b'\n'):
+                return
+            yield line.decode('utf-8')
+    
+    def complete_size(self):
+        """
+        Length of the history file up to the end of its last complete row
+        Returns: int: Byte offset (raises FileNotFoundError if there is no file)
+        """
+        with open(self.data_file, 'rb') as file:
+            return self._complete_length(file)
+    
+    def _read_records(self, file):
+        """Parse history rows from an open CSV file into WeatherRecords"""
+        text = file.read()
+        # A row another process is appending right now is skipped, not misread
+        reader = csv.reader(io.StringIO(text[:text.rfind('\n') + 1]))
+        header = next(reader, None)
+        if not header:
+            return []
+        parse = WeatherRecord.history_row_parser(header)
+        return [parse(row) for row in reader if row]
     
     def load_data(self):
-        """Load weather data from CSV file"""
+        """
+        Load weather data from CSV file
+        Returns: list: WeatherRecords in file order
+        """
+        data = self._load_file()
+        
+        # Readings still waiting in the write buffer count as saved
+        if self.writer:
+            data.extend(self.writer.pending())
+        return data
+    
+    def _load_file(self):
+        """Records currently in the history file, without buffered readings"""
         try:
-            data = []
-            with open(self.data_file, 'r', newline='', encoding='utf-8') as file:
-                reader = csv.DictReader(file)
-                for row in reader:
-                    # Convert numeric fields
-                    if row.get('temperature'):
-                        row['temperature'] = int(float(row['temperature']))
-                    if row.get('feels_like'):
-                        row['feels_like'] = int(float(row['feels_like']))
-                    if row.get('humidity'):
-                        row['humidity'] = int(float(row['humidity']))
-                    data.append(row)
+            with LOAD_SECONDS.time():
+                with open(self.data_file, 'r', newline='', encoding='utf-8') as file:
+                    data = self._read_records(file)
+            ROWS_SCANNED.inc(len(data))
             return data
         except (FileNotFoundError, csv.Error):
             return []
         except Exception as e:
-            print(f"Error loading data: {e}")
+            logger.error("Error loading data: %s", e, extra={'path': self.data_file})
             return []
     
     def save_data(self, data):
-        """Save data list to CSV file"""
+        """
+        Save data list to CSV file, replacing its contents
+        Args: data (list): WeatherRecords to write
+        """
         try:
-            with open(self.data_file, 'w', newline='', encoding='utf-8') as file:
-                writer = csv.DictWriter(file, fieldnames=self.fieldnames)
-                writer.writeheader()
-                writer.writerows(data)
+            # Buffered readings would otherwise be appended after the rewrite
+            self.flush()
+            with self.lock:
+                self._rewrite(data, fsync=config.WRITE_FSYNC)
         except Exception as e:
-            print(f"Error saving data to file: {e}")
+            logger.error("Error saving data to file: %s", e, extra={'path': self.data_file})
     
-    def get_recent_data(self, days=7):
-        """Get recent weather data"""
-        all_data = self.load_data()
+    def get_recent_data(self, days=7, city=None):
+        """
+        Get recent weather data
         
-        if not all_data:
+        The first call reads the whole history; later calls only read the rows
+        appended since, so a refresh doesn't cost a full scan of a long history.
+        Args: days (int): How many whole days back to include
+              city (str): Only readings for this city (any casing); None for all
+        Returns: list: WeatherRecords from the last `days` days
+        """
+        # Same window as comparing whole days: anything less than days + 1 days old
+        cutoff = time.time() - (days + 1) * 86400
+        try:
+            recent_data = self._recent_records(cutoff)
+        except (csv.Error, UnicodeDecodeError) as e:
+            logger.error("Error loading data: %s", e, extra={'path': self.data_file})
+            self._recent = None
             return []
         
-        recent_data = []
-        current_date = datetime.now()
-        
-        for entry in all_data:
+        # Readings still waiting in the write buffer count as saved
+        if self.writer:
+            recent_data.extend(entry for entry in self.writer.pending()
+                               if entry.epoch is not None and entry.epoch > cutoff)
+        if city:
+            wanted = normalize_city(city)
+            recent_data = [entry for entry in recent_data if normalize_city(entry.city) == wanted]
+        return recent_data
+    
+    def _recent_records(self, cutoff):
+        """History rows newer than cutoff, reading only what was appended since the last call"""
+        with self._recent_lock:
+            generation = self.generation()
             try:
-                entry_date = datetime.fromisoformat(entry['timestamp'])
-                days_diff = (current_date - entry_date).days
+                size = self.complete_size()
+            except FileNotFoundError:
+                self._recent = None
+                return []
+            
+            cache = self._recent
+            if (cache is None or cache['generation'] != generation or size < cache['offset']
+                    or cutoff < cache['cutoff']):
+                # First call, a rewritten file or a longer window: read it all
+                cache = self._recent = {'generation': generation, 'offset': 0,
+                                        'cutoff': cutoff, 'records': []}
+            if size > cache['offset']:
+                cache['records'].extend(entry for entry in self.iter_records(start=cache['offset'], stop=size)
+                                        if entry.epoch is not None and entry.epoch > cache['cutoff'])
+                cache['offset'] = size
+            if cutoff > cache['cutoff']:
+                # Drop readings that have aged out of the window
+                cache['records'] = [entry for entry in cache['records'] if entry.epoch > cutoff]
+                cache['cutoff'] = cutoff
+            return list(cache['records'])
+    
+    def _iter_lines_reversed(self, file, stop):
+        """Yield complete lines from the end of a binary file back to offset stop"""
+        file.seek(0, os.SEEK_END)
+        position = file.tell()
+        remainder = b''
+        # Text after the last newline is a row still being appended; skip it
+        in_tail = True
+        while position > stop:
+            step = min(4096, position - stop)
+            position -= step
+            file.seek(position)
+            lines = (file.read(step) + remainder).split(b'\n')
+            # The first piece may be a partial line; keep it for the next block
+            remainder = lines.pop(0)
+            if in_tail:
+                if not lines:
+                    continue
+                lines.pop()
+                in_tail = False
+            for line in reversed(lines):
+                if line.strip():
+                    yield line
+        if remainder.strip() and not in_tail:
+            yield remainder
+    
+    def get_latest_record(self, city=None, max_bytes=None):
+        """
+        Get the most recent saved reading without loading the whole file
+        Args: city (str): Latest reading for this city (any casing); None for any city
+              max_bytes (int): Only search this much of the end of the file; None searches it all
+        Returns: WeatherRecord or None if nothing has been saved (or found within max_bytes)
+        """
+        wanted = normalize_city(city) if city else None
+        if self.writer:
+            for record in reversed(self.writer.pending()):
+                if wanted is None or normalize_city(record.city) == wanted:
+                    return record
+        try:
+            with open(self.data_file, 'rb') as file:
+                header = next(csv.reader([file.readline().decode('utf-8')]), None)
+                if not header:
+                    return None
+                parse = WeatherRecord.history_row_parser(header)
+                
+                stop = file.tell()
+                if max_bytes is not None:
+                    limit = file.seek(0, os.SEEK_END) - max_bytes
+                    if limit > stop:
+                        # Start at the first whole line after the limit
+                        file.seek(limit - 1)
+                        file.readline()
+                        stop = file.tell()
                 
-                if days_diff <= days:
-                    recent_data.append(entry)
-            except (KeyError, ValueError):
-                continue
+                # Walk back from the end of the file until a matching row turns up
+                for line in self._iter_lines_reversed(file, stop):
+                    row = next(csv.reader([line.decode('utf-8')]), None)
+                    if not row:
+                        continue
+                    record = parse(row)
+                    if wanted is None or normalize_city(record.city) == wanted:
+                        return record
+            return None
+        except (FileNotFoundError, csv.Error, ValueError, UnicodeDecodeError):
+            return None
+    
+    def load_cached_stats(self):
+        """
+        Load the statistics computed after the last refresh
+        Returns: dict of display values or None if no cache exists
+        """
+        try:
+            with open(self.stats_cache_file, 'r', encoding='utf-8') as file:
+                stats = json.load(file)
+        except (FileNotFoundError, ValueError):
+            CACHE_REQUESTS.inc(cache='stats', result='miss')
+            return None
         
-        return recent_data
-
+        CACHE_REQUESTS.inc(cache='stats', result='hit')
+        return stats if isinstance(stats, dict) else None
+    
+    def save_cached_stats(self, stats):
+        """Persist computed statistics so the next startup can show them immediately"""
+        try:
+            os.makedirs(os.path.dirname(self.stats_cache_file) or '.', exist_ok=True)
+            with open(self.stats_cache_file, 'w', encoding='utf-8') as file:
+                json.dump(stats, file)
+        except OSError as e:
+            logger.warning("Error saving stats cache: %s", e, extra={'path': self.stats_cache_file})
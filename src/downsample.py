@@ -0,0 +1,71 @@
+"""
+Downsampling of time series for drawing
+"""
+
+
+def lttb(points, threshold):
+    """
+    Largest-Triangle-Three-Buckets (Steinarsson) downsampling
+
+    Keeps the first and last point and, from each bucket in between, the point
+    forming the largest triangle with its neighbours, so peaks and troughs
+    survive where plain averaging would flatten them.
+    Args: points (list): (x, y) tuples sorted by x
+          threshold (int): Number of points wanted
+    Returns: list: At most threshold (x, y) tuples, or points unchanged if shorter
+    """
+    count = len(points)
+    if threshold >= count or threshold < 3:
+        return list(points)
+
+    xs = [point[0] for point in points]
+    ys = [point[1] for point in points]
+    sampled = [points[0]]
+    every = (count - 2) / (threshold - 2)
+    anchor = 0
+    for bucket in range(threshold - 2):
+        # Average of the next bucket is the third corner of the triangle
+        next_start = int((bucket + 1) * every) + 1
+        next_end = min(int((bucket + 2) * every) + 1, count)
+        span = next_end - next_start
+        avg_x = sum(xs[next_start:next_end]) / span
+        avg_y = sum(ys[next_start:next_end]) / span
+
+        anchor_x, anchor_y = xs[anchor], ys[anchor]
+        # Twice the triangle area; only the comparison matters
+        dx, dy = anchor_x - avg_x, avg_y - anchor_y
+        best_area = -1
+        best = next_start - 1
+        for index in range(int(bucket * every) + 1, next_start):
+            area = abs(dx * (ys[index] - anchor_y) + dy * (xs[index] - anchor_x))
+            if area > best_area:
+                best_area = area
+                best = index
+        sampled.append(points[best])
+        anchor = best
+    sampled.append(points[-1])
+    return sampled
+
+
+def min_max(points, buckets):
+    """
+    Min/max envelope: the lowest low and highest high of each bucket
+    Args: points (list): (x, low, high) tuples sorted by x
+          buckets (int): Number of buckets to reduce to
+    Returns: list: (x, low, high) per bucket, x being the bucket's middle point,
+             or points unchanged if there are no more than buckets of them
+    """
+    count = len(points)
+    if buckets >= count or buckets < 1:
+        return list(points)
+
+    envelope = []
+    every = count / buckets
+    for bucket in range(buckets):
+        group = points[int(bucket * every):int((bucket + 1) * every)]
+        if not group:
+            continue
+        envelope.append((group[len(group) // 2][0],
+                         min(point[1] for point in group),
+                         max(point[2] for point in group)))
+    return envelope
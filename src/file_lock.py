@@ -0,0 +1,91 @@
+"""
+Advisory inter-process lock for files shared by several app instances
+"""
+
+import os
+import threading
+import time
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+
+class FileLock:
+    """
+    Exclusive advisory lock held on a separate lock file
+
+    Only writers take it; readers never block. Usable as a context manager
+    and re-entrant within one thread, so a locked method can call another.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._fd = None
+        self._depth = 0
+        self._owner = None
+        # Threads of one process share the OS lock, so they queue here first
+        self._thread_lock = threading.Lock()
+
+    def acquire(self):
+        if self._owner == threading.get_ident():
+            self._depth += 1
+            return
+        self._thread_lock.acquire()
+        try:
+            os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+            fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o644)
+            try:
+                self._lock_fd(fd)
+            except BaseException:
+                os.close(fd)
+                raise
+        except BaseException:
+            self._thread_lock.release()
+            raise
+        self._fd = fd
+        self._owner = threading.get_ident()
+        self._depth = 1
+
+    def release(self):
+        if self._owner != threading.get_ident():
+            raise RuntimeError("FileLock released by a thread that does not hold it")
+        self._depth -= 1
+        if self._depth:
+            return
+        fd, self._fd, self._owner = self._fd, None, None
+        try:
+            self._unlock_fd(fd)
+        finally:
+            os.close(fd)
+            self._thread_lock.release()
+
+    @staticmethod
+    def _lock_fd(fd):
+        if fcntl:
+            fcntl.flock(fd, fcntl.LOCK_EX)
+            return
+        # msvcrt.locking gives up after ~10 seconds; keep waiting like flock does
+        while True:
+            try:
+                msvcrt.locking(fd, msvcrt.LK_LOCK, 1)
+                return
+            except OSError:
+                time.sleep(0.05)
+
+    @staticmethod
+    def _unlock_fd(fd):
+        if fcntl:
+            fcntl.flock(fd, fcntl.LOCK_UN)
+        else:
+            os.lseek(fd, 0, os.SEEK_SET)
+            msvcrt.locking(fd, msvcrt.LK_UNLCK, 1)
+
+    def __enter__(self):
+        self.acquire()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.release()
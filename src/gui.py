@@ -2,42 +2,93 @@
 GUI module using Tkinter for the weather application
 """
 
+import logging
+import queue
+import threading
+import time
 import tkinter as tk
 from tkinter import ttk, messagebox
 from datetime import datetime
 import config
-from src.weather_api import WeatherAPI
+from src import metrics
+from src.app_state import AppState
+from src.baseline import ClimatologyBaseline
 from src.data_storage import DataStorage
+from src.history_chart import HistoryChart
+from src.profiling import NullProfiler
+from src.rollups import HistoryRollups
+from src.sketches import HistorySketches
 from src.utils import WeatherUtils
-from src.csv_comparator import CSVComparator
+from src.weather_record import normalize_city
+
+logger = logging.getLogger(__name__)
+
+FIRST_PAINT_SECONDS = metrics.gauge('weather_startup_first_paint_seconds',
+                                    "Time from process start to the first painted window")
 
 class WeatherGUI:
    """Main GUI class for the weather application"""
    
-   def __init__(self):
+   def __init__(self, started_at=None, profiler=None, state=None, weather_api=None, continuous=False,
+                sketches=None, baseline=None):
+       self.started_at = started_at if started_at is not None else time.perf_counter()
        self.root = tk.Tk()
-       self.weather_api = WeatherAPI()
        self.data_storage = DataStorage()
        self.utils = WeatherUtils()
-       self.csv_comparator = CSVComparator()
+       self.profiler = profiler or NullProfiler()
+       # In-memory copy of what the window shows, served by the query API
+       self.state = state or AppState()
+       self.data_storage.add_listener(self.state.add_readings)
+       # Per-city percentile sketches, loaded from disk on the first statistics update
+       self.sketches = sketches or HistorySketches(self.data_storage)
+       # Usual temperature per hour of day, used to flag unusual readings
+       self.baseline = baseline or ClimatologyBaseline(self.data_storage)
+       # Hourly/daily temperature rollups behind the history chart
+       self.rollups = HistoryRollups(self.data_storage)
+       # A replay API can be passed in; otherwise the live one is created on first use
+       self._weather_api = weather_api
+       # Start the next refresh as soon as one finishes (used to drive replays)
+       self.continuous = continuous
+       self._csv_comparator = None
        self.current_weather = None
+       self.first_paint_ms = None
+       
+       # Results from worker threads, handed back to the Tk thread
+       self._results = queue.Queue()
+       self._polling = False
+       self._pending_tasks = 0
        
        self.setup_window()
        self.create_widgets()
-       self.check_api_key()
        
+   @property
+   def weather_api(self):
+       """WeatherAPI instance, imported and created on first use"""
+       if self._weather_api is None:
+           from src.weather_api import WeatherAPI
+           self._weather_api = WeatherAPI()
+       return self._weather_api
+   
+   @property
+   def csv_comparator(self):
+       """CSVComparator instance, imported and created on first use"""
+       if self._csv_comparator is None:
+           from src.csv_comparator import CSVComparator
+           self._csv_comparator = CSVComparator()
+       return self._csv_comparator
+   
    def setup_window(self):
        """Configure the main window"""
        self.root.title(config.WINDOW_TITLE)
-       self.root.geometry("650x700")  # Made larger for comparison section
+       self.root.geometry("1200x700")  # Wide enough for the history chart beside the rest
        self.root.resizable(True, True)
-       self.root.minsize(600, 650)
+       self.root.minsize(1000, 650)
        
        # Center the window
        self.root.update_idletasks()
-       x = (self.root.winfo_screenwidth() // 2) - (650 // 2)
+       x = (self.root.winfo_screenwidth() // 2) - (1200 // 2)
        y = (self.root.winfo_screenheight() // 2) - (700 // 2)
-       self.root.geometry(f"650x700+{x}+{y}")
+       self.root.geometry(f"1200x700+{x}+{y}")
    
    def create_widgets(self):
        """Create and arrange GUI widgets"""
@@ -48,7 +99,7 @@ class WeatherGUI:
        # Title
        title_label = ttk.Label(main_frame, text="Sacramento Weather", 
                               font=("Arial", 16, "bold"))
-       title_label.grid(row=0, column=0, columnspan=2, pady=(0, 15))
+       title_label.grid(row=0, column=0, columnspan=3, pady=(0, 15))
        
        # Current weather section
        self.create_current_weather_section(main_frame)
@@ -62,15 +113,20 @@ class WeatherGUI:
        # City comparisons section
        self.create_comparison_section(main_frame)
        
+       # History chart, to the right of everything else
+       self.create_chart_section(main_frame)
+       
        # Status bar
        self.status_var = tk.StringVar()
        self.status_var.set("Ready - Click 'Refresh Weather' to get data")
        status_bar = ttk.Label(main_frame, textvariable=self.status_var, 
                              relief=tk.SUNKEN, anchor=tk.W)
-       status_bar.grid(row=7, column=0, columnspan=2, sticky=(tk.W, tk.E), pady=(15, 0))
+       status_bar.grid(row=7, column=0, columnspan=3, sticky=(tk.W, tk.E), pady=(15, 0))
        
        # Configure grid weights for resizing
        main_frame.columnconfigure(1, weight=1)
+       main_frame.columnconfigure(2, weight=2)
+       main_frame.rowconfigure(4, weight=1)
        self.root.columnconfigure(0, weight=1)
        self.root.rowconfigure(0, weight=1)
    
@@ -143,6 +199,24 @@ class WeatherGUI:
        self.change_var.set("No previous data")
        ttk.Label(stats_frame, textvariable=self.change_var, font=("Arial", 10)).grid(row=3, column=1, sticky=tk.W, padx=(15, 0), pady=2)
        
+       # Approximate percentiles from the quantile sketches
+       ttk.Label(stats_frame, text="Temp p5 / p50 / p95:", font=("Arial", 10)).grid(row=4, column=0, sticky=tk.W, pady=2)
+       self.percentiles_var = tk.StringVar()
+       self.percentiles_var.set("--")
+       ttk.Label(stats_frame, textvariable=self.percentiles_var, font=("Arial", 10)).grid(row=4, column=1, sticky=tk.W, padx=(15, 0), pady=2)
+       
+       ttk.Label(stats_frame, text="Humidity p5 / p50 / p95:", font=("Arial", 10)).grid(row=5, column=0, sticky=tk.W, pady=2)
+       self.humidity_percentiles_var = tk.StringVar()
+       self.humidity_percentiles_var.set("--")
+       ttk.Label(stats_frame, textvariable=self.humidity_percentiles_var, font=("Arial", 10)).grid(row=5, column=1, sticky=tk.W, padx=(15, 0), pady=2)
+       
+       # Latest reading against the usual temperature for the hour
+       ttk.Label(stats_frame, text="Usual for This Hour:", font=("Arial", 10)).grid(row=6, column=0, sticky=tk.W, pady=2)
+       self.anomaly_var = tk.StringVar()
+       self.anomaly_var.set("--")
+       self.anomaly_label = ttk.Label(stats_frame, textvariable=self.anomaly_var, font=("Arial", 10))
+       self.anomaly_label.grid(row=6, column=1, sticky=tk.W, padx=(15, 0), pady=2)
+       
        # Configure column weights
        stats_frame.columnconfigure(1, weight=1)
    
@@ -204,10 +278,54 @@ class WeatherGUI:
                                     width=20)
        refresh_comp_btn.grid(row=1, column=0, pady=(10, 0))
        
+       # Selected cities are added to the history chart
+       self._comparison_cities = {}
+       self.comparison_tree.bind('<<TreeviewSelect>>', self._on_comparison_selected)
+       
        # Configure grid weights
        comp_frame.columnconfigure(0, weight=1)
        comp_frame.rowconfigure(0, weight=1)
    
+   def create_chart_section(self, parent):
+       """Create the temperature history chart"""
+       chart_frame = ttk.LabelFrame(parent, text="Temperature History", padding="15")
+       chart_frame.grid(row=1, column=2, rowspan=4, sticky=(tk.W, tk.E, tk.N, tk.S), padx=(15, 0), pady=(0, 15))
+       
+       self.history_chart = HistoryChart(chart_frame, self.load_chart_series, self.run_in_background)
+       self.history_chart.frame.grid(row=0, column=0, sticky=(tk.W, tk.E, tk.N, tk.S))
+       
+       chart_frame.columnconfigure(0, weight=1)
+       chart_frame.rowconfigure(0, weight=1)
+   
+   def load_chart_series(self, cities, start, end):
+       """
+       Temperature series for the history chart (runs in a worker thread)
+       Args: cities (list): City names
+             start, end (float): Epoch window; start None for the whole history
+       Returns: dict: {city: (resolution, buckets)} from the rollups
+       """
+       self.rollups.catch_up()
+       comparison_rollups = None
+       series = {}
+       for city in cities:
+           others = ()
+           # Other cities may only exist in the comparison files
+           if normalize_city(city) != normalize_city(config.CITY):
+               if comparison_rollups is None:
+                   comparison_rollups = self.csv_comparator.get_comparison_rollups()
+               others = comparison_rollups
+           series[city] = self.rollups.series(city, start, end, others=others)
+       return series
+   
+   def _on_comparison_selected(self, event=None):
+       """Chart the cities selected in the comparison table alongside Sacramento"""
+       cities = [config.CITY]
+       for item in self.comparison_tree.selection():
+           city = self._comparison_cities.get(item)
+           if city and normalize_city(city) not in {normalize_city(known) for known in cities}:
+               cities.append(city)
+       self.history_chart.set_cities(cities)
+   
    def check_api_key(self):
        """Check if API key is configured"""
        if not self.weather_api.is_api_key_valid():
@@ -217,6 +335,44 @@ class WeatherGUI:
            return False
        return True
    
+   def run_in_background(self, task, callback):
+       """
+       Run task in a worker thread and pass its result to callback on the Tk thread
+       Args: task (callable): Work that must not touch any Tk widgets
+             callback (callable): Called with (result, error) once task finishes
+       """
+       def worker():
+           try:
+               self._results.put((callback, task(), None))
+           except Exception as e:
+               self._results.put((callback, None, e))
+       
+       self._pending_tasks += 1
+       threading.Thread(target=worker, daemon=True).start()
+       if not self._polling:
+           self._polling = True
+           self.root.after(50, self._poll_results)
+   
+   def _poll_results(self):
+       """Deliver finished background results to their callbacks"""
+       try:
+           while True:
+               try:
+                   callback, result, error = self._results.get_nowait()
+               except queue.Empty:
+                   break
+               self._pending_tasks -= 1
+               try:
+                   callback(result, error)
+               except Exception:
+                   # One failing callback must not stop later results from being delivered
+                   logger.exception("Error in background task callback", extra={'callback': repr(callback)})
+       finally:
+           if self._pending_tasks > 0:
+               self.root.after(50, self._poll_results)
+           else:
+               self._polling = False
+   
    def refresh_weather(self):
        """Fetch and display current weather"""
        if not self.check_api_key():
@@ -224,35 +380,69 @@ class WeatherGUI:
        
        self.status_var.set("Fetching weather data...")
        self.refresh_btn.config(state='disabled')
+       self.profiler.start_cycle()
        
-       # Use after() to prevent GUI freezing
-       self.root.after(100, self._fetch_weather_data)
+       # Network and disk work happens off the Tk thread so the window stays responsive
+       self.run_in_background(self._fetch_weather_data, self._on_weather_fetched)
    
    def _fetch_weather_data(self):
-       """Internal method to fetch weather data"""
-       try:
-           # Fetch current weather
+       """Internal method to fetch and save weather data (runs in a worker thread)"""
+       with self.profiler.stage('fetch_current_weather'):
            weather_data = self.weather_api.fetch_current_weather()
+       
+       if weather_data:
+           # Scored before saving so the reading isn't part of its own baseline
+           with self.profiler.stage('score_anomaly'):
+               anomaly = self.baseline.observe(weather_data)
+           
+           # Save to file
+           with self.profiler.stage('save_weather_data'):
+               self.data_storage.save_weather_data(weather_data)
+           
+           # Statistics only need the disk, so compute them here too
+           with self.profiler.stage('update_statistics'):
+               stats = self.compute_statistics(weather_data, anomaly)
+           self.state.update(weather=weather_data, stats=stats, anomaly=anomaly)
+           return weather_data, stats
+       return None, None
+   
+   def _on_weather_fetched(self, result, error):
+       """Update the GUI with the result of _fetch_weather_data"""
+       try:
+           if error is not None:
+               raise error
            
+           weather_data, stats = result
            if weather_data:
                self.current_weather = weather_data
                
-               # Save to file
-               self.data_storage.save_weather_data(weather_data)
-               
                # Update GUI
-               self.update_weather_display(weather_data)
-               self.update_statistics()
+               with self.profiler.stage('update_display'):
+                   self.update_weather_display(weather_data)
+                   self.apply_statistics(stats)
                
                # Auto-refresh comparisons when weather is updated
-               self.refresh_comparisons()
+               self.refresh_comparisons(ends_cycle=True)
+               self.history_chart.refresh()
                
-               self.status_var.set("Weather data updated successfully")
+               if stats.get('anomaly_flagged'):
+                   self.status_var.set("Weather data updated - temperature is unusual for this hour")
+               else:
+                   self.status_var.set("Weather data updated successfully")
+           elif getattr(self.weather_api, 'exhausted', False):
+               self.profiler.end_cycle()
+               self.status_var.set("Replay finished")
+           elif self.continuous:
+               self.profiler.end_cycle()
+               self.status_var.set("Error: Failed to fetch weather data")
+               self._continue_refreshing()
            else:
+               self.profiler.end_cycle()
                self.status_var.set("Error: Failed to fetch weather data - Check API key and internet connection")
                messagebox.showerror("Error", "Failed to fetch weather data.\n\nPossible causes:\n• API key needs time to activate (wait 1 hour)\n• Internet connection issue\n• API rate limit reached")
                
        except Exception as e:
+           self.profiler.end_cycle()
            self.status_var.set(f"Error: {str(e)}")
            messagebox.showerror("Error", f"An unexpected error occurred:\n{str(e)}")
        
@@ -261,80 +451,141 @@ class WeatherGUI:
    
    def update_weather_display(self, weather_data):
        """Update current weather display"""
-       self.temp_var.set(f"{weather_data['temperature']}°F")
-       self.feels_like_var.set(f"{weather_data['feels_like']}°F")
-       self.desc_var.set(weather_data['description'])
-       self.humidity_var.set(f"{weather_data['humidity']}%")
-       self.updated_var.set(weather_data['time'])
+       self.temp_var.set(f"{weather_data.temperature}°F")
+       self.feels_like_var.set(f"{weather_data.feels_like}°F")
+       self.desc_var.set(weather_data.description)
+       self.humidity_var.set(f"{weather_data.humidity}%")
+       self.updated_var.set(weather_data.time)
+   
+   def compute_statistics(self, current_weather=None, anomaly=None):
+       """
+       Calculate the 7-day statistics display values
+       Args: current_weather (WeatherRecord): Latest reading, used for the change since last reading
+             anomaly (dict): current_weather scored by ClimatologyBaseline, if it was just fetched
+       Returns: dict: Formatted display values (empty if there is no recent data)
+       """
+       city = current_weather.city if current_weather else config.CITY
+       recent_data = self.data_storage.get_recent_data(days=7, city=city)
+       self.sketches.catch_up()
+       stats = self.utils.build_statistics(recent_data, current_weather, sketches=self.sketches,
+                                           anomaly=anomaly)
+       
+       # Remember the result so the next startup can show it straight away
+       if stats:
+           self.data_storage.save_cached_stats(stats)
+       return stats
+   
+   def apply_statistics(self, stats):
+       """Show statistics values produced by compute_statistics"""
+       if not stats:
+           return
+       if 'average' in stats:
+           self.avg_var.set(stats['average'])
+       if 'min' in stats and 'max' in stats:
+           self.min_var.set(stats['min'])
+           self.max_var.set(stats['max'])
+       if 'change' in stats:
+           self.change_var.set(stats['change'])
+       if 'percentiles' in stats:
+           self.percentiles_var.set(stats['percentiles'])
+       if 'humidity_percentiles' in stats:
+           self.humidity_percentiles_var.set(stats['humidity_percentiles'])
+       if 'anomaly' in stats:
+           self.anomaly_var.set(stats['anomaly'])
+           self.anomaly_label.config(foreground='red' if stats.get('anomaly_flagged') else '')
    
    def update_statistics(self):
        """Update statistics display"""
-       # Get recent data
-       recent_data = self.data_storage.get_recent_data(days=7)
-       
-       if recent_data:
-           # Calculate weekly average
-           avg_temp = self.utils.calculate_weekly_average(recent_data)
-           if avg_temp:
-               self.avg_var.set(f"{avg_temp}°F")
-           
-           # Find min/max temperatures
-           min_temp, max_temp = self.utils.find_min_max_temps(recent_data)
-           if min_temp is not None and max_temp is not None:
-               self.min_var.set(f"{min_temp}°F")
-               self.max_var.set(f"{max_temp}°F")
-           
-           # Calculate temperature change
-           if self.current_weather:
-               prev_temp = self.utils.get_previous_temperature(recent_data)
-               current_temp = self.current_weather['temperature']
-               temp_diff = self.utils.calculate_temperature_difference(current_temp, prev_temp)
-               change_text = self.utils.format_temperature_change(temp_diff)
-               self.change_var.set(change_text)
-   
-   def refresh_comparisons(self):
-       """Refresh city comparisons"""
+       self.apply_statistics(self.compute_statistics(self.current_weather))
+   
+   def refresh_comparisons(self, ends_cycle=False):
+       """
+       Refresh city comparisons
+       Args: ends_cycle (bool): True when this is the last step of a weather refresh
+       """
+       # Get comparisons if we have current weather data
+       if not self.current_weather:
+           self.status_var.set("Refresh weather first to enable comparisons")
+           return
+       
+       # Scanning the comparison files happens in a worker thread
+       current_weather = self.current_weather
+       
+       def compare():
+           with self.profiler.stage('compare_with_sacramento'):
+               comparisons = self.csv_comparator.compare_with_sacramento(current_weather)
+           self.state.update(comparisons=comparisons,
+                             comparison_sketches=self.csv_comparator.get_comparison_sketches())
+           return comparisons
+       
+       def display(comparisons, error):
+           try:
+               with self.profiler.stage('update_display'):
+                   self._display_comparisons(comparisons, error)
+           finally:
+               if ends_cycle:
+                   self._finish_profiled_cycle()
+                   self._continue_refreshing()
+       
+       self.run_in_background(compare, display)
+   
+   def _continue_refreshing(self):
+       """In continuous mode, queue the next refresh once this one is done"""
+       if self.continuous and not getattr(self.weather_api, 'exhausted', False):
+           self.root.after(0, self.refresh_weather)
+   
+   def _finish_profiled_cycle(self):
+       """Close the current profiled refresh cycle and report when profiling is complete"""
+       was_done = self.profiler.done
+       self.profiler.end_cycle()
+       if self.profiler.done and not was_done:
+           self.status_var.set(f"Profile written to {self.profiler.output_dir}")
+   
+   def _display_comparisons(self, comparisons, error):
+       """Fill the comparison table with the result of compare_with_sacramento"""
        try:
-           # Clear existing data
+           if error is not None:
+               raise error
+           
+           # Clear existing data, remembering which cities were charted
+           charted = {normalize_city(city) for city in self.history_chart.cities[1:]}
            for item in self.comparison_tree.get_children():
                self.comparison_tree.delete(item)
+           self._comparison_cities = {}
            
-           # Get comparisons if we have current weather data
-           if self.current_weather:
-               comparisons = self.csv_comparator.compare_with_sacramento(self.current_weather)
+           for comp in comparisons:
+               # Format display values
+               city_name = comp['city']
+               if comp['state']:
+                   city_name += f", {comp['state']}"
                
-               for comp in comparisons:
-                   # Format display values
-                   city_name = comp['city']
-                   if comp['state']:
-                       city_name += f", {comp['state']}"
-                   
-                   temp_display = f"{comp['temperature']}°F" if comp['temperature'] is not None else "--"
-                   diff_display = comp['temp_comparison'] if comp['temp_comparison'] else "--"
-                   humidity_display = f"{comp['humidity']}%" if comp['humidity'] is not None else "--"
-                   conditions_display = comp['description'] if comp['description'] else "--"
-                   source_display = comp['source_file']
-                   
-                   # Insert into treeview
-                   self.comparison_tree.insert('', 'end', values=(
-                       city_name,
-                       temp_display,
-                       diff_display,
-                       humidity_display,
-                       conditions_display,
-                       source_display
-                   ))
+               temp_display = f"{comp['temperature']}°F" if comp['temperature'] is not None else "--"
+               diff_display = comp['temp_comparison'] if comp['temp_comparison'] else "--"
+               humidity_display = f"{comp['humidity']}%" if comp['humidity'] is not None else "--"
+               conditions_display = comp['description'] if comp['description'] else "--"
+               source_display = comp['source_file']
                
-               if comparisons:
-                   self.status_var.set(f"Found {len(comparisons)} cities for comparison")
-               else:
-                   self.status_var.set("No comparison cities found in CSV files")
+               # Insert into treeview
+               item = self.comparison_tree.insert('', 'end', values=(
+                   city_name,
+                   temp_display,
+                   diff_display,
+                   humidity_display,
+                   conditions_display,
+                   source_display
+               ))
+               self._comparison_cities[item] = comp['city']
+               if normalize_city(comp['city']) in charted:
+                   self.comparison_tree.selection_add(item)
+           
+           if comparisons:
+               self.status_var.set(f"Found {len(comparisons)} cities for comparison")
            else:
-               self.status_var.set("Refresh weather first to enable comparisons")
+               self.status_var.set("No comparison cities found in CSV files")
                
        except Exception as e:
            self.status_var.set(f"Error refreshing comparisons: {str(e)}")
-           print(f"Error in refresh_comparisons: {e}")
+           logger.exception("Error in refresh_comparisons")
    
    def toggle_auto_refresh(self):
        """Toggle auto-refresh functionality"""
@@ -353,13 +604,57 @@ class WeatherGUI:
        if hasattr(self, 'auto_refresh_timer'):
            self.root.after_cancel(self.auto_refresh_timer)
    
+   def show_last_known(self):
+       """Fill the window with the last stored reading and cached statistics"""
+       # Only the end of the history is searched here so a long one can't delay the first paint
+       last_reading = self.data_storage.get_latest_record(city=config.CITY,
+                                                          max_bytes=config.LATEST_SCAN_BYTES)
+       if last_reading:
+           self.show_stored_reading(last_reading)
+       else:
+           self.run_in_background(lambda: self.data_storage.get_latest_record(city=config.CITY),
+                                  self._on_latest_record)
+       cached_stats = self.data_storage.load_cached_stats()
+       self.apply_statistics(cached_stats)
+       self.state.update(stats=cached_stats)
+   
+   def show_stored_reading(self, reading):
+       """Show a reading from the history file as the current weather"""
+       self.current_weather = reading
+       self.update_weather_display(reading)
+       self.updated_var.set(f"{reading.date} {reading.time} (stored)")
+       self.state.update(weather=reading)
+   
+   def _on_latest_record(self, reading, error):
+       """Show the last stored reading found further back in the history, unless a fresh one arrived"""
+       if error is not None:
+           logger.error("Error reading the last stored reading", exc_info=error)
+       elif reading and self.current_weather is None:
+           self.show_stored_reading(reading)
+           self.refresh_comparisons()
+   
    def run(self):
        """Start the GUI application"""
-       # Load initial data and update statistics
-       self.update_statistics()
-       
-       # Auto-fetch weather data on startup (after 2 seconds)
-       self.root.after(2000, self.refresh_weather)
+       # Paint the last known state before any network or comparison work
+       self.show_last_known()
+       self.root.update()
+       self.first_paint_ms = round((time.perf_counter() - self.started_at) * 1000, 1)
+       FIRST_PAINT_SECONDS.set(self.first_paint_ms / 1000)
+       logger.info("Time to first paint: %s ms", self.first_paint_ms)
+       self.status_var.set(f"Showing last stored data (first paint {self.first_paint_ms} ms) - refreshing...")
+       
+       # Only now start the background work: comparisons against the stored
+       # reading, then a fresh fetch (which refreshes comparisons again)
+       if self.current_weather:
+           self.root.after_idle(self.refresh_comparisons)
+       self.root.after_idle(self.history_chart.refresh)
+       self.root.after(config.STARTUP_REFRESH_DELAY, self.refresh_weather)
        
        # Start the GUI event loop
        self.root.mainloop()
+       
+       # Window closed: write any buffered readings, sketches, baseline and rollups before exiting
+       self.data_storage.close()
+       self.sketches.flush()
+       self.baseline.flush()
+       self.rollups.flush()
@@ -0,0 +1,243 @@
+"""
+Temperature history chart drawn on a Tk Canvas
+"""
+
+import logging
+import time
+import tkinter as tk
+from tkinter import ttk
+from datetime import datetime
+import config
+from src import metrics
+from src.downsample import lttb, min_max
+
+logger = logging.getLogger(__name__)
+
+REDRAW_SECONDS = metrics.histogram('weather_chart_redraw_seconds', "Time spent redrawing the history chart")
+
+# Zoom levels, narrowest first: label and span in seconds (None = whole history)
+RANGES = (
+    ('6 h', 6 * 3600),
+    ('1 day', 86400),
+    ('7 days', 7 * 86400),
+    ('30 days', 30 * 86400),
+    ('1 year', 365 * 86400),
+    ('All', None)
+)
+RESOLUTION_NAMES = {300: '5-minute', 3600: 'hourly', 86400: 'daily'}
+# One colour per city; the first city also gets its min/max band
+COLORS = ('#1f77b4', '#d62728', '#2ca02c', '#9467bd', '#ff7f0e', '#8c564b')
+BAND_COLOR = '#d6e6f4'
+MARGIN_LEFT, MARGIN_RIGHT, MARGIN_TOP, MARGIN_BOTTOM = 45, 12, 22, 22
+
+class HistoryChart:
+    """
+    Temperature history of one or more cities, downsampled to the canvas width
+    
+    Series come from load(cities, start, end), which runs in a worker thread
+    and should read precomputed rollups. Resizing only re-downsamples and
+    redraws the series already in memory; zooming loads the new range.
+    """
+    
+    def __init__(self, parent, load, run_in_background, city=None):
+        """
+        Args: parent (widget): Container for the chart
+              load (callable): load(cities, start, end) -> {city: (resolution, buckets)}
+                               as returned by HistoryRollups.series
+              run_in_background (callable): Runs load off the Tk thread, as WeatherGUI.run_in_background
+              city (str): City always shown, defaults to config.CITY
+        """
+        self.load = load
+        self.run_in_background = run_in_background
+        self.cities = [city or config.CITY]
+        self.series = {}
+        self.window = (None, None)
+        # (city, points) -> (mean line, min/max envelope)
+        self._downsampled = {}
+        self._redraw_job = None
+        self._loading = False
+        self._reload = False
+        
+        self.frame = ttk.Frame(parent)
+        
+        # Zoom buttons; the mouse wheel over the chart steps through them too
+        controls = ttk.Frame(self.frame)
+        controls.grid(row=0, column=0, sticky=tk.W)
+        self.range_var = tk.IntVar(value=2)
+        for index, (label, span) in enumerate(RANGES):
+            ttk.Radiobutton(controls, text=label, value=index, variable=self.range_var,
+                            command=self.refresh).pack(side=tk.LEFT, padx=(0, 6))
+        
+        self.canvas = tk.Canvas(self.frame, background='white', highlightthickness=0,
+                                width=480, height=260)
+        self.canvas.grid(row=1, column=0, sticky=(tk.W, tk.E, tk.N, tk.S), pady=(5, 5))
+        
+        self.info_var = tk.StringVar()
+        self.info_var.set("Select cities in the comparison table to add them to the chart")
+        ttk.Label(self.frame, textvariable=self.info_var, font=("Arial", 8)).grid(row=2, column=0, sticky=tk.W)
+        
+        self.frame.columnconfigure(0, weight=1)
+        self.frame.rowconfigure(1, weight=1)
+        
+        self.canvas.bind('<Configure>', self._schedule_redraw)
+        self.canvas.bind('<MouseWheel>', self._on_wheel)
+        self.canvas.bind('<Button-4>', lambda event: self.zoom(-1))
+        self.canvas.bind('<Button-5>', lambda event: self.zoom(1))
+    
+    def set_cities(self, cities):
+        """
+        Show these cities, reloading if the selection changed
+        Args: cities (list): City names, the first one drawn with its min/max band
+        """
+        if cities != self.cities:
+            self.cities = list(cities)
+            self.refresh()
+    
+    def zoom(self, step):
+        """Move to a narrower (negative step) or wider (positive) range"""
+        index = max(0, min(len(RANGES) - 1, self.range_var.get() + step))
+        if index != self.range_var.get():
+            self.range_var.set(index)
+            self.refresh()
+    
+    def _on_wheel(self, event):
+        self.zoom(-1 if event.delta > 0 else 1)
+    
+    def refresh(self):
+        """Load the selected range for the selected cities and redraw"""
+        if self._loading:
+            # Load again once the running one is done, with whatever is selected then
+            self._reload = True
+            return
+        self._loading = True
+        span = RANGES[self.range_var.get()][1]
+        end = time.time()
+        start = end - span if span is not None else None
+        cities = list(self.cities)
+        
+        def display(series, error):
+            self._loading = False
+            if error is not None:
+                logger.error("Error loading chart data", exc_info=error)
+                self.info_var.set(f"Error loading history: {error}")
+            else:
+                self.series = series
+                self.window = (start, end)
+                self._downsampled = {}
+                self.redraw()
+            if self._reload:
+                self._reload = False
+                self.refresh()
+        
+        self.run_in_background(lambda: self.load(cities, start, end), display)
+    
+    def _schedule_redraw(self, event=None):
+        # Resizing fires many events; draw once it settles
+        if self._redraw_job is not None:
+            self.canvas.after_cancel(self._redraw_job)
+        self._redraw_job = self.canvas.after(30, self.redraw)
+    
+    def _downsample(self, city, buckets, points):
+        key = (city, points)
+        cached = self._downsampled.get(key)
+        if cached is None:
+            line = lttb([(bucket[0], bucket[1]) for bucket in buckets], points)
+            envelope = min_max([(bucket[0], bucket[2], bucket[3]) for bucket in buckets], points)
+            cached = self._downsampled[key] = (line, envelope)
+        return cached
+    
+    def redraw(self):
+        """Draw the loaded series to fit the current canvas size"""
+        self._redraw_job = None
+        started = time.perf_counter()
+        canvas = self.canvas
+        canvas.delete('all')
+        width, height = canvas.winfo_width(), canvas.winfo_height()
+        plot_width = width - MARGIN_LEFT - MARGIN_RIGHT
+        plot_height = height - MARGIN_TOP - MARGIN_BOTTOM
+        if plot_width < 20 or plot_height < 20:
+            return
+        
+        # About one point per pixel column is all the canvas can show
+        points = max(3, min(config.CHART_MAX_POINTS, plot_width))
+        drawn = []
+        bucket_count = 0
+        resolutions = set()
+        for city in self.cities:
+            resolution, buckets = self.series.get(city, (None, []))
+            if buckets:
+                drawn.append((city, self._downsample(city, buckets, points)))
+                bucket_count += len(buckets)
+                resolutions.add(resolution)
+        
+        if not drawn:
+            canvas.create_text(width / 2, height / 2, text="No history for this range yet", fill='gray')
+            self.info_var.set("")
+            return
+        
+        start, end = self.window
+        if start is None:
+            start = min(line[0][0] for city, (line, envelope) in drawn)
+        if end <= start:
+            start = end - 3600
+        low = min(point[1] for city, (line, envelope) in drawn for point in envelope)
+        high = max(point[2] for city, (line, envelope) in drawn for point in envelope)
+        if high - low < 2:
+            low, high = low - 1, high + 1
+        
+        def x_of(epoch):
+            # Buckets straddling the start of the range are pinned to the edge
+            return MARGIN_LEFT + max(0.0, (epoch - start) / (end - start)) * plot_width
+        
+        def y_of(value):
+            return MARGIN_TOP + (high - value) / (high - low) * plot_height
+        
+        self._draw_axes(start, end, low, high, plot_width, plot_height)
+        
+        for index, (city, (line, envelope)) in enumerate(drawn):
+            color = COLORS[index % len(COLORS)]
+            if index == 0 and len(envelope) > 1:
+                band = [coordinate for x, lowest, highest in envelope for coordinate in (x_of(x), y_of(highest))]
+                band += [coordinate for x, lowest, highest in reversed(envelope) for coordinate in (x_of(x), y_of(lowest))]
+                canvas.create_polygon(band, fill=BAND_COLOR, outline='')
+            if len(line) > 1:
+                canvas.create_line([coordinate for x, y in line for coordinate in (x_of(x), y_of(y))],
+                                   fill=color, width=1.5)
+            else:
+                x, y = x_of(line[0][0]), y_of(line[0][1])
+                canvas.create_oval(x - 2, y - 2, x + 2, y + 2, fill=color, outline=color)
+            canvas.create_text(MARGIN_LEFT + 5 + index * 110, 4, text=city, fill=color,
+                               anchor=tk.NW, font=("Arial", 9, "bold"))
+        
+        elapsed = time.perf_counter() - started
+        REDRAW_SECONDS.observe(elapsed)
+        shown = sum(len(line) for city, (line, envelope) in drawn)
+        resolution_names = '/'.join(RESOLUTION_NAMES.get(resolution, f"{resolution}s")
+                                    for resolution in sorted(resolutions))
+        self.info_var.set(f"{shown} points from {bucket_count} {resolution_names} buckets, "
+                          f"drawn in {elapsed * 1000:.1f} ms")
+    
+    def _draw_axes(self, start, end, low, high, plot_width, plot_height):
+        """Grid lines with temperature and time labels"""
+        canvas = self.canvas
+        right = MARGIN_LEFT + plot_width
+        bottom = MARGIN_TOP + plot_height
+        
+        for step in range(5):
+            value = low + (high - low) * step / 4
+            y = bottom - plot_height * step / 4
+            canvas.create_line(MARGIN_LEFT, y, right, y, fill='#eeeeee')
+            canvas.create_text(MARGIN_LEFT - 4, y, text=f"{value:.0f}°F", anchor=tk.E, font=("Arial", 8))
+        
+        span = end - start
+        if span <= 2 * 86400:
+            time_format = '%H:%M'
+        elif span <= 90 * 86400:
+            time_format = '%b %d'
+        else:
+            time_format = '%b %Y'
+        for step, anchor in ((0, tk.NW), (2, tk.N), (4, tk.NE)):
+            x = MARGIN_LEFT + plot_width * step / 4
+            label = datetime.fromtimestamp(start + span * step / 4).strftime(time_format)
+            canvas.create_text(x, bottom + 4, text=label, anchor=anchor, font=("Arial", 8))
+        canvas.create_rectangle(MARGIN_LEFT, MARGIN_TOP, right, bottom, outline='#bbbbbb')
@@ -0,0 +1,160 @@
+"""
+Summaries of the history file that follow it by byte offset
+"""
+
+import json
+import logging
+import os
+import threading
+import time
+import config
+from src.data_storage import mkstemp_like
+
+logger = logging.getLogger(__name__)
+
+
+class HistoryFollower:
+    """
+    A summary of the history file, kept on disk next to it
+
+    The follower remembers how far into the history file it has read, so
+    catch_up() only reads rows appended since - by this process, another
+    instance or a bulk import - and the history is never rescanned. After a
+    capped history is trimmed only the offset moves (see DataStorage.follow());
+    any other rewrite rebuilds the summary from the rows left.
+
+    New rows are read into a separate summary without holding the lock, so
+    queries keep answering from the current one during a long catch-up; it is
+    merged in (or swapped in after a rebuild) at the end.
+
+    Subclasses set KEY, DESCRIPTION and ROWS and implement _empty() and
+    _from_dict(); a summary needs add_records(), merge() and to_dict().
+    """
+
+    # Key of the summary in the saved file
+    KEY = None
+    # What the summary is, for log lines
+    DESCRIPTION = None
+    # metrics.counter of rows added
+    ROWS = None
+
+    def __init__(self, data_storage, path):
+        self.data_storage = data_storage
+        self.path = path
+        self.summary = None
+        self.offset = 0
+        # DataStorage.generation() the offset belongs to
+        self.generation = 0
+        # Guards the summary; held only briefly so queries never wait on a catch-up
+        self._lock = threading.Lock()
+        # One catch-up at a time
+        self._update_lock = threading.Lock()
+        # One save at a time, so an older snapshot never replaces a newer one
+        self._save_lock = threading.Lock()
+        # Rows added since the last save() and when that was
+        self._unsaved = 0
+        self._saved_at = time.monotonic()
+
+    def _empty(self):
+        """A summary with no rows"""
+        raise NotImplementedError
+
+    def _from_dict(self, data):
+        """The summary saved under KEY"""
+        raise NotImplementedError
+
+    def _prepare(self, new):
+        """Called on the new rows' summary outside the lock, before it is merged in"""
+
+    def _merge(self, new):
+        """Fold the new rows' summary into self.summary; called under the lock"""
+        self.summary.merge(new)
+
+    def _load(self):
+        try:
+            with open(self.path, 'r', encoding='utf-8') as file:
+                data = json.load(file)
+            self.summary = self._from_dict(data[self.KEY])
+            self.offset = data['history_offset']
+            self.generation = data.get('history_generation', 0)
+        except (FileNotFoundError, ValueError, KeyError, TypeError, IndexError):
+            self.summary = self._empty()
+            self.offset = 0
+            self.generation = 0
+
+    def save(self):
+        """Write the summary to disk atomically"""
+        with self._save_lock:
+            with self._lock:
+                if self.summary is None:
+                    return
+                data = {'history_offset': self.offset, 'history_generation': self.generation,
+                        self.KEY: self.summary.to_dict()}
+                self._unsaved = 0
+                self._saved_at = time.monotonic()
+            handle, temp_path = mkstemp_like(self.path)
+            try:
+                with os.fdopen(handle, 'w', encoding='utf-8') as file:
+                    json.dump(data, file, separators=(',', ':'))
+                os.replace(temp_path, self.path)
+            except BaseException:
+                try:
+                    os.remove(temp_path)
+                except OSError:
+                    pass
+                raise
+
+    def catch_up(self, save=True):
+        """
+        Add history rows written since the last call, loading the summary first if needed
+        Args: save (bool): Save if due: after a rebuild, SUMMARY_SAVE_ROWS new
+                           rows or SUMMARY_SAVE_SECONDS since the last save
+        Returns: int: Number of rows added
+        """
+        with self._update_lock:
+            with self._lock:
+                if self.summary is None:
+                    self._load()
+                offset, generation = self.offset, self.generation
+            tail = self.data_storage.follow(offset, generation)
+            if tail is None:
+                return 0
+            with tail:
+                if not tail.restart and tail.start == tail.stop:
+                    with self._lock:
+                        # Nothing new, but a trim may still have moved the offset
+                        self.offset, self.generation = tail.stop, tail.generation
+                    return 0
+                if tail.restart:
+                    logger.info("History rewritten; rebuilding %s", self.DESCRIPTION,
+                                extra={'path': self.path})
+
+                start = time.perf_counter()
+                new = self._empty()
+                added = new.add_records(tail.records())
+            self._prepare(new)
+            with self._lock:
+                if tail.restart:
+                    self.summary = new
+                else:
+                    self._merge(new)
+                self.offset = tail.stop
+                self.generation = tail.generation
+                self._unsaved += added
+        self.ROWS.inc(added)
+        if added > 1000:
+            logger.info("Updated %s", self.DESCRIPTION, extra={
+                'rows': added, 'seconds': round(time.perf_counter() - start, 3)})
+        if save and (tail.restart or self._save_due()):
+            self.save()
+        return added
+
+    def _save_due(self):
+        # Rewriting the whole file for every new reading costs more than the reading
+        return self._unsaved and (self._unsaved >= config.SUMMARY_SAVE_ROWS or
+                                  time.monotonic() - self._saved_at >= config.SUMMARY_SAVE_SECONDS)
+
+    def flush(self):
+        """Save if rows were added since the last save, e.g. before exiting"""
+        if self._unsaved:
+            self.save()
@@ -0,0 +1,65 @@
+"""
+Logging setup for the weather app
+
+Modules log through logging.getLogger(__name__) with %-style arguments so
+disabled levels cost only a level check. Extra context passed with
+extra={...} is rendered as key=value pairs (text) or JSON fields.
+"""
+
+import json
+import logging
+import sys
+
+# Attributes every LogRecord has; anything else came in through extra={...}
+_STANDARD_ATTRS = set(vars(logging.LogRecord('', 0, '', 0, '', (), None))) | {'message', 'asctime'}
+
+
+def _extra_fields(record):
+    return {key: value for key, value in vars(record).items() if key not in _STANDARD_ATTRS}
+
+
+class KeyValueFormatter(logging.Formatter):
+    """Human-readable lines with structured context appended as key=value"""
+
+    def __init__(self):
+        super().__init__('%(asctime)s %(levelname)-7s %(name)s: %(message)s')
+
+    def format(self, record):
+        line = super().format(record)
+        fields = _extra_fields(record)
+        if fields:
+            line += ' ' + ' '.join(f"{key}={value}" for key, value in fields.items())
+        return line
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per line, for log shippers"""
+
+    def format(self, record):
+        entry = {
+            'time': self.formatTime(record),
+            'level': record.levelname,
+            'logger': record.name,
+            'message': record.getMessage()
+        }
+        entry.update(_extra_fields(record))
+        if record.exc_info:
+            entry['exception'] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str)
+
+
+def configure_logging(level='INFO', json_format=False, stream=None):
+    """
+    Configure the root logger for the app
+    Args: level (str): Minimum level name, e.g. 'DEBUG' or 'WARNING'
+          json_format (bool): Emit JSON lines instead of key=value text
+          stream: Output stream (defaults to stderr)
+    """
+    handler = logging.StreamHandler(stream or sys.stderr)
+    handler.setFormatter(JsonFormatter() if json_format else KeyValueFormatter())
+
+    root = logging.getLogger()
+    for existing in list(root.handlers):
+        root.removeHandler(existing)
+    root.addHandler(handler)
+    root.setLevel(getattr(logging, str(level).upper(), logging.INFO))
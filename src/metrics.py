@@ -0,0 +1,331 @@
+"""
+Lightweight metrics (counters, gauges, latency histograms) with
+Prometheus text and JSON snapshot export
+"""
+
+import bisect
+import json
+import os
+import threading
+import time
+
+# Latency buckets in seconds, from sub-millisecond file work to slow network calls
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05,
+                   0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+def _label_key(labels):
+    """Turn keyword labels into a hashable, ordered key"""
+    return tuple(sorted(labels.items())) if labels else ()
+
+
+def _format_labels(key, extra=None):
+    """Render a label key in Prometheus syntax"""
+    items = list(key) + (list(extra) if extra else [])
+    if not items:
+        return ''
+    escaped = ','.join(
+        '{}="{}"'.format(name, str(value).replace('\\', '\\\\').replace('"', '\\"'))
+        for name, value in items)
+    return '{' + escaped + '}'
+
+
+def _format_value(value):
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class _Metric:
+    """Shared bookkeeping for all metric types"""
+
+    type_name = None
+
+    def __init__(self, name, help_text):
+        self.name = name
+        self.help = help_text
+        self._lock = threading.Lock()
+        self._values = {}
+
+    @property
+    def family(self):
+        """Name used on the # HELP/# TYPE lines, matching the sample names"""
+        return self.name
+
+    def _prometheus_header(self):
+        return [f"# HELP {self.family} {self.help}", f"# TYPE {self.family} {self.type_name}"]
+
+
+class Counter(_Metric):
+    """Monotonically increasing count"""
+
+    type_name = 'counter'
+
+    @property
+    def family(self):
+        return f"{self.name}_total"
+
+    def inc(self, amount=1, **labels):
+        key = _label_key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels):
+        return self._values.get(_label_key(labels), 0)
+
+    def render(self):
+        lines = self._prometheus_header()
+        with self._lock:
+            for key, value in sorted(self._values.items()):
+                lines.append(f"{self.family}{_format_labels(key)} {_format_value(value)}")
+        return lines
+
+    def snapshot(self):
+        with self._lock:
+            return [{'labels': dict(key), 'value': value} for key, value in self._values.items()]
+
+
+class Gauge(_Metric):
+    """Value that can go up and down"""
+
+    type_name = 'gauge'
+
+    def set(self, value, **labels):
+        with self._lock:
+            self._values[_label_key(labels)] = value
+
+    def inc(self, amount=1, **labels):
+        key = _label_key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels):
+        return self._values.get(_label_key(labels))
+
+    def render(self):
+        lines = self._prometheus_header()
+        with self._lock:
+            for key, value in sorted(self._values.items()):
+                lines.append(f"{self.name}{_format_labels(key)} {_format_value(value)}")
+        return lines
+
+    def snapshot(self):
+        with self._lock:
+            return [{'labels': dict(key), 'value': value} for key, value in self._values.items()]
+
+
+class _Timer:
+    """Context manager that records its elapsed time into a histogram"""
+
+    __slots__ = ('histogram', 'labels', 'start')
+
+    def __init__(self, histogram, labels):
+        self.histogram = histogram
+        self.labels = labels
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.histogram.observe(time.perf_counter() - self.start, **self.labels)
+
+
+class Histogram(_Metric):
+    """Distribution of observed values (usually latencies in seconds)"""
+
+    type_name = 'histogram'
+
+    def __init__(self, name, help_text, buckets=DEFAULT_BUCKETS):
+        super().__init__(name, help_text)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value, **labels):
+        key = _label_key(labels)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                # [per-bucket counts (+Inf last), count, sum]
+                state = self._values[key] = [[0] * (len(self.buckets) + 1), 0, 0.0]
+            state[0][index] += 1
+            state[1] += 1
+            state[2] += value
+
+    def time(self, **labels):
+        """Time a block: with histogram.time(): ..."""
+        return _Timer(self, labels)
+
+    def count(self, **labels):
+        state = self._values.get(_label_key(labels))
+        return state[1] if state else 0
+
+    def render(self):
+        lines = self._prometheus_header()
+        with self._lock:
+            for key, (counts, count, total) in sorted(self._values.items()):
+                cumulative = 0
+                for bound, bucket_count in zip(self.buckets + (float('inf'),), counts):
+                    cumulative += bucket_count
+                    labels = _format_labels(key, [('le', _format_value(bound))])
+                    lines.append(f"{self.name}_bucket{labels} {cumulative}")
+                lines.append(f"{self.name}_count{_format_labels(key)} {count}")
+                lines.append(f"{self.name}_sum{_format_labels(key)} {_format_value(total)}")
+        return lines
+
+    def snapshot(self):
+        with self._lock:
+            return [{
+                'labels': dict(key),
+                'count': count,
+                'sum': total,
+                'buckets': dict(zip([_format_value(b) for b in self.buckets + (float('inf'),)],
+                                    counts))
+            } for key, (counts, count, total) in self._values.items()]
+
+
+class MetricsRegistry:
+    """Holds every metric so they can be exported together"""
+
+    def __init__(self):
+        self._metrics = {}
+        self._lock = threading.Lock()
+
+    def _get_or_create(self, cls, name, help_text, **kwargs):
+        with self._lock:
+            metric = self._metrics.get(name)
+            if metric is None:
+                metric = self._metrics[name] = cls(name, help_text, **kwargs)
+            elif not isinstance(metric, cls):
+                raise ValueError(f"Metric {name} is already registered as a {metric.type_name}")
+            return metric
+
+    def counter(self, name, help_text):
+        return self._get_or_create(Counter, name, help_text)
+
+    def gauge(self, name, help_text):
+        return self._get_or_create(Gauge, name, help_text)
+
+    def histogram(self, name, help_text, buckets=DEFAULT_BUCKETS):
+        return self._get_or_create(Histogram, name, help_text, buckets=buckets)
+
+    def render_prometheus(self):
+        """Render all metrics in the Prometheus text exposition format"""
+        lines = []
+        for name in sorted(self._metrics):
+            lines.extend(self._metrics[name].render())
+        return '\n'.join(lines) + '\n'
+
+    def snapshot(self):
+        """Return all metrics as a JSON-serializable dict"""
+        return {
+            'timestamp': time.time(),
+            'metrics': {
+                name: {'type': metric.type_name, 'help': metric.help, 'values': metric.snapshot()}
+                for name, metric in sorted(self._metrics.items())
+            }
+        }
+
+
+# Process-wide registry used by the app's modules
+REGISTRY = MetricsRegistry()
+counter = REGISTRY.counter
+gauge = REGISTRY.gauge
+histogram = REGISTRY.histogram
+
+
+_MetricsHandler = None
+
+
+def _handler_class():
+    """
+    Request handler serving /metrics (Prometheus text) and /metrics.json
+
+    Built on first use so that importing this module, which every other
+    module does at startup, doesn't pull in http.server.
+    """
+    global _MetricsHandler
+    if _MetricsHandler is not None:
+        return _MetricsHandler
+    from http.server import BaseHTTPRequestHandler
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path.split('?')[0] == '/metrics':
+                body = self.server.registry.render_prometheus().encode('utf-8')
+                content_type = 'text/plain; version=0.0.4; charset=utf-8'
+            elif self.path.split('?')[0] == '/metrics.json':
+                body = json.dumps(self.server.registry.snapshot()).encode('utf-8')
+                content_type = 'application/json'
+            else:
+                self.send_error(404)
+                return
+
+            self.send_response(200)
+            self.send_header('Content-Type', content_type)
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass
+
+    _MetricsHandler = Handler
+    return Handler
+
+
+class MetricsServer:
+    """Background HTTP server exposing the registry for Prometheus to scrape"""
+
+    def __init__(self, port, host='127.0.0.1', registry=None):
+        from http.server import ThreadingHTTPServer
+        self.server = ThreadingHTTPServer((host, port), _handler_class())
+        self.server.daemon_threads = True
+        self.server.registry = registry or REGISTRY
+        self.thread = None
+
+    @property
+    def port(self):
+        return self.server.server_address[1]
+
+    def start(self):
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+class SnapshotWriter:
+    """Periodically writes the registry as JSON to a file"""
+
+    def __init__(self, path, interval=60, registry=None):
+        self.path = path
+        self.interval = interval
+        self.registry = registry or REGISTRY
+        self._stop = threading.Event()
+        self.thread = None
+
+    def write(self):
+        """Write one snapshot, replacing the previous file atomically"""
+        os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+        temp_path = self.path + '.tmp'
+        with open(temp_path, 'w', encoding='utf-8') as file:
+            json.dump(self.registry.snapshot(), file)
+        os.replace(temp_path, self.path)
+
+    def _loop(self):
+        while not self._stop.wait(self.interval):
+            self.write()
+
+    def start(self):
+        self.thread = threading.Thread(target=self._loop, daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        """Stop the writer, leaving a final snapshot behind"""
+        self._stop.set()
+        self.write()
@@ -0,0 +1,255 @@
+"""
+Profiling support for the refresh cycle
+
+A RefreshProfiler wraps each stage of a refresh (fetch, save, statistics,
+compare, and display in the GUI) in its own cProfile run, optionally with
+tracemalloc snapshots, and writes sorted reports once enough cycles ran.
+cProfile, pstats and tracemalloc are only imported once a profiler is used,
+so the default NullProfiler adds nothing to startup.
+"""
+
+import contextlib
+import io
+import json
+import logging
+import os
+import threading
+import time
+from datetime import datetime
+
+logger = logging.getLogger(__name__)
+
+# Stage names match the functions they time
+STAGES = (
+    'fetch_current_weather',
+    'save_weather_data',
+    'update_statistics',
+    'compare_with_sacramento',
+    'update_display'
+)
+
+
+class _StageStats:
+    """Accumulated measurements for one stage"""
+
+    def __init__(self):
+        self.calls = 0
+        self.total = 0.0
+        self.max = 0.0
+        self.peak_memory = 0
+        self.profile_stats = None
+        # (before, after) tracemalloc snapshots, compared when reports are written
+        self.snapshots = []
+
+    def add_profile(self, profile):
+        import pstats
+        if self.profile_stats is None:
+            self.profile_stats = pstats.Stats(profile)
+        else:
+            self.profile_stats.add(profile)
+
+
+class RefreshProfiler:
+    """Profiles a fixed number of refresh cycles and writes the reports"""
+
+    def __init__(self, cycles, output_dir=None, trace_memory=False, sort='cumulative', top=40):
+        self.cycles = cycles
+        self.output_dir = output_dir or os.path.join(
+            'profiles', datetime.now().strftime('%Y%m%d_%H%M%S'))
+        self.trace_memory = trace_memory
+        self.sort = sort
+        self.top = top
+
+        self.completed_cycles = 0
+        self.cycle_times = []
+        self.reports_written = False
+        self._cycle_start = None
+        self._stages = {name: _StageStats() for name in STAGES}
+        self._lock = threading.Lock()
+        # cProfile can only have one active profiler at a time, so stages that
+        # overlap in other threads are timed but not profiled
+        self._profiling = threading.Lock()
+
+        if trace_memory:
+            import tracemalloc
+        if trace_memory and not tracemalloc.is_tracing():
+            # One frame is enough for per-line top-lists and keeps snapshots cheap
+            tracemalloc.start(1)
+
+    @property
+    def done(self):
+        return self.completed_cycles >= self.cycles
+
+    def start_cycle(self):
+        """Mark the start of a refresh cycle"""
+        if not self.done and self._cycle_start is None:
+            self._cycle_start = time.perf_counter()
+
+    def end_cycle(self):
+        """Mark the end of a refresh cycle; writes the reports after the last one"""
+        if self._cycle_start is None:
+            return
+        self.cycle_times.append(time.perf_counter() - self._cycle_start)
+        self._cycle_start = None
+        self.completed_cycles += 1
+        logger.info("Profiled refresh cycle %d of %d", self.completed_cycles, self.cycles)
+
+        if self.done:
+            self.write_reports()
+
+    @contextlib.contextmanager
+    def stage(self, name):
+        """Profile the enclosed block as one call of the named stage"""
+        if self.done:
+            yield
+            return
+
+        import cProfile
+        import tracemalloc
+        stats = self._stages.setdefault(name, _StageStats())
+        profile = cProfile.Profile() if self._profiling.acquire(blocking=False) else None
+        before = None
+        if self.trace_memory:
+            tracemalloc.reset_peak()
+            before = tracemalloc.take_snapshot()
+
+        start = time.perf_counter()
+        if profile:
+            profile.enable()
+        try:
+            yield
+        finally:
+            if profile:
+                profile.disable()
+                self._profiling.release()
+            elapsed = time.perf_counter() - start
+
+            with self._lock:
+                stats.calls += 1
+                stats.total += elapsed
+                stats.max = max(stats.max, elapsed)
+                if profile:
+                    stats.add_profile(profile)
+                if before is not None:
+                    stats.peak_memory = max(stats.peak_memory, tracemalloc.get_traced_memory()[1])
+                    stats.snapshots.append((before, tracemalloc.take_snapshot()))
+
+    @staticmethod
+    def _is_own_allocation(frame):
+        """True for allocations made by the profiling machinery itself"""
+        import cProfile
+        import pstats
+        import tracemalloc
+        return (frame.filename in (tracemalloc.__file__, cProfile.__file__, pstats.__file__, __file__)
+                or frame.filename.startswith('<frozen importlib'))
+
+    def _allocation_diffs(self, stats):
+        """Net allocations per source line summed over every call of a stage"""
+        totals = {}
+        for before, after in stats.snapshots:
+            for diff in after.compare_to(before, 'lineno'):
+                frame = diff.traceback[0]
+                if self._is_own_allocation(frame):
+                    continue
+                size, count = totals.get(str(frame), (0, 0))
+                totals[str(frame)] = (size + diff.size_diff, count + diff.count_diff)
+        return sorted(totals.items(), key=lambda item: abs(item[1][0]), reverse=True)
+
+    def summary(self):
+        """Per-stage breakdown as a JSON-serializable dict"""
+        measured = sum(stats.total for stats in self._stages.values())
+        return {
+            'cycles': self.completed_cycles,
+            'cycle_seconds': self.cycle_times,
+            'trace_memory': self.trace_memory,
+            'stages': {
+                name: {
+                    'calls': stats.calls,
+                    'total_s': stats.total,
+                    'mean_s': stats.total / stats.calls if stats.calls else None,
+                    'max_s': stats.max,
+                    'share': stats.total / measured if measured else None,
+                    'peak_memory_bytes': stats.peak_memory if self.trace_memory else None
+                }
+                for name, stats in self._stages.items() if stats.calls
+            }
+        }
+
+    def _stats_text(self, stats):
+        stream = io.StringIO()
+        stats.stream = stream
+        stats.sort_stats(self.sort).print_stats(self.top)
+        return stream.getvalue()
+
+    def write_reports(self):
+        """Write the summary, per-stage cProfile reports and allocation top-lists"""
+        if self.reports_written:
+            return self.output_dir
+        import pstats
+        import tracemalloc
+        os.makedirs(self.output_dir, exist_ok=True)
+        summary = self.summary()
+
+        with open(os.path.join(self.output_dir, 'summary.json'), 'w', encoding='utf-8') as file:
+            json.dump(summary, file, indent=2)
+
+        lines = [f"Profiled {summary['cycles']} refresh cycles", '',
+                 f"{'stage':<26}{'calls':>6}{'total ms':>12}{'mean ms':>12}{'max ms':>12}{'share':>8}"]
+        for name, entry in summary['stages'].items():
+            lines.append(f"{name:<26}{entry['calls']:>6}{entry['total_s'] * 1000:>12.2f}"
+                         f"{entry['mean_s'] * 1000:>12.2f}{entry['max_s'] * 1000:>12.2f}"
+                         f"{entry['share'] * 100:>7.1f}%")
+        with open(os.path.join(self.output_dir, 'summary.txt'), 'w', encoding='utf-8') as file:
+            file.write('\n'.join(lines) + '\n')
+
+        combined = None
+        for name, stats in self._stages.items():
+            if stats.profile_stats is None:
+                continue
+            stats.profile_stats.dump_stats(os.path.join(self.output_dir, f"stage_{name}.prof"))
+            with open(os.path.join(self.output_dir, f"stage_{name}.txt"), 'w', encoding='utf-8') as file:
+                file.write(self._stats_text(stats.profile_stats))
+            if combined is None:
+                combined = pstats.Stats(os.path.join(self.output_dir, f"stage_{name}.prof"))
+            else:
+                combined.add(os.path.join(self.output_dir, f"stage_{name}.prof"))
+
+        if combined is not None:
+            with open(os.path.join(self.output_dir, 'all_stages.txt'), 'w', encoding='utf-8') as file:
+                file.write(self._stats_text(combined))
+
+        if self.trace_memory:
+            for name, stats in self._stages.items():
+                if not stats.snapshots:
+                    continue
+                ranked = self._allocation_diffs(stats)
+                with open(os.path.join(self.output_dir, f"memory_{name}.txt"), 'w', encoding='utf-8') as file:
+                    file.write(f"Net allocations during {name} (peak {stats.peak_memory} bytes)\n\n")
+                    for location, (size, count) in ranked[:self.top]:
+                        file.write(f"{size / 1024:>10.1f} KiB {count:>8} blocks  {location}\n")
+
+            with open(os.path.join(self.output_dir, 'memory_top.txt'), 'w', encoding='utf-8') as file:
+                file.write("Largest live allocations at the end of profiling\n\n")
+                statistics = [statistic for statistic in tracemalloc.take_snapshot().statistics('lineno')
+                              if not self._is_own_allocation(statistic.traceback[0])]
+                for statistic in statistics[:self.top]:
+                    file.write(f"{statistic}\n")
+
+        self.reports_written = True
+        logger.info("Profile reports written", extra={'path': self.output_dir})
+        return self.output_dir
+
+
+class NullProfiler:
+    """Stand-in used when profiling is off; every hook is a no-op"""
+
+    done = True
+
+    def start_cycle(self):
+        pass
+
+    def end_cycle(self):
+        pass
+
+    def stage(self, name):
+        return contextlib.nullcontext()
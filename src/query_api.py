@@ -0,0 +1,315 @@
+"""
+Read-only HTTP query API answering from the in-memory AppState
+
+    GET /current                      latest reading, its anomaly score and the display statistics
+    GET /stats?days=7&city=...        temperature statistics over a window
+    GET /history?start=...&end=...    readings in a time range
+    GET /comparisons                  city comparisons against the latest reading
+    GET /percentiles?city=...         approximate p5/p50/p95 from the quantile sketches
+
+Windows take start/end (ISO timestamps or epoch seconds) or days/hours back
+from now. Responses carry an ETag and honour If-None-Match.
+"""
+
+import hashlib
+import json
+import logging
+import math
+import threading
+import time
+from datetime import datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+import config
+from src import metrics
+from src.sketches import METRICS
+from src.weather_record import parse_timestamp
+
+logger = logging.getLogger(__name__)
+
+QUERY_REQUESTS = metrics.counter('weather_query_requests', "Query API requests by endpoint and status")
+QUERY_CACHE = metrics.counter('weather_query_cache', "Query API response cache lookups by result")
+
+
+class QueryError(ValueError):
+    """Bad query parameters; reported to the client as 400"""
+
+
+def _check_epoch(epoch, name):
+    """Reject times a datetime can't hold (nan, inf, 1e400, years past 9999)"""
+    try:
+        if not math.isfinite(epoch):
+            raise ValueError(epoch)
+        datetime.fromtimestamp(epoch)
+    except (ValueError, OverflowError, OSError):
+        raise QueryError(f"{name} is out of range")
+    return epoch
+
+
+def _parse_time(value, name):
+    try:
+        epoch = float(value)
+    except ValueError:
+        epoch = None
+    if epoch is not None:
+        return _check_epoch(epoch, name)
+    epoch = parse_timestamp(value)
+    if epoch is None:
+        raise QueryError(f"{name} must be an ISO timestamp or epoch seconds")
+    return epoch
+
+
+def _parse_window(params, now, default_days=None):
+    """
+    Turn start/end or days/hours parameters into an epoch window
+    Returns: tuple: (start, end), either of which may be None
+    """
+    start = _parse_time(params['start'], 'start') if 'start' in params else None
+    end = _parse_time(params['end'], 'end') if 'end' in params else None
+    span = None
+    try:
+        if 'days' in params:
+            span = float(params['days']) * 86400
+        elif 'hours' in params:
+            span = float(params['hours']) * 3600
+    except ValueError:
+        raise QueryError("days and hours must be numbers")
+    if span is None and start is None and default_days is not None:
+        span = default_days * 86400
+    if span is not None and start is None:
+        start = _check_epoch((end if end is not None else now) - span, 'days/hours')
+    if start is not None and end is not None and end < start:
+        raise QueryError("end is before start")
+    return start, end
+
+
+class QueryHandlers:
+    """Builds the JSON documents for each endpoint from an AppState"""
+
+    def __init__(self, state, sketches=None, history_limit=None):
+        self.state = state
+        # HistorySketches for approximate percentiles, if available
+        self.sketches = sketches
+        self.history_limit = history_limit or config.API_HISTORY_LIMIT
+
+    def version(self):
+        """
+        What cached responses depend on: the state, and how far the sketches have read
+
+        The sketches catch up separately from the state (e.g. while the query
+        API warms up), so their progress has to invalidate cached percentiles too.
+        """
+        if self.sketches is None:
+            return self.state.version
+        return self.state.version, self.sketches.generation, self.sketches.offset
+
+    def index(self, params, now):
+        return {'endpoints': sorted(ROUTES), 'version': self.state.version}
+
+    def current(self, params, now):
+        version, weather, stats, comparisons, anomaly = self.state.snapshot()
+        return {
+            'version': version,
+            'updated_at': self.state.updated_at,
+            'weather': weather.to_dict() if weather else None,
+            'anomaly': anomaly,
+            'stats': stats
+        }
+
+    def stats(self, params, now):
+        start, end = _parse_window(params, now, default_days=7)
+        city = params.get('city') or config.CITY
+        result = {'city': city, 'start': start, 'end': end,
+                  'history_loaded': self.state.history_loaded}
+        result.update(self.state.window_stats(start, end, city))
+        if self.sketches is not None:
+            # Whole days overlapping the window
+            result['percentiles'] = {field: self.sketches.quantiles(city, field, start=start, end=end)
+                                     for field in METRICS}
+        return result
+
+    def percentiles(self, params, now):
+        start, end = _parse_window(params, now)
+        comparison_sketches = self.state.comparison_sketches
+        if params.get('city'):
+            cities = [params['city']]
+        else:
+            cities = set(self.sketches.cities() if self.sketches is not None else [])
+            cities.update(comparison_sketches.cities() if comparison_sketches else [])
+            cities = sorted(cities)
+
+        result = {}
+        for city in cities:
+            result[city] = {
+                'history': {field: self.sketches.quantiles(city, field, start=start, end=end)
+                            for field in METRICS} if self.sketches is not None else None,
+                'comparison_files': {field: comparison_sketches.quantiles(city, field, start=start, end=end)
+                                     for field in METRICS} if comparison_sketches else None
+            }
+        return {'start': start, 'end': end, 'cities': result}
+
+    def history(self, params, now):
+        start, end = _parse_window(params, now)
+        city = params.get('city')
+        try:
+            limit = min(int(params.get('limit', self.history_limit)), self.history_limit)
+        except ValueError:
+            raise QueryError("limit must be an integer")
+        readings = self.state.history(start, end, city)
+        # Newest readings win when the range holds more than the limit
+        truncated = len(readings) > limit
+        if truncated:
+            readings = readings[-limit:] if limit > 0 else []
+        return {
+            'city': city,
+            'start': start,
+            'end': end,
+            'count': len(readings),
+            'truncated': truncated,
+            'history_loaded': self.state.history_loaded,
+            'readings': [record.to_dict() for record in readings]
+        }
+
+    def comparisons(self, params, now):
+        version, weather, stats, comparisons, anomaly = self.state.snapshot()
+        return {
+            'reference': weather.to_dict() if weather else None,
+            'count': len(comparisons),
+            'comparisons': comparisons
+        }
+
+
+ROUTES = {
+    '/': 'index',
+    '/current': 'current',
+    '/stats': 'stats',
+    '/history': 'history',
+    '/comparisons': 'comparisons',
+    '/percentiles': 'percentiles'
+}
+
+
+class ResponseCache:
+    """Encoded responses keyed by request, valid while QueryHandlers.version() is unchanged"""
+
+    def __init__(self, max_entries=1024):
+        self.max_entries = max_entries
+        self._entries = {}
+        self._version = None
+        self._lock = threading.Lock()
+
+    def get(self, key, version):
+        with self._lock:
+            if version != self._version:
+                self._entries.clear()
+                self._version = version
+            return self._entries.get(key)
+
+    def put(self, key, version, entry):
+        with self._lock:
+            if version != self._version:
+                return
+            if len(self._entries) >= self.max_entries:
+                self._entries.clear()
+            self._entries[key] = entry
+
+
+class _QueryHandler(BaseHTTPRequestHandler):
+    """Routes GET requests to QueryHandlers, with ETag/304 and a response cache"""
+
+    protocol_version = 'HTTP/1.1'
+    # Headers and body go out in separate writes; without TCP_NODELAY each
+    # keep-alive response waits on the client's delayed ACK
+    disable_nagle_algorithm = True
+
+    def do_GET(self):
+        url = urlsplit(self.path)
+        name = ROUTES.get(url.path.rstrip('/') or '/')
+        if name is None:
+            self._send_json(404, {'error': f"Unknown endpoint {url.path}"})
+            QUERY_REQUESTS.inc(endpoint='unknown', status=404)
+            return
+
+        params = {key: values[-1] for key, values in parse_qs(url.query).items()}
+        now = time.time()
+        version = self.server.handlers.version()
+        # Windows relative to now move every minute even when no data changed
+        relative = 'start' not in params and name in ('stats', 'history', 'percentiles')
+        key = (name, tuple(sorted(params.items())), int(now // 60) if relative else None)
+
+        entry = self.server.cache.get(key, version)
+        QUERY_CACHE.inc(result='hit' if entry else 'miss')
+        if entry is None:
+            try:
+                document = getattr(self.server.handlers, name)(params, now)
+            except QueryError as e:
+                self._send_json(400, {'error': str(e)})
+                QUERY_REQUESTS.inc(endpoint=name, status=400)
+                return
+            except Exception:
+                logger.exception("Error answering %s", self.path)
+                self._send_json(500, {'error': "Internal error"})
+                QUERY_REQUESTS.inc(endpoint=name, status=500)
+                return
+            body = json.dumps(document, separators=(',', ':')).encode('utf-8')
+            entry = (f'"{hashlib.blake2b(body, digest_size=12).hexdigest()}"', body)
+            self.server.cache.put(key, version, entry)
+
+        etag, body = entry
+        matches = self._if_none_match()
+        if etag in matches or '*' in matches:
+            self.send_response(304)
+            self.send_header('ETag', etag)
+            self.send_header('Cache-Control', 'no-cache')
+            self.end_headers()
+            QUERY_REQUESTS.inc(endpoint=name, status=304)
+            return
+
+        self._send_body(200, body, etag)
+        QUERY_REQUESTS.inc(endpoint=name, status=200)
+
+    def _if_none_match(self):
+        header = self.headers.get('If-None-Match', '')
+        tags = (tag.strip() for tag in header.split(','))
+        return {tag[2:] if tag.startswith('W/') else tag for tag in tags if tag}
+
+    def _send_json(self, status, document):
+        self._send_body(status, json.dumps(document).encode('utf-8'))
+
+    def _send_body(self, status, body, etag=None):
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.send_header('Cache-Control', 'no-cache')
+        if etag:
+            self.send_header('ETag', etag)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class QueryServer:
+    """Background HTTP server for the query API"""
+
+    def __init__(self, state, port, host=None, sketches=None):
+        self.server = ThreadingHTTPServer((host or config.API_HOST, port), _QueryHandler)
+        self.server.daemon_threads = True
+        self.server.state = state
+        self.server.handlers = QueryHandlers(state, sketches=sketches)
+        self.server.cache = ResponseCache()
+        self.thread = None
+
+    @property
+    def port(self):
+        return self.server.server_address[1]
+
+    def start(self):
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
@@ -0,0 +1,120 @@
+"""
+Recording and replay of raw OpenWeatherMap responses
+
+A recording is gzip-compressed JSON lines, one per fetch:
+    {"t": <epoch of the fetch>, "r": <raw response>}   or
+    {"t": <epoch>, "e": "<error message>"}             for failed fetches
+"""
+
+import gzip
+import json
+import logging
+import threading
+import time
+from src.weather_api import WeatherAPI
+
+logger = logging.getLogger(__name__)
+
+
+class ResponseRecorder:
+    """Appends raw API responses to a gzip JSON-lines log"""
+
+    def __init__(self, path):
+        self.path = path
+        self._file = None
+        self._lock = threading.Lock()
+
+    def _write(self, entry):
+        line = json.dumps(entry, separators=(',', ':')) + '\n'
+        with self._lock:
+            if self._file is None:
+                # Each run adds a gzip member; readers see one continuous stream
+                self._file = gzip.open(self.path, 'at', encoding='utf-8')
+            self._file.write(line)
+            # Sync-flush so the log stays readable if the process dies
+            self._file.flush()
+
+    def record(self, epoch, response):
+        """Log a successful response"""
+        self._write({'t': epoch, 'r': response})
+
+    def record_error(self, epoch, message):
+        """Log a failed request"""
+        self._write({'t': epoch, 'e': message})
+
+    def close(self):
+        with self._lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+
+
+def read_recording(path):
+    """
+    Stream the entries of a recording
+    Args: path (str): File written by ResponseRecorder
+    Yields: dict: Entries in recorded order
+    """
+    with gzip.open(path, 'rt', encoding='utf-8') as file:
+        try:
+            for line in file:
+                if line.strip():
+                    yield json.loads(line)
+        except (EOFError, ValueError):
+            # The recorder was killed mid-write; everything before it is usable
+            logger.warning("Recording ends with an incomplete entry", extra={'path': path})
+
+
+class ReplayWeatherAPI(WeatherAPI):
+    """
+    WeatherAPI that answers from a recording instead of the network
+
+    Fetches are paced by the recorded timestamps divided by speed (speed 86400
+    replays a day per second; 0 replays as fast as possible). Readings keep
+    their recorded timestamps. Once the recording runs out every fetch
+    returns None and exhausted is True.
+    """
+
+    def __init__(self, path, speed=1.0):
+        super().__init__(api_key='replay')
+        self.path = path
+        self.speed = speed
+        self.exhausted = False
+        self.replayed = 0
+        self._entries = read_recording(path)
+        self._next_entry = None
+        self._first_recorded = None
+        self._started = None
+
+    def _wait_for(self, recorded):
+        """Sleep until the replay clock reaches the recorded time"""
+        if self._first_recorded is None:
+            self._first_recorded = recorded
+            self._started = time.perf_counter()
+            return
+        if self.speed:
+            due = (recorded - self._first_recorded) / self.speed
+            delay = due - (time.perf_counter() - self._started)
+            if delay > 0:
+                time.sleep(delay)
+
+    def fetch_raw(self):
+        entry, self._next_entry = self._next_entry, None
+        self._wait_for(entry['t'])
+        self.replayed += 1
+        if 'e' in entry:
+            raise OSError(entry['e'])
+        return entry['t'], entry['r']
+
+    def fetch_current_weather(self):
+        if not self.exhausted:
+            self._next_entry = next(self._entries, None)
+            if self._next_entry is None:
+                self.exhausted = True
+                logger.info("Replay finished", extra={'path': self.path, 'fetches': self.replayed})
+        if self.exhausted:
+            return None
+        return super().fetch_current_weather()
+
+    def is_api_key_valid(self):
+        return True
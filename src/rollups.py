@@ -0,0 +1,216 @@
+"""
+Temperature rollups per city at 5-minute, hourly and daily resolution
+"""
+
+import os
+import time
+import config
+from src import metrics
+from src.history_follower import HistoryFollower
+from src.weather_record import normalize_city
+
+ROLLUP_ROWS = metrics.counter('weather_rollup_rows', "Readings added to the history rollups")
+
+# Bucket sizes in seconds, finest first
+RESOLUTIONS = (300, 3600, 86400)
+# A series is read at the finest resolution with no more buckets than this
+MAX_BUCKETS = 10000
+
+
+class Rollups:
+    """
+    Count, sum, min and max of the temperature per (city, resolution, bucket)
+
+    5-minute buckets are only kept for the last ROLLUP_FINE_DAYS days; hourly
+    and daily buckets are kept for the whole history.
+    """
+
+    def __init__(self, fine_days=None):
+        self.fine_days = fine_days or config.ROLLUP_FINE_DAYS
+        self.names = {}
+        # (city key, resolution) -> {bucket start epoch: [count, sum, min, max]}
+        self._buckets = {}
+
+    def add(self, record):
+        """Add one WeatherRecord's temperature"""
+        if not record.city or record.epoch is None or record.temperature is None:
+            return False
+        city = normalize_city(record.city)
+        self._name(city, record.city)
+        value = record.temperature
+        for resolution in RESOLUTIONS:
+            buckets = self._buckets.get((city, resolution))
+            if buckets is None:
+                buckets = self._buckets[(city, resolution)] = {}
+            start = int(record.epoch // resolution * resolution)
+            bucket = buckets.get(start)
+            if bucket is None:
+                buckets[start] = [1, value, value, value]
+            else:
+                bucket[0] += 1
+                bucket[1] += value
+                if value < bucket[2]:
+                    bucket[2] = value
+                if value > bucket[3]:
+                    bucket[3] = value
+        return True
+
+    def add_records(self, records):
+        """Add every record of an iterable; returns how many were added"""
+        count = 0
+        for record in records:
+            if record is not None and self.add(record):
+                count += 1
+        return count
+
+    def merge(self, other):
+        """Fold another Rollups into this one"""
+        for city, name in other.names.items():
+            self._name(city, name)
+        for key, buckets in other._buckets.items():
+            _merge_buckets(self._buckets.setdefault(key, {}), buckets)
+        return self
+
+    def _name(self, city, name):
+        # Prefer a capitalized spelling ('New York' over 'new york') for display
+        known = self.names.get(city)
+        if known is None or (known.islower() and not name.islower()):
+            self.names[city] = name
+
+    def prune(self, now=None):
+        """Drop 5-minute buckets older than fine_days"""
+        cutoff = (now or time.time()) - self.fine_days * 86400
+        for (city, resolution), buckets in self._buckets.items():
+            if resolution == RESOLUTIONS[0]:
+                for start in [start for start in buckets if start < cutoff]:
+                    del buckets[start]
+
+    def cities(self):
+        """Display names of every city with data"""
+        return sorted(self.names.values())
+
+    def first_epoch(self, city):
+        """Start of the city's oldest daily bucket, or None without data"""
+        buckets = self._buckets.get((normalize_city(city), RESOLUTIONS[-1]))
+        return min(buckets) if buckets else None
+
+    def pick_resolution(self, start, end, max_buckets=None, now=None):
+        """
+        Finest resolution that covers start-end in at most max_buckets buckets
+        Returns: int: Bucket size in seconds
+        """
+        max_buckets = max_buckets or MAX_BUCKETS
+        cutoff = (now or time.time()) - self.fine_days * 86400
+        for resolution in RESOLUTIONS:
+            if resolution == RESOLUTIONS[0] and start < cutoff:
+                # Older 5-minute buckets have been pruned
+                continue
+            if (end - start) / resolution <= max_buckets:
+                return resolution
+        return RESOLUTIONS[-1]
+
+    def buckets(self, city, resolution, start=None, end=None):
+        """
+        Buckets of a city at one resolution
+        Args: city (str): City name (any casing)
+              resolution (int): One of RESOLUTIONS
+              start, end (float): Epoch window; buckets overlapping it are included
+        Returns: dict: {bucket start: [count, sum, min, max]}
+        """
+        buckets = self._buckets.get((normalize_city(city), resolution), {})
+        if start is None and end is None:
+            return buckets
+        low = start - resolution if start is not None else None
+        return {key: bucket for key, bucket in buckets.items()
+                if (low is None or key > low) and (end is None or key < end)}
+
+    def to_dict(self):
+        cities = {}
+        for (city, resolution), buckets in self._buckets.items():
+            entry = cities.setdefault(city, {'name': self.names.get(city, city)})
+            entry[str(resolution)] = [[start, bucket[0], round(bucket[1], 2), bucket[2], bucket[3]]
+                                      for start, bucket in sorted(buckets.items())]
+        return {'fine_days': self.fine_days, 'cities': cities}
+
+    @classmethod
+    def from_dict(cls, data):
+        rollups = cls(data.get('fine_days'))
+        for city, entry in data.get('cities', {}).items():
+            rollups.names[city] = entry.get('name', city)
+            for resolution in RESOLUTIONS:
+                if str(resolution) in entry:
+                    rollups._buckets[(city, resolution)] = {
+                        row[0]: row[1:] for row in entry[str(resolution)]}
+        return rollups
+
+
+def _merge_buckets(target, buckets):
+    for start, bucket in buckets.items():
+        mine = target.get(start)
+        if mine is None:
+            target[start] = list(bucket)
+        else:
+            mine[0] += bucket[0]
+            mine[1] += bucket[1]
+            mine[2] = min(mine[2], bucket[2])
+            mine[3] = max(mine[3], bucket[3])
+
+
+def combined_series(sources, city, start=None, end=None, max_buckets=None, now=None):
+    """
+    Temperature series of a city combined over several Rollups
+    Args: sources (list): Rollups to read, e.g. the history and the comparison files
+          city (str): City name (any casing)
+          start, end (float): Epoch window; None for the start of the data and now
+          max_buckets (int): Most buckets to return before falling back to a coarser resolution
+    Returns: tuple: (resolution, [(bucket middle epoch, mean, min, max), ...] oldest first)
+    """
+    now = now or time.time()
+    if not sources:
+        return RESOLUTIONS[-1], []
+    if end is None:
+        end = now
+    if start is None:
+        firsts = [first for first in (source.first_epoch(city) for source in sources) if first is not None]
+        if not firsts:
+            return RESOLUTIONS[-1], []
+        start = min(firsts)
+
+    resolution = max(source.pick_resolution(start, end, max_buckets, now) for source in sources)
+    combined = {}
+    for source in sources:
+        _merge_buckets(combined, source.buckets(city, resolution, start, end))
+    half = resolution / 2
+    return resolution, [(key + half, bucket[1] / bucket[0], bucket[2], bucket[3])
+                        for key, bucket in sorted(combined.items())]
+
+
+class HistoryRollups(HistoryFollower):
+    """Rollups of the history file, kept on disk next to it"""
+
+    KEY = 'rollups'
+    DESCRIPTION = 'history rollups'
+    ROWS = ROLLUP_ROWS
+
+    def __init__(self, data_storage, path=None):
+        super().__init__(data_storage, path or os.path.join(
+            os.path.dirname(data_storage.data_file), os.path.basename(config.ROLLUP_FILE)))
+
+    def _empty(self):
+        return Rollups()
+
+    def _from_dict(self, data):
+        return Rollups.from_dict(data)
+
+    def _prepare(self, new):
+        new.prune()
+
+    def _merge(self, new):
+        self.summary.merge(new)
+        self.summary.prune()
+
+    def series(self, city, start=None, end=None, others=(), max_buckets=None):
+        """Series of a city from the history and any other Rollups; see combined_series"""
+        with self._lock:
+            sources = [self.summary] if self.summary is not None else []
+            return combined_series(sources + list(others), city, start, end, max_buckets)
@@ -0,0 +1,352 @@
+"""
+Quantile sketches (t-digest) per city and day, month or year
+"""
+
+import functools
+import math
+import os
+import time
+from datetime import datetime
+import config
+from src import metrics
+from src.history_follower import HistoryFollower
+from src.weather_record import normalize_city
+
+SKETCH_ROWS = metrics.counter('weather_sketch_rows', "Readings added to the history quantile sketches")
+
+# Fields the sketches summarize
+METRICS = ('temperature', 'humidity')
+# Bucket for readings without a timestamp (e.g. comparison files with no date column)
+UNDATED = 'undated'
+
+
+class TDigest:
+    """
+    Merging t-digest (Dunning & Ertl) for approximate quantiles
+
+    Memory is bounded by the compression (about that many centroids)
+    regardless of how many values are added, and digests can be merged.
+    """
+
+    def __init__(self, compression=100):
+        self.compression = compression
+        self.count = 0
+        self.min = math.inf
+        self.max = -math.inf
+        self._means = []
+        self._weights = []
+        self._buffer = []
+
+    def add(self, value, weight=1):
+        self._buffer.append((value, weight))
+        self.count += weight
+        if value < self.min:
+            self.min = value
+        if value > self.max:
+            self.max = value
+        if len(self._buffer) >= self.compression * 5:
+            self._compress()
+
+    def merge(self, other):
+        """
+        Fold another digest into this one
+
+        other is only read, never compressed, so shared digests (e.g. the
+        comparison sketches queried by several API threads) can be merged
+        into fresh ones concurrently.
+        """
+        if not other.count:
+            return self
+        self._buffer.extend(zip(other._means, other._weights))
+        self._buffer.extend(other._buffer)
+        self.count += other.count
+        self.min = min(self.min, other.min)
+        self.max = max(self.max, other.max)
+        if len(self._buffer) >= self.compression * 5:
+            self._compress()
+        return self
+
+    def _k_to_q(self, k):
+        return (math.sin(k * 2 * math.pi / self.compression) + 1) / 2
+
+    def _q_to_k(self, q):
+        return self.compression / (2 * math.pi) * math.asin(max(-1.0, min(1.0, 2 * q - 1)))
+
+    def _compress(self):
+        if not self._buffer:
+            return
+        points = sorted(list(zip(self._means, self._weights)) + self._buffer)
+        self._buffer = []
+        total = self.count
+
+        means, weights = [], []
+        mean, weight = points[0]
+        weight_before = 0
+        # Centroids near the tails are kept small so extreme quantiles stay accurate
+        limit = self._k_to_q(self._q_to_k(0) + 1) * total
+        for point_mean, point_weight in points[1:]:
+            if weight_before + weight + point_weight <= limit:
+                weight += point_weight
+                mean += (point_mean - mean) * point_weight / weight
+            else:
+                means.append(mean)
+                weights.append(weight)
+                weight_before += weight
+                limit = self._k_to_q(self._q_to_k(weight_before / total) + 1) * total
+                mean, weight = point_mean, point_weight
+        means.append(mean)
+        weights.append(weight)
+        self._means, self._weights = means, weights
+
+    def quantile(self, q):
+        """
+        Approximate value at quantile q
+        Args: q (float): Between 0 and 1
+        Returns: float or None if the digest is empty
+        """
+        self._compress()
+        if not self.count:
+            return None
+        means, weights = self._means, self._weights
+        if len(means) == 1 or q <= 0:
+            return means[0] if q > 0 else self.min
+        if q >= 1:
+            return self.max
+
+        target = q * self.count
+        # Each centroid's weight is centred on its mean; interpolate between centres
+        if target < weights[0] / 2:
+            return self.min + (means[0] - self.min) * target / (weights[0] / 2)
+        cumulative = weights[0] / 2
+        for index in range(len(means) - 1):
+            step = (weights[index] + weights[index + 1]) / 2
+            if target <= cumulative + step:
+                fraction = (target - cumulative) / step
+                return means[index] + (means[index + 1] - means[index]) * fraction
+            cumulative += step
+        tail = self.count - cumulative
+        return means[-1] + (self.max - means[-1]) * min(1.0, (target - cumulative) / tail) if tail else self.max
+
+    def to_dict(self):
+        self._compress()
+        return {
+            'compression': self.compression,
+            'min': self.min if self.count else None,
+            'max': self.max if self.count else None,
+            'means': [round(mean, 4) for mean in self._means],
+            'weights': self._weights
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        digest = cls(data.get('compression', 100))
+        digest._means = list(data['means'])
+        digest._weights = list(data['weights'])
+        digest.count = sum(digest._weights)
+        if digest.count:
+            digest.min = data['min']
+            digest.max = data['max']
+        return digest
+
+
+@functools.lru_cache(maxsize=65536)
+def _day_of_hour(hour):
+    """Local date of an hour since the epoch, as 'YYYY-MM-DD'"""
+    return datetime.fromtimestamp(hour * 3600).strftime('%Y-%m-%d')
+
+
+def day_key(epoch):
+    """Daily bucket for a reading"""
+    return _day_of_hour(int(epoch // 3600)) if epoch is not None else UNDATED
+
+
+def _days_covered(key):
+    """First and last day of a 'YYYY-MM-DD', 'YYYY-MM' or 'YYYY' bucket; comparable with day keys"""
+    dashes = key.count('-')
+    if dashes == 2:
+        return key, key
+    if dashes == 1:
+        return key + '-01', key + '-31'
+    return key + '-01-01', key + '-12-31'
+
+
+class QuantileSketches:
+    """
+    T-digests per (city, field, day), mergeable across files and time ranges
+
+    Days older than daily_days are folded into one digest per month, and the
+    months of years before last year into one per year, so the number of
+    digests stays bounded however long the history gets. Windows reaching
+    back that far are widened to whole months or years.
+    """
+
+    def __init__(self, compression=None, daily_days=None):
+        self.compression = compression or config.SKETCH_COMPRESSION
+        self.daily_days = daily_days or config.SKETCH_DAILY_DAYS
+        self.names = {}
+        # (city key, field) -> {day, month or year: TDigest}
+        self._digests = {}
+
+    def add(self, record):
+        """Add one WeatherRecord's temperature and humidity"""
+        if not record.city:
+            return
+        city = normalize_city(record.city)
+        self._name(city, record.city)
+        day = day_key(record.epoch)
+        for field in METRICS:
+            value = getattr(record, field)
+            if value is None:
+                continue
+            days = self._digests.setdefault((city, field), {})
+            digest = days.get(day)
+            if digest is None:
+                digest = days[day] = TDigest(self.compression)
+            digest.add(value)
+
+    def add_records(self, records):
+        """Add every record of an iterable; returns how many were added"""
+        count = 0
+        for record in records:
+            if record is not None:
+                self.add(record)
+                count += 1
+        return count
+
+    def fold(self, now=None):
+        """
+        Merge day digests older than daily_days into their months, and months
+        of years before last year into their years
+        Returns: int: Number of digests merged away
+        """
+        cutoff = day_key((now or time.time()) - self.daily_days * 86400)
+        first_month = f"{int(cutoff[:4]) - 1}-01"
+        folded = 0
+        for days in self._digests.values():
+            # Days first, so a day old enough goes through its month to its year
+            for dashes, last, width in ((2, cutoff, 7), (1, first_month, 4)):
+                for key in [key for key in days if key.count('-') == dashes and key < last]:
+                    days.setdefault(key[:width], TDigest(self.compression)).merge(days.pop(key))
+                    folded += 1
+        return folded
+
+    def merge(self, other):
+        """Fold another QuantileSketches into this one"""
+        for city, name in other.names.items():
+            self._name(city, name)
+        for key, days in other._digests.items():
+            mine = self._digests.setdefault(key, {})
+            for day, digest in days.items():
+                mine.setdefault(day, TDigest(self.compression)).merge(digest)
+        return self
+
+    def _name(self, city, name):
+        # Prefer a capitalized spelling ('New York' over 'new york') for display
+        known = self.names.get(city)
+        if known is None or (known.islower() and not name.islower()):
+            self.names[city] = name
+
+    def cities(self):
+        """Display names of every city with data"""
+        return sorted(self.names.values())
+
+    def digest(self, city, field='temperature', start=None, end=None):
+        """
+        Merged digest for a city over whole days (or months or years, see fold())
+        Args: city (str): City name (any casing)
+              field (str): 'temperature' or 'humidity'
+              start, end (float): Epoch window; buckets overlapping it are included.
+                                  With neither, undated readings count too.
+        Returns: TDigest (empty if there is no data)
+        """
+        days = self._digests.get((normalize_city(city), field), {})
+        first = day_key(start) if start is not None else None
+        last = day_key(end) if end is not None else None
+        merged = TDigest(self.compression)
+        for key, digest in days.items():
+            if key == UNDATED:
+                if first is None and last is None:
+                    merged.merge(digest)
+                continue
+            low, high = _days_covered(key)
+            if (first is None or high >= first) and (last is None or low <= last):
+                merged.merge(digest)
+        return merged
+
+    def quantiles(self, city, field='temperature', qs=(0.05, 0.5, 0.95), start=None, end=None):
+        """
+        Approximate quantiles for a city
+        Returns: dict: {'p5': value, ...} rounded to 0.1, or None without data
+        """
+        digest = self.digest(city, field, start, end)
+        if not digest.count:
+            return None
+        result = {f"p{round(q * 100):g}": round(float(digest.quantile(q)), 1) for q in qs}
+        result['count'] = digest.count
+        return result
+
+    def compress(self):
+        """Fold every digest's buffered values into its centroids"""
+        for days in self._digests.values():
+            for digest in days.values():
+                digest._compress()
+
+    def to_dict(self):
+        cities = {}
+        for (city, field), days in self._digests.items():
+            entry = cities.setdefault(city, {'name': self.names.get(city, city)})
+            entry[field] = {day: digest.to_dict() for day, digest in days.items()}
+        return {'compression': self.compression, 'daily_days': self.daily_days, 'cities': cities}
+
+    @classmethod
+    def from_dict(cls, data):
+        sketches = cls(data.get('compression'), data.get('daily_days'))
+        for city, entry in data.get('cities', {}).items():
+            sketches.names[city] = entry.get('name', city)
+            for field in METRICS:
+                if field in entry:
+                    sketches._digests[(city, field)] = {
+                        day: TDigest.from_dict(digest) for day, digest in entry[field].items()}
+        return sketches
+
+
+class HistorySketches(HistoryFollower):
+    """Quantile sketches of the history file, kept on disk next to it"""
+
+    KEY = 'sketches'
+    DESCRIPTION = 'quantile sketches'
+    ROWS = SKETCH_ROWS
+
+    def __init__(self, data_storage, path=None):
+        super().__init__(data_storage, path or os.path.join(
+            os.path.dirname(data_storage.data_file), os.path.basename(config.SKETCH_FILE)))
+
+    def _empty(self):
+        return QuantileSketches()
+
+    def _from_dict(self, data):
+        sketches = QuantileSketches.from_dict(data)
+        # Saved by an older version, or before days went past daily_days
+        sketches.fold()
+        return sketches
+
+    def _prepare(self, new):
+        # Compressed here so the merge holds the lock for milliseconds, not the whole catch-up
+        new.fold()
+        new.compress()
+
+    def _merge(self, new):
+        self.summary.merge(new)
+        self.summary.fold()
+
+    def cities(self):
+        """Display names of every city in the history"""
+        with self._lock:
+            return self.summary.cities() if self.summary is not None else []
+
+    def quantiles(self, city, field='temperature', qs=(0.05, 0.5, 0.95), start=None, end=None):
+        """Approximate quantiles from the history; see QuantileSketches.quantiles"""
+        with self._lock:
+            if self.summary is None:
+                return None
+            return self.summary.quantiles(city, field, qs, start, end)
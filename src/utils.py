@@ -2,6 +2,7 @@
 Utility functions for weather calculations and analysis
 """
 
+import heapq
 from datetime import datetime, timedelta
 
 class WeatherUtils:
@@ -11,20 +12,13 @@ class WeatherUtils:
     def calculate_weekly_average(weather_data):
         """
         Calculate weekly average temperature
-        Args: weather_data (list): List of weather data dictionaries
+        Args: weather_data (list): List of WeatherRecords
         Returns: float: Average temperature or None if no data
         """
         if not weather_data:
             return None
         
-        temperatures = []
-        for entry in weather_data:
-            try:
-                temp = entry.get('temperature')
-                if temp is not None:
-                    temperatures.append(float(temp))
-            except (ValueError, TypeError):
-                continue
+        temperatures = [entry.temperature for entry in weather_data if entry.temperature is not None]
         
         if not temperatures:
             return None
@@ -35,25 +29,18 @@ class WeatherUtils:
     def find_min_max_temps(weather_data):
         """
         Find minimum and maximum temperatures
-        Args: weather_data (list): List of weather data dictionaries
+        Args: weather_data (list): List of WeatherRecords
         Returns: tuple: (min_temp, max_temp) or (None, None) if no data
         """
         if not weather_data:
             return None, None
         
-        temperatures = []
-        for entry in weather_data:
-            try:
-                temp = entry.get('temperature')
-                if temp is not None:
-                    temperatures.append(float(temp))
-            except (ValueError, TypeError):
-                continue
+        temperatures = [entry.temperature for entry in weather_data if entry.temperature is not None]
         
         if not temperatures:
             return None, None
         
-        return min(temperatures), max(temperatures)
+        return float(min(temperatures)), float(max(temperatures))
     
     @staticmethod
     def calculate_temperature_difference(current_temp, previous_temp):
@@ -75,24 +62,21 @@ class WeatherUtils:
     def get_previous_temperature(weather_data):
         """
         Get the most recent previous temperature reading
-        Args: weather_data (list): List of weather data dictionaries
+        Args: weather_data (list): List of WeatherRecords
         Returns: float: Previous temperature or None if no data
         """
         if len(weather_data) < 2:
             return None
         
-        # Sort by timestamp (most recent first)
-        try:
-            sorted_data = sorted(weather_data, 
-                               key=lambda x: datetime.fromisoformat(x['timestamp']), 
-                               reverse=True)
-            
-            # Return second most recent temperature
-            prev_temp = sorted_data[1].get('temperature')
-            return float(prev_temp) if prev_temp is not None else None
-            
-        except (ValueError, TypeError, KeyError):
+        # Two most recent readings; no need to sort everything
+        latest = heapq.nlargest(2, (entry for entry in weather_data if entry.epoch is not None),
+                                key=lambda entry: entry.epoch)
+        if len(latest) < 2:
             return None
+        
+        # Return second most recent temperature
+        prev_temp = latest[1].temperature
+        return float(prev_temp) if prev_temp is not None else None
     
     @staticmethod
     def format_temperature_change(temp_diff):
@@ -110,3 +94,75 @@ class WeatherUtils:
             return f"{temp_diff}°F (cooler)"
         else:
             return "No change"
+    
+    @staticmethod
+    def format_percentiles(quantiles, unit):
+        """
+        Format approximate percentiles for display
+        Args: quantiles (dict): {'p5': ..., 'p50': ..., 'p95': ...} from QuantileSketches
+              unit (str): Unit appended to the values, e.g. '°F' or '%'
+        Returns: string: e.g. '61.0 / 72.5 / 90.0°F', or '--' without data
+        """
+        if not quantiles:
+            return "--"
+        return f"{quantiles['p5']} / {quantiles['p50']} / {quantiles['p95']}{unit}"
+    
+    @staticmethod
+    def format_anomaly(anomaly):
+        """
+        Format a reading's comparison with the usual temperature for its hour
+        Args: anomaly (dict): Result of ClimatologyBaseline.score
+        Returns: string: e.g. '+6.2°F vs usual 71.0°F (z +2.8, unusual)'
+        """
+        if not anomaly or anomaly['mean'] is None:
+            return "Not enough history"
+        text = f"{anomaly['deviation']:+}°F vs usual {anomaly['mean']}°F"
+        if anomaly['z'] is None:
+            return f"{text} (building baseline)"
+        return f"{text} (z {anomaly['z']:+}{', unusual' if anomaly['flagged'] else ''})"
+    
+    @staticmethod
+    def build_statistics(recent_data, current_weather=None, sketches=None, days=7, anomaly=None):
+        """
+        Build the formatted 7-day statistics shown in the GUI
+        Args: recent_data (list): List of WeatherRecords
+              current_weather (WeatherRecord): Latest reading, used for the change since last reading
+              sketches (HistorySketches): Source of the approximate percentiles, if any
+              days (int): Window the percentiles cover
+              anomaly (dict): current_weather scored by ClimatologyBaseline, if any
+        Returns: dict: Display strings keyed by 'average', 'min', 'max', 'change',
+                 'percentiles', 'humidity_percentiles' and 'anomaly', plus
+                 'anomaly_flagged' (bool)
+        """
+        stats = {}
+        if not recent_data:
+            return stats
+        
+        avg_temp = WeatherUtils.calculate_weekly_average(recent_data)
+        if avg_temp:
+            stats['average'] = f"{avg_temp}°F"
+        
+        min_temp, max_temp = WeatherUtils.find_min_max_temps(recent_data)
+        if min_temp is not None and max_temp is not None:
+            stats['min'] = f"{min_temp}°F"
+            stats['max'] = f"{max_temp}°F"
+        
+        if current_weather:
+            prev_temp = WeatherUtils.get_previous_temperature(recent_data)
+            temp_diff = WeatherUtils.calculate_temperature_difference(
+                current_weather.temperature, prev_temp)
+            stats['change'] = WeatherUtils.format_temperature_change(temp_diff)
+        
+        if sketches is not None:
+            city = current_weather.city if current_weather else recent_data[-1].city
+            start = datetime.now().timestamp() - days * 86400
+            stats['percentiles'] = WeatherUtils.format_percentiles(
+                sketches.quantiles(city, 'temperature', start=start), '°F')
+            stats['humidity_percentiles'] = WeatherUtils.format_percentiles(
+                sketches.quantiles(city, 'humidity', start=start), '%')
+        
+        if anomaly is not None:
+            stats['anomaly'] = WeatherUtils.format_anomaly(anomaly)
+            stats['anomaly_flagged'] = anomaly['flagged']
+        
+        return stats
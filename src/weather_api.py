@@ -2,60 +2,102 @@
 Weather API module for fetching data from OpenWeatherMap
 """
 
-import requests
 import json
-from datetime import datetime
+import logging
+import time
 import config
+from src import metrics
+from src.weather_record import WeatherRecord
+
+logger = logging.getLogger(__name__)
+
+API_LATENCY = metrics.histogram('weather_api_request_seconds', "OpenWeatherMap request latency")
+API_REQUESTS = metrics.counter('weather_api_requests', "OpenWeatherMap requests by outcome")
 
 class WeatherAPI:
     """Handles weather data fetching from OpenWeatherMap API"""
     
-    def __init__(self):
-        self.api_key = config.API_KEY
-        self.base_url = config.BASE_URL
+    def __init__(self, base_url=None, api_key=None, recorder=None):
+        self.api_key = api_key or config.API_KEY
+        self.base_url = base_url or config.BASE_URL
         self.city = config.CITY
         self.state = config.STATE
         self.country = config.COUNTRY
+        # Optional ResponseRecorder that logs every raw response for replay
+        self.recorder = recorder
+    
+    def fetch_raw(self):
+        """
+        Request the current conditions from OpenWeatherMap
+        Returns: tuple: (epoch seconds of the fetch, decoded JSON response)
+        Raises: OSError (requests.RequestException) on network or HTTP errors
+        """
+        # Imported lazily so application startup doesn't pay for requests
+        import requests
+        
+        # Build the API URL
+        location = f"{self.city},{self.state},{self.country}"
+        url = f"{self.base_url}?q={location}&appid={self.api_key}&units=imperial"
+        
+        # Make API request
+        try:
+            with API_LATENCY.time():
+                response = requests.get(url, timeout=10)
+            response.raise_for_status()
+        except requests.exceptions.RequestException as e:
+            # Failures are part of the recording too, so replays reproduce them
+            if self.recorder:
+                self.recorder.record_error(time.time(), str(e).replace(self.api_key, '***'))
+            raise
+        fetched_at = time.time()
+        data = response.json()
+        if self.recorder:
+            self.recorder.record(fetched_at, data)
+        return fetched_at, data
+    
+    @staticmethod
+    def parse_response(data, epoch):
+        """
+        Extract the reading from an OpenWeatherMap response
+        Args: data (dict): Decoded JSON response
+              epoch (float): When the response was fetched
+        Returns: WeatherRecord
+        """
+        return WeatherRecord(
+            city=data['name'],
+            temperature=round(data['main']['temp']),
+            feels_like=round(data['main']['feels_like']),
+            humidity=data['main']['humidity'],
+            description=data['weather'][0]['description'].title(),
+            epoch=epoch
+        )
     
     def fetch_current_weather(self):
         """
         Fetch current weather data for Sacramento
-        Returns: dict with weather data or None if error
+        Returns: WeatherRecord or None if error
         """
         try:
-            # Build the API URL
-            location = f"{self.city},{self.state},{self.country}"
-            url = f"{self.base_url}?q={location}&appid={self.api_key}&units=imperial"
-            
-            # Make API request
-            response = requests.get(url, timeout=10)
-            response.raise_for_status()
-            
-            # Parse JSON response
-            data = response.json()
+            fetched_at, data = self.fetch_raw()
             
             # Extract relevant weather information
-            weather_data = {
-                'city': data['name'],
-                'temperature': round(data['main']['temp']),
-                'feels_like': round(data['main']['feels_like']),
-                'humidity': data['main']['humidity'],
-                'description': data['weather'][0]['description'].title(),
-                'timestamp': datetime.now().isoformat(),
-                'date': datetime.now().strftime('%Y-%m-%d'),
-                'time': datetime.now().strftime('%H:%M:%S')
-            }
+            weather_data = self.parse_response(data, fetched_at)
             
+            API_REQUESTS.inc(outcome='success')
             return weather_data
             
-        except requests.exceptions.RequestException as e:
-            print(f"Network error: {e}")
+        except OSError as e:
+            # requests' exceptions derive from OSError
+            API_REQUESTS.inc(outcome='network_error')
+            logger.error("Network error: %s", e)
             return None
-        except KeyError as e:
-            print(f"Data parsing error: {e}")
+        except (KeyError, IndexError, TypeError, ValueError) as e:
+            API_REQUESTS.inc(outcome='parse_error')
+            logger.error("Data parsing error: %s", e)
             return None
         except Exception as e:
-            print(f"Unexpected error: {e}")
+            API_REQUESTS.inc(outcome='error')
+            logger.exception("Unexpected error: %s", e)
             return None
     
     def is_api_key_valid(self):
@@ -0,0 +1,193 @@
+"""
+Compact weather reading type shared by storage, statistics and comparisons
+"""
+
+import functools
+import operator
+import sys
+from datetime import datetime
+
+# Column order of the app's history CSV file
+HISTORY_FIELDNAMES = [
+    'city', 'temperature', 'feels_like', 'humidity',
+    'description', 'timestamp', 'date', 'time'
+]
+
+
+_intern = sys.intern
+
+
+def _to_int(value):
+    """Parse a numeric field the way the CSV files store it ('84', '84.0', '78.96'); None if it isn't a number"""
+    if value is None or value == '':
+        return None
+    if isinstance(value, int):
+        return value
+    try:
+        return int(float(value))
+    except (ValueError, OverflowError):
+        # 'N/A', '--', 'nan', 'inf': no usable value
+        return None
+
+
+def normalize_city(name):
+    """Case- and whitespace-insensitive city key ('New  York' == 'new york')"""
+    return ' '.join(name.split()).casefold() if name else ''
+
+
+@functools.lru_cache(maxsize=65536)
+def _hour_epoch(hour_prefix):
+    """Epoch of the start of a local hour such as '2025-07-09T13'"""
+    return datetime.fromisoformat(hour_prefix + ':00').timestamp()
+
+
+def parse_timestamp(value):
+    """
+    Convert an ISO timestamp or date string to epoch seconds
+    Args: value (str): e.g. '2025-07-09T13:03:24.397890', '2025-07-09 13:16:29' or '2025-07-09'
+    Returns: float: Seconds since the epoch (local time) or None if it can't be parsed
+    """
+    if not value:
+        return None
+    try:
+        value = value.strip()
+        # Fast path for 'YYYY-MM-DD[T ]HH:MM:SS[.ffffff]': the local-time
+        # conversion is only done once per hour and cached
+        if len(value) >= 19 and value[13] == ':' and value[16] == ':':
+            try:
+                return _hour_epoch(value[:13]) + int(value[14:16]) * 60 + float(value[17:])
+            except ValueError:
+                pass
+        return datetime.fromisoformat(value).timestamp()
+    except (ValueError, TypeError, AttributeError):
+        return None
+
+
+class WeatherRecord:
+    """One weather reading with numeric fields and a single epoch timestamp"""
+
+    __slots__ = ('city', 'temperature', 'feels_like', 'humidity', 'description',
+                 'epoch', 'state', 'source_file')
+
+    def __init__(self, city, temperature=None, feels_like=None, humidity=None,
+                 description=None, epoch=None, state=None, source_file=None):
+        # Interned so repeated city names and descriptions share one string
+        self.city = _intern(city) if city else None
+        self.temperature = temperature
+        self.feels_like = feels_like
+        self.humidity = humidity
+        self.description = _intern(description) if description else None
+        self.epoch = epoch
+        self.state = _intern(state) if state else None
+        self.source_file = _intern(source_file) if source_file else None
+
+    @property
+    def datetime(self):
+        return datetime.fromtimestamp(self.epoch) if self.epoch is not None else None
+
+    @property
+    def timestamp(self):
+        """ISO timestamp, as the history file stores it"""
+        return self.datetime.isoformat() if self.epoch is not None else ''
+
+    @property
+    def date(self):
+        return self.datetime.strftime('%Y-%m-%d') if self.epoch is not None else ''
+
+    @property
+    def time(self):
+        return self.datetime.strftime('%H:%M:%S') if self.epoch is not None else ''
+
+    @classmethod
+    def history_row_parser(cls, header):
+        """
+        Build a function that turns history CSV rows into records
+        Args: header (list): Column names from the file's first row
+        Returns: callable: row (list) -> WeatherRecord
+        """
+        columns = {name: index for index, name in enumerate(header)}
+        indexes = [columns.get(name) for name in
+                   ('city', 'temperature', 'feels_like', 'humidity', 'description', 'timestamp')]
+        present = [index for index in indexes if index is not None]
+        width = max(present) + 1 if present else 0
+        fields = operator.itemgetter(*indexes) if len(present) == len(indexes) else None
+
+        def parse(row):
+            if fields is not None and len(row) >= width:
+                city, temp, feels, humidity, desc, stamp = fields(row)
+            else:
+                # Short row or missing column
+                city, temp, feels, humidity, desc, stamp = (
+                    row[index] if index is not None and index < len(row) else None
+                    for index in indexes)
+            try:
+                return cls(city,
+                           int(float(temp)) if temp else None,
+                           int(float(feels)) if feels else None,
+                           int(float(humidity)) if humidity else None,
+                           desc, parse_timestamp(stamp))
+            except (ValueError, OverflowError):
+                # A value such as 'N/A' or 'nan' is read as missing rather than
+                # failing the row, so offset-based readers still get past it
+                return cls(city, _to_int(temp), _to_int(feels), _to_int(humidity),
+                           desc, parse_timestamp(stamp))
+
+        return parse
+
+    @classmethod
+    def from_dict(cls, data):
+        """Build a record from a reading dict (the format the app used before WeatherRecord)"""
+        if isinstance(data, cls):
+            return data
+        epoch = data.get('epoch')
+        if epoch is None:
+            epoch = parse_timestamp(data.get('timestamp'))
+        if epoch is None and data.get('date'):
+            epoch = parse_timestamp(f"{data['date']} {data.get('time') or '00:00:00'}")
+        return cls(
+            city=data.get('city'),
+            temperature=_to_int(data.get('temperature')),
+            feels_like=_to_int(data.get('feels_like')),
+            humidity=_to_int(data.get('humidity')),
+            description=data.get('description'),
+            epoch=epoch,
+            state=data.get('state'),
+            source_file=data.get('source_file')
+        )
+
+    def to_dict(self):
+        """Reading as a plain dict, for JSON output and other edges"""
+        data = {
+            'city': self.city,
+            'temperature': self.temperature,
+            'feels_like': self.feels_like,
+            'humidity': self.humidity,
+            'description': self.description,
+            'timestamp': self.timestamp,
+            'date': self.date,
+            'time': self.time
+        }
+        if self.state is not None:
+            data['state'] = self.state
+        if self.source_file is not None:
+            data['source_file'] = self.source_file
+        return data
+
+    def to_history_row(self):
+        """Values in HISTORY_FIELDNAMES order for csv.writer"""
+        moment = self.datetime
+        return [
+            self.city, self.temperature, self.feels_like, self.humidity, self.description,
+            moment.isoformat() if moment else '',
+            moment.strftime('%Y-%m-%d') if moment else '',
+            moment.strftime('%H:%M:%S') if moment else ''
+        ]
+
+    def __eq__(self, other):
+        if not isinstance(other, WeatherRecord):
+            return NotImplemented
+        return all(getattr(self, name) == getattr(other, name) for name in self.__slots__)
+
+    def __repr__(self):
+        return (f"WeatherRecord(city={self.city!r}, temperature={self.temperature!r}, "
+                f"humidity={self.humidity!r}, epoch={self.epoch!r})")